@@ -1,26 +1,112 @@
+import importlib.util
+import sys
+
 import streamlit as st
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import textwrap
-import io
 import os
 import sqlite3
 import base64
+import json
+import time
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
+from operator import itemgetter
 
-from openai import OpenAI
 import tempfile
 
+from psicometria import ESCALA, analisar_instrumento, matriz_respostas
+from radar import fechar_figura, plot_radar, radar_html, radar_svg
+from relatorios_html import compilar_templates
+from tendencia import tendencia_svg, tendencias_em_lote
+
+def importar_sob_demanda(nome):
+    """
+    Módulo carregado só no primeiro acesso a um de seus atributos
+    (importlib.util.LazyLoader). Usado para o pandas, que leva ~0,5 s para
+    importar e não é necessário para desenhar a primeira página.
+    """
+    if nome in sys.modules:
+        return sys.modules[nome]
+    spec = importlib.util.find_spec(nome)
+    spec.loader = importlib.util.LazyLoader(spec.loader)
+    modulo = importlib.util.module_from_spec(spec)
+    sys.modules[nome] = modulo
+    spec.loader.exec_module(modulo)
+    return modulo
+
+
+pd = importar_sob_demanda("pandas")
+
 # =========================================================
 # CONFIGURAÇÃO OPENAI
 # =========================================================
-# A API key deve ser configurada como variável de ambiente ou nos secrets do Streamlit
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY", "")
-if not OPENAI_API_KEY and hasattr(st, 'secrets') and "OPENAI_API_KEY" in st.secrets:
-    OPENAI_API_KEY = st.secrets["OPENAI_API_KEY"]
-client = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY and OPENAI_API_KEY.strip() else None
-OPENAI_ENABLED = client is not None
+# As configurações podem vir de variáveis de ambiente ou dos secrets do Streamlit
+def ler_config(nome, padrao=""):
+    valor = os.environ.get(nome, "")
+    if not valor:
+        try:
+            if hasattr(st, "secrets") and nome in st.secrets:
+                valor = st.secrets[nome]
+        except Exception:
+            # sem secrets.toml configurado
+            pass
+    return valor if valor else padrao
+
+
+def ler_config_numero(nome, padrao, tipo=float):
+    """Configuração numérica (tipo: int ou float); valor inválido usa o padrão em vez de impedir o app de abrir."""
+    try:
+        return tipo(ler_config(nome, padrao))
+    except (TypeError, ValueError):
+        return tipo(padrao)
+
+
+OPENAI_API_KEY = ler_config("OPENAI_API_KEY")
+# Endereço alternativo compatível com a API (ex.: servidor_ia_local.py para testes de carga)
+OPENAI_BASE_URL = ler_config("OPENAI_BASE_URL") or None
+OPENAI_TIMEOUT_S = ler_config_numero("OPENAI_TIMEOUT_S", 60)
+OPENAI_MAX_RETRIES = ler_config_numero("OPENAI_MAX_RETRIES", 2, int)
+OPENAI_ENABLED = bool(OPENAI_API_KEY and OPENAI_API_KEY.strip())
+
+
+@st.cache_resource(show_spinner=False)
+def cliente_openai():
+    """Cliente da API, criado (e o pacote openai importado) só na primeira chamada à IA."""
+    from openai import OpenAI
+
+    return OpenAI(
+        api_key=OPENAI_API_KEY,
+        base_url=OPENAI_BASE_URL,
+        timeout=OPENAI_TIMEOUT_S,
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+
+
+# Modo de geração dos textos automáticos:
+# - "auto": usa a IA quando há chave e o gerador local como reserva em caso de falha;
+# - "local": nunca chama a IA (gerador local determinístico, sem custo).
+TEXTOS_MODO = ler_config("ADE_TEXTOS_MODO", "auto").strip().lower()
+IA_ATIVA = OPENAI_ENABLED and TEXTOS_MODO != "local"
+# Relatório e sugestões em uma única chamada com saída JSON (metade das requisições
+# e dos tokens de entrada); em caso de resposta inválida, volta para duas chamadas.
+IA_CHAMADA_UNICA = ler_config("ADE_IA_CHAMADA_UNICA", "0").strip().lower() in ("1", "true", "sim")
+
+# Pré-geração, em segundo plano, dos relatórios de avaliações salvas sem relatório.
+# Só com a IA ativa: sem ela o texto local gravado ocuparia o lugar do relatório da IA.
+PREFETCH_ATIVO = IA_ATIVA and ler_config("ADE_PREFETCH", "1").strip().lower() in ("1", "true", "sim")
+PREFETCH_OCIOSO_S = ler_config_numero("ADE_PREFETCH_OCIOSO_S", 20)
+PREFETCH_MAX_POR_MINUTO = ler_config_numero("ADE_PREFETCH_MAX_POR_MINUTO", 6, int)  # avaliações por minuto
+# Escola atendida primeiro (opcional); dentro da prioridade, das mais antigas para as mais novas
+PREFETCH_ESCOLA = ler_config("ADE_PREFETCH_ESCOLA")
+# Avaliação cuja geração falhou (IA fora do ar, limite de uso): espera antes de tentar de
+# novo, dobrando a cada falha até o máximo, e as demais da fila seguem sendo atendidas
+PREFETCH_ESPERA_FALHA_S = ler_config_numero("ADE_PREFETCH_ESPERA_FALHA_S", 60)
+PREFETCH_ESPERA_FALHA_MAX_S = ler_config_numero("ADE_PREFETCH_ESPERA_FALHA_MAX_S", 3600)
 
 # =========================================================
 # DIRETÓRIO BASE / BANCO / LOGO
@@ -36,13 +122,37 @@ if os.environ.get("STREAMLIT_SHARING_MODE") or os.path.exists("/mount/src"):
     DATA_DIR = tempfile.gettempdir()
 else:
     # Estamos em ambiente local
+    # criado em init_db, na primeira gravação
     DATA_DIR = os.path.join(BASE_DIR, "data")
-    os.makedirs(DATA_DIR, exist_ok=True)
+
+# Radar nos relatórios HTML: "svg" (vetorial, menor e nítido na impressão) ou "png";
+# o SVG pode ir embutido direto no documento ou como <img> com data URI
+RADAR_FORMATO = ler_config("ADE_RADAR_FORMATO", "svg").strip().lower()
+RADAR_SVG_INLINE = ler_config("ADE_RADAR_SVG_INLINE", "1").strip().lower() in ("1", "true", "sim")
+# Motor do radar: "nativo" (NumPy → SVG, sem importar o matplotlib) ou "matplotlib"
+RADAR_MOTOR = ler_config("ADE_RADAR_MOTOR", "nativo").strip().lower()
+
+# Exportação em lote (ZIP) dos relatórios individuais: relatórios montados em paralelo
+EXPORTACAO_WORKERS = ler_config_numero("ADE_EXPORTACAO_WORKERS", 4, int)
+# ZIP e livro ficam na pasta temporária do sistema até o download; os de sessões já
+# encerradas são apagados na exportação seguinte depois desse tempo (s)
+EXPORTACAO_VALIDADE_S = ler_config_numero("ADE_EXPORTACAO_VALIDADE_S", 21600)
+
+# Busca de estudantes/avaliações (carregar avaliação e vincular PEI): máximo de resultados exibidos
+BUSCA_MAX_RESULTADOS = ler_config_numero("ADE_BUSCA_MAX_RESULTADOS", 20, int)
+
+# Rascunho do formulário de avaliação: intervalo mínimo (s) entre gravações automáticas
+RASCUNHO_INTERVALO_S = ler_config_numero("ADE_RASCUNHO_INTERVALO_S", 10)
 
 LOGO_FILE = "image.png"
 LOGO_PATH = os.path.join(BASE_DIR, LOGO_FILE)
 
 DB_PATH = os.path.join(DATA_DIR, "avaliacoes_ade.db")
+# Rascunhos do formulário em arquivo próprio: a gravação automática não mexe no banco
+# das avaliações (nem na versão dele, que é a chave dos caches de Consultas)
+RASCUNHOS_DB_PATH = os.path.join(DATA_DIR, "rascunhos_ade.db")
+# Consumo de tokens da IA também à parte: cada chamada registrada não invalida os caches
+USO_IA_DB_PATH = os.path.join(DATA_DIR, "uso_ia_ade.db")
 
 # =========================================================
 # PALETA DE CORES – VERSÃO COMERCIAL
@@ -156,6 +266,46 @@ def get_disciplinas_boletim_mec(ano_escolar: str):
     ]
 
 
+COLUNAS_BOLETIM = ["Disciplina", "Nota", "Conteúdo programático"]
+
+
+ROTULOS_BOLETIM = {"Disciplina": "Disciplina", "Nota": "Nota", "Conteúdo programático": "Conteúdo"}
+_SEPARADOR_BOLETIM = "\x1f"
+
+
+def tabela_boletim(linhas):
+    """
+    Linhas do editor do boletim (disciplina, nota, conteúdo) como DataFrame limpo:
+    textos sem espaços nas pontas, linhas totalmente vazias descartadas e a nota
+    também em número (nota_valor, vírgula decimal aceita; NaN quando não é número).
+    """
+    df = pd.DataFrame(list(linhas), columns=COLUNAS_BOLETIM).fillna("").astype(str)
+    df = df.apply(lambda coluna: coluna.str.strip())
+    df = df[(df != "").any(axis=1)].reset_index(drop=True)
+    df["nota_valor"] = pd.to_numeric(df["Nota"].str.replace(",", ".", regex=False), errors="coerce")
+    return df
+
+
+def texto_boletim(df_boletim):
+    """
+    Boletim (tabela_boletim) no texto salvo no banco e enviado aos relatórios:
+    uma linha por disciplina, "Disciplina: ... | Nota: ... | Conteúdo: ...", sem
+    os campos vazios. Montado com operações de coluna, sem laço por linha.
+    """
+    if df_boletim.empty:
+        return ""
+    partes = [
+        (f"{rotulo}: " + df_boletim[coluna]).where(df_boletim[coluna] != "", "")
+        for coluna, rotulo in ROTULOS_BOLETIM.items()
+    ]
+    linhas = (
+        partes[0].str.cat(partes[1:], sep=_SEPARADOR_BOLETIM)
+        .str.strip(_SEPARADOR_BOLETIM)
+        .str.replace(f"{_SEPARADOR_BOLETIM}+", " | ", regex=True)
+    )
+    return "\n".join(linhas.tolist())
+
+
 # =========================================================
 # INSTRUMENTOS POR ANO (BNCC – VISÃO SINTÉTICA POR ETAPA)
 # =========================================================
@@ -362,18 +512,23 @@ def instrumento_em():
     }
 
 
-def get_instrumento_para_ano(ano_escolar: str):
+def instrumento_do_ano(ano_escolar: str):
+    """(nome do instrumento, função que o monta) aplicado no ano escolar."""
     if "Educação Infantil" in ano_escolar:
-        return instrumento_ei()
+        return "Educação Infantil", instrumento_ei
     if "1º ano EF" in ano_escolar:
-        return instrumento_1_ano_ef()
+        return "1º ano EF", instrumento_1_ano_ef
     if any(x in ano_escolar for x in ["2º ano EF", "3º ano EF", "4º ano EF", "5º ano EF"]):
-        return instrumento_2a5_ef()
+        return "2º ao 5º ano EF", instrumento_2a5_ef
     if any(x in ano_escolar for x in ["6º ano EF", "7º ano EF", "8º ano EF", "9º ano EF"]):
-        return instrumento_6a9_ef()
+        return "6º ao 9º ano EF", instrumento_6a9_ef
     if "ano EM" in ano_escolar:
-        return instrumento_em()
-    return instrumento_2a5_ef()
+        return "Ensino Médio", instrumento_em
+    return "2º ao 5º ano EF", instrumento_2a5_ef
+
+
+def get_instrumento_para_ano(ano_escolar: str):
+    return instrumento_do_ano(ano_escolar)[1]()
 
 
 # =========================================================
@@ -635,8 +790,11 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-if not OPENAI_ENABLED:
-    st.warning("Sem conexão com a IA. Os textos automáticos exibirão a mensagem 'Sem conexão com a IA'.")
+if not IA_ATIVA:
+    st.info(
+        "Textos automáticos gerados pelo modelo local da plataforma (sem IA). "
+        "Revise e complemente o relatório antes de gerar o arquivo para impressão."
+    )
 
 # =========================================================
 # ESCALA 5 NÍVEIS
@@ -658,7 +816,7 @@ LIKERT_LABELS = {
 }
 
 # =========================================================
-# FUNÇÕES DE CÁLCULO / GRÁFICO
+# FUNÇÕES DE CÁLCULO
 # =========================================================
 def calcular_scores(respostas_dict):
     df = pd.DataFrame(respostas_dict.values())
@@ -673,36 +831,84 @@ def calcular_scores(respostas_dict):
     return df, dominio_media, media_geral
 
 
-def plot_radar(dominio_media):
-    dominio_media = dominio_media.dropna(subset=["media_dominio"])
-    if dominio_media.empty:
-        fig, ax = plt.subplots(figsize=(5, 3))
-        ax.axis("off")
-        ax.text(0.5, 0.5, "Sem dados suficientes\npara o gráfico de radar.", ha="center", va="center")
-        return fig
+# ---------------------------------------------------------
+# Avaliação processada na sessão: só o id, os códigos dos itens e as respostas
+# (int8). Cadastro, textos, tabela de itens e médias são reconstruídos a partir
+# de caches compartilhados entre as sessões, em vez de ficarem copiados em cada uma.
+# ---------------------------------------------------------
+def resultado_compacto(aluno_id, df_itens):
+    return {
+        "aluno_id": int(aluno_id),
+        "itens": tuple(df_itens["item_codigo"].tolist()),
+        "respostas": df_itens["resposta"].to_numpy(dtype=np.int8),
+    }
+
+
+@lru_cache(maxsize=None)
+def mapa_itens_instrumento(ano_escolar):
+    """{código do item: (código da dimensão, nome da dimensão, texto do item)} do instrumento do ano."""
+    return {
+        item_code: (dom_code, dom_data["nome"], item_text)
+        for dom_code, dom_data in get_instrumento_para_ano(ano_escolar).items()
+        for item_code, item_text in dom_data["itens"]
+    }
 
-    labels = []
-    valores = []
-    for _, row in dominio_media.iterrows():
-        labels.append(row["dominio_nome"])
-        valores.append(row["media_dominio"])
 
-    num_vars = len(labels)
-    angles = np.linspace(0, 2 * np.pi, num_vars, endpoint=False).tolist()
-    valores += valores[:1]
-    angles += angles[:1]
+@st.cache_data(show_spinner=False, max_entries=512)
+def escores_avaliacao(ano_escolar, itens, respostas):
+    """df_itens, dominio_media e media_geral (como calcular_scores) a partir das respostas compactas."""
+    mapa = mapa_itens_instrumento(ano_escolar)
+    respostas_dict = {}
+    for item_code, valor in zip(itens, respostas.tolist()):
+        dom_code, dom_nome, item_text = mapa[item_code]
+        respostas_dict[item_code] = {
+            "dominio": dom_code,
+            "dominio_nome": dom_nome,
+            "item_codigo": item_code,
+            "item_texto": item_text,
+            "resposta": valor,
+        }
+    return calcular_scores(respostas_dict)
+
+
+@lru_cache(maxsize=None)
+def dominios_instrumento(ano_escolar):
+    """
+    Dimensões do instrumento do ano e a matriz de pertença itens × dimensões
+    (1 quando o item, na ordem de mapa_itens_instrumento, é daquela dimensão).
+    """
+    mapa = mapa_itens_instrumento(ano_escolar)
+    dominios = list(dict.fromkeys((dom_code, dom_nome) for dom_code, dom_nome, _ in mapa.values()))
+    posicao = {dom_code: j for j, (dom_code, _) in enumerate(dominios)}
+    pertenca = np.zeros((len(mapa), len(dominios)))
+    pertenca[np.arange(len(mapa)), [posicao[dom_code] for dom_code, _, _ in mapa.values()]] = 1.0
+    return dominios, pertenca
 
-    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(polar=True))
-    ax.plot(angles, valores, linewidth=2, linestyle="solid")
-    ax.fill(angles, valores, alpha=0.25)
 
-    ax.set_xticks(angles[:-1])
-    ax.set_xticklabels(labels, fontsize=9)
-    ax.set_yticks([1, 2, 3, 4, 5])
-    ax.set_yticklabels(["1", "2", "3", "4", "5"], fontsize=8)
-    ax.set_ylim(1, 5)
-    ax.set_title("Perfil por dimensão (escala interna 1–5)", fontsize=12, pad=20)
-    return fig
+def calcular_scores_turma(ano_escolar, respostas):
+    """
+    calcular_scores para a turma inteira de uma vez.
+    respostas: matriz estudantes × itens (ordem de mapa_itens_instrumento), 1–5, 0 = não respondido.
+    Retorna (medias_dominio estudantes × dimensões, media_geral por estudante), NaN sem respostas.
+    """
+    _, pertenca = dominios_instrumento(ano_escolar)
+    validas = respostas > 0
+    soma = np.where(validas, respostas, 0) @ pertenca
+    contagem = validas @ pertenca
+    with np.errstate(invalid="ignore", divide="ignore"):
+        medias_dominio = soma / contagem
+        media_geral = soma.sum(axis=1) / contagem.sum(axis=1)
+    return medias_dominio, media_geral
+
+
+def mostrar_radar(dominio_media):
+    """Exibe o radar na tela com o motor configurado."""
+    if RADAR_MOTOR == "matplotlib":
+        fig = plot_radar(dominio_media)
+        st.pyplot(fig)
+        fechar_figura(fig)
+    else:
+        st.image(radar_svg(dominio_media))
 
 
 def get_logo_base64():
@@ -720,68 +926,46 @@ def texto_sem_ia():
 
 
 # =========================================================
-# IA – RELATÓRIO, SUGESTÕES, PLANO TURMA
+# IA – MONTAGEM DE PROMPTS E CONTROLE DE TOKENS
 # =========================================================
-def gerar_relatorio_ia(
-    sexo,
-    dominio_media,
-    media_geral,
-    ano_escolar,
-    boletim_texto,
-    neuroatipico,
-    pei_resumo,
-    observacoes_gerais,
-):
-    if not OPENAI_ENABLED:
-        return texto_sem_ia()
-
-    dominio_media_valid = dominio_media.dropna(subset=["media_dominio"])
-    resumo_dim = []
-    nomes_dim = []
-    for _, row in dominio_media_valid.iterrows():
-        resumo_dim.append(f"- {row['dominio_nome']}: valor médio interno {row['media_dominio']:.2f}")
-        nomes_dim.append(f"- {row['dominio_nome']}")
-    resumo_dim_str = "\n".join(resumo_dim)
-    nomes_dim_str = "\n".join(nomes_dim)
-
-    boletim_info = boletim_texto if boletim_texto else "sem resumo específico informado."
-    neuro_txt = (
-        "Aluno com necessidades educacionais específicas, com informações complementares registradas em um plano individual."
-        if neuroatipico
-        else "Aluno sem registro de plano individual específico."
-    )
-    pei_info = pei_resumo if pei_resumo else "sem registro complementar do plano educacional individualizado."
-    obs_info = observacoes_gerais if observacoes_gerais else "sem registro adicional da professora."
-
-    prompt_user = f"""
-Você é pedagogo especialista em educação básica.
-
-Escreva um RELATÓRIO DESCRITIVO e INTERPRETATIVO, em português do Brasil,
-sobre o desenvolvimento de um estudante, com base em observações organizadas por dimensões,
-em informações de boletim escolar (quando disponíveis) e em registros de um plano educacional individualizado (quando houver).
-
-Dados contextuais:
-- Etapa / ano escolar: {ano_escolar or "não informado"}
-- Sexo declarado: {sexo or "não informado"}
-- Situação quanto a necessidades específicas: {neuro_txt}
-- Resumo do boletim escolar (quando informado): {boletim_info}
-- Informações relevantes do plano educacional individualizado (PEI): {pei_info}
-- Observações gerais da professora sobre o estudante: {obs_info}
-
-Valores internos por dimensão (escala 1 a 5, uso apenas como referência técnica):
-{resumo_dim_str}
+MODELO_IA = "gpt-4o-mini"
+
+# Aproximação usada para orçamento: ~4 caracteres por token em português
+CARACTERES_POR_TOKEN = 4
+
+# Orçamento máximo (em tokens estimados) de cada seção variável do prompt
+ORCAMENTO_TOKENS_SECAO = {
+    "contexto": 200,
+    "dimensoes": 300,
+    "boletim": 350,
+    "pei": 450,
+    "observacoes": 250,
+}
 
-Lista das dimensões (use exatamente esses nomes na interpretação):
-{nomes_dim_str}
+# Prefixo estático compartilhado por todas as chamadas. Fica sempre no início
+# da conversa e nunca muda, para aproveitar o cache de prompt da API; tudo o
+# que varia por estudante/turma vai no final da mensagem do usuário.
+PROMPT_PREFIXO_ESTATICO = """
+Você é pedagogo especialista em educação básica e escreve textos para escolas e famílias
+(relatórios descritivos, orientações para casa e planos de turma) em português do Brasil,
+com linguagem acessível, positiva e profissional.
 
-Regras:
-- Escreva texto corrido, em parágrafos, sem títulos formais, voltado a famílias e escola.
+Regras gerais, válidas para qualquer texto:
+- Escreva em parágrafos, em texto corrido.
 - NÃO mencione números, notas, médias ou a expressão "escala".
-- Não use termos clínicos (TDAH, TEA etc.).
-- Use termos como "a criança", "o estudante", "o aluno".
-- Linguagem positiva: fale em avanços, habilidades em desenvolvimento, processos de consolidação,
+- Não faça diagnóstico e não use termos clínicos (TDAH, TEA etc.).
+- Comunicação positiva: fale em avanços, habilidades em desenvolvimento e processos de consolidação,
   evitando frases negativas diretas.
-- Considere que o boletim, o PEI e as observações gerais são fontes complementares às observações de sala.
+- Os valores por dimensão (1 a 5) são apenas referência técnica interna.
+- Use exatamente os nomes das dimensões informados nos dados.
+- Boletim, PEI e observações da professora são fontes complementares às observações de sala.
+""".strip()
+
+INSTRUCOES_RELATORIO = """
+TAREFA: escreva um RELATÓRIO DESCRITIVO e INTERPRETATIVO sobre o desenvolvimento de um estudante,
+voltado a famílias e escola.
+- Sem títulos formais.
+- Use termos como "a criança", "o estudante", "o aluno".
 - Se o aluno tem necessidades específicas, faça pelo menos um parágrafo reforçando a importância
   do olhar individual e das adaptações, sem citar siglas ou diagnósticos.
 
@@ -791,274 +975,1100 @@ Estrutura:
 3. Parágrafo(s) de habilidades em desenvolvimento.
 4. Pelo menos um parágrafo para cada dimensão listada.
 5. Parágrafos finais sobre parceria família-escola e próximos passos.
-"""
-
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Você é pedagogo especialista em educação básica, escreve relatórios "
-                        "descritivos em linguagem acessível, positiva e profissional."
-                    ),
-                },
-                {"role": "user", "content": prompt_user},
-            ],
-            temperature=0.65,
-            max_tokens=1200,
-        )
-        return resp.choices[0].message.content.strip()
-    except Exception:
-        return texto_sem_ia()
-
-
-def gerar_sugestoes_ia(dominio_media, ano_escolar, neuroatipico, boletim_texto, pei_resumo, observacoes_gerais):
-    if not OPENAI_ENABLED:
-        return texto_sem_ia()
+""".strip()
 
-    dominio_media_valid = dominio_media.dropna(subset=["media_dominio"])
-    resumo_dim = []
-    nomes_dim = []
-    for _, row in dominio_media_valid.iterrows():
-        resumo_dim.append(f"- {row['dominio_nome']}: média interna {row['media_dominio']:.2f}")
-        nomes_dim.append(f"- {row['dominio_nome']}")
-    resumo_dim_str = "\n".join(resumo_dim)
-    nomes_dim_str = "\n".join(nomes_dim)
-
-    foco_texto = (
-        "plano de estudo complementar para o estudante"
-        if ano_tem_boletim(ano_escolar or "")
-        else "sugestões de atividades em casa"
-    )
-    neuro_txt = (
-        "Considere que a criança se beneficia de adaptações simples, como tempos diferenciados, apoio visual e instruções em etapas."
-        if neuroatipico
-        else "Considere que as orientações devem ser gerais, acolhedoras e realistas para famílias diversas."
-    )
-    boletim_info = boletim_texto if boletim_texto else "sem resumo específico informado."
-    pei_info = pei_resumo if pei_resumo else "sem registro complementar do plano educacional individualizado."
-    obs_info = observacoes_gerais if observacoes_gerais else "sem registro adicional da professora."
-
-    prompt_user = f"""
-Você é pedagogo e vai elaborar um {foco_texto} para famílias.
-
-Médias internas por dimensão (escala técnica 1 a 5, apenas referência):
-{resumo_dim_str}
-
-Lista das dimensões:
-{nomes_dim_str}
-
-Informações adicionais:
-- Resumo do boletim escolar: {boletim_info}
-- Principais pontos do PEI (quando houver): {pei_info}
-- Observações gerais da professora: {obs_info}
-- Orientação geral: {neuro_txt}
-
-Instruções:
-- Escreva em português, linguagem simples e acolhedora, voltada a famílias.
-- NÃO cite números, notas, médias ou a expressão "escala".
-- Não faça diagnóstico clínico.
-- Use comunicação positiva, com foco em como a família pode apoiar o estudante.
+INSTRUCOES_SUGESTOES = """
+TAREFA: elabore orientações para a família, no formato indicado em "Tipo de orientação".
+- Linguagem simples e acolhedora, com foco em como a família pode apoiar o estudante.
 - Para educação infantil e anos iniciais, foque em brincadeiras, rotinas, leitura, conversas.
 - Para anos finais do fundamental e médio, foque em hábitos de estudo, leitura, organização
   e atividades práticas ligadas às áreas de conhecimento.
 - Para CADA dimensão, faça pelo menos um parágrafo iniciando pelo nome da dimensão.
-"""
+""".strip()
+
+INSTRUCOES_RELATORIO_E_SUGESTOES = (
+    "TAREFA: produza DOIS textos sobre o mesmo estudante e responda APENAS com um objeto JSON "
+    'no formato {"relatorio": "...", "sugestoes": "..."}, com parágrafos separados por \\n\\n '
+    "dentro de cada texto.\n\n"
+    "Texto \"relatorio\":\n" + INSTRUCOES_RELATORIO.replace("TAREFA: escreva", "Escreva") + "\n\n"
+    "Texto \"sugestoes\":\n" + INSTRUCOES_SUGESTOES.replace("TAREFA: elabore", "Elabore")
+)
 
-    try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Você gera orientações para famílias sobre como apoiar estudantes em casa, "
-                        "sempre com comunicação positiva."
-                    ),
-                },
-                {"role": "user", "content": prompt_user},
-            ],
-            temperature=0.7,
-            max_tokens=1200,
-        )
-        return resp.choices[0].message.content.strip()
-    except Exception:
-        return texto_sem_ia()
+INSTRUCOES_PLANO_TURMA = """
+TAREFA: elabore um PLANO DE DESENVOLVIMENTO GLOBAL DA TURMA, com linguagem voltada à equipe escolar.
+- Sem bullets.
+- Desafios descritos como "habilidades em desenvolvimento".
+- Explique o foco de cada dimensão e sugira estratégias concretas de trabalho com a turma.
+- Em cada dimensão, inclua um trecho com "Exemplos práticos: ..." em frases corridas.
 
+Estrutura:
+1. Parágrafos iniciais com síntese e "Objetivo geral:".
+2. Bloco por dimensão.
+3. Parágrafos finais com recomendações de rotina e parceria com famílias.
+""".strip()
 
-def gerar_plano_turma_ia(dominio_media_turma, contexto_str=""):
-    if not OPENAI_ENABLED:
-        return texto_sem_ia()
 
-    dominio_media_valid = dominio_media_turma.dropna(subset=["media_dominio"])
-    resumo_dim = []
-    nomes_dim = []
-    for _, row in dominio_media_valid.iterrows():
-        resumo_dim.append(f"- {row['dominio_nome']}: média interna {row['media_dominio']:.2f}")
-        nomes_dim.append(f"- {row['dominio_nome']}")
-    resumo_dim_str = "\n".join(resumo_dim)
-    nomes_dim_str = "\n".join(nomes_dim)
+def estimar_tokens(texto):
+    """Estimativa rápida de tokens, sem depender de tokenizador externo."""
+    if not texto:
+        return 0
+    return -(-len(texto) // CARACTERES_POR_TOKEN)
 
-    prompt_user = f"""
-Você é pedagogo especialista em planejamento de turma.
 
-Elabore um PLANO DE DESENVOLVIMENTO GLOBAL DA TURMA, em português,
-com linguagem voltada à equipe escolar.
+def truncar_para_orcamento(texto, max_tokens):
+    """Corta o texto para caber em max_tokens (estimados), preferindo quebrar em fim de linha ou palavra."""
+    texto = (texto or "").strip()
+    if estimar_tokens(texto) <= max_tokens:
+        return texto
+    limite = max_tokens * CARACTERES_POR_TOKEN
+    corte = texto[:limite]
+    pos = max(corte.rfind("\n"), corte.rfind(" "))
+    if pos > limite // 2:
+        corte = corte[:pos]
+    return corte.rstrip() + " […]"
 
-Contexto da turma:
-{contexto_str}
 
-Médias internas por dimensão (referência técnica, escala 1 a 5):
-{resumo_dim_str}
+def resumo_dimensoes_prompt(dominio_media):
+    """Lista única das dimensões com o valor interno, usada em todos os prompts."""
+    dominio_media_valid = dominio_media.dropna(subset=["media_dominio"])
+    return "\n".join(
+        f"- {nome}: {valor:.2f}"
+        for nome, valor in zip(dominio_media_valid["dominio_nome"], dominio_media_valid["media_dominio"])
+    )
 
-Dimensões avaliadas:
-{nomes_dim_str}
 
-Regras:
-- Texto em parágrafos, sem bullets.
-- Não citar notas ou médias, nem a expressão "escala".
-- Comunicação positiva, desafios como "habilidades em desenvolvimento".
-- Explique o foco de cada dimensão e sugira estratégias concretas de trabalho com a turma.
-- Em cada dimensão, inclua um trecho com "Exemplos práticos: ..." em frases corridas.
+def montar_prompt(instrucoes, secoes):
+    """
+    Monta a mensagem do usuário: instruções fixas da tarefa primeiro e,
+    por último, as seções variáveis, cada uma limitada ao seu orçamento.
+    secoes: lista de (titulo, texto, chave_orcamento ou None).
+    """
+    partes = [instrucoes, "", "DADOS:"]
+    for titulo, texto, chave in secoes:
+        if chave in ORCAMENTO_TOKENS_SECAO:
+            texto = truncar_para_orcamento(texto, ORCAMENTO_TOKENS_SECAO[chave])
+        if "\n" in texto:
+            partes.append(f"{titulo}:\n{texto}")
+        else:
+            partes.append(f"{titulo}: {texto}")
+    return "\n".join(partes)
 
-Estrutura:
-1. Parágrafos iniciais com síntese e "Objetivo geral:".
-2. Bloco por dimensão.
-3. Parágrafos finais com recomendações de rotina e parceria com famílias.
-"""
 
+@lru_cache(maxsize=None)
+def banco_uso_ia():
+    """
+    Cria, uma vez por processo, o banco do consumo da IA (lru_cache e não
+    st.cache_resource: as chamadas também vêm da thread de pré-geração). Registros
+    de versões que os guardavam no banco das avaliações são trazidos para cá.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(USO_IA_DB_PATH)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS uso_ia (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        tarefa TEXT,
+        modelo TEXT,
+        prompt_tokens INTEGER,
+        completion_tokens INTEGER,
+        cached_tokens INTEGER,
+        duracao_s REAL
+    )
+    """)
+    if os.path.exists(DB_PATH):
+        conn.execute("ATTACH DATABASE ? AS avaliacoes", (DB_PATH,))
+        antiga = conn.execute(
+            "SELECT 1 FROM avaliacoes.sqlite_master WHERE type = 'table' AND name = 'uso_ia'"
+        ).fetchone()
+        if antiga:
+            with conn:
+                conn.execute(
+                    """
+                    INSERT INTO main.uso_ia (timestamp, tarefa, modelo, prompt_tokens, completion_tokens, cached_tokens, duracao_s)
+                    SELECT timestamp, tarefa, modelo, prompt_tokens, completion_tokens, cached_tokens, duracao_s
+                    FROM avaliacoes.uso_ia ORDER BY id
+                    """
+                )
+                conn.execute("DROP TABLE avaliacoes.uso_ia")
+        conn.execute("DETACH DATABASE avaliacoes")
+    conn.commit()
+    conn.close()
+    return True
+
+
+def registrar_uso_ia(tarefa, resp, duracao_s):
+    """Grava tokens de entrada/saída (resp.usage) e latência de cada chamada à IA."""
+    usage = getattr(resp, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", None)
+    completion_tokens = getattr(usage, "completion_tokens", None)
+    detalhes = getattr(usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(detalhes, "cached_tokens", None)
+    try:
+        banco_uso_ia()
+        conn = sqlite3.connect(USO_IA_DB_PATH)
+        conn.execute(
+            """
+            INSERT INTO uso_ia (timestamp, tarefa, modelo, prompt_tokens, completion_tokens, cached_tokens, duracao_s)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            """,
+            (
+                datetime.now().strftime("%Y%m%d_%H%M%S"),
+                tarefa,
+                getattr(resp, "model", MODELO_IA),
+                prompt_tokens,
+                completion_tokens,
+                cached_tokens,
+                round(duracao_s, 3),
+            ),
+        )
+        conn.commit()
+        conn.close()
+    except Exception:
+        # contabilidade nunca deve derrubar a geração do texto
+        pass
+
+
+class EstadoIA:
+    """Atividade da IA compartilhada entre sessões (chamadas interativas x pré-geração)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.interativas_em_andamento = 0
+        self.ultima_interativa = 0.0
+        self.chamadas_prefetch = deque()
+        # marca as chamadas feitas pela thread de pré-geração
+        self.thread = threading.local()
+
+    def inicio_interativa(self):
+        with self.lock:
+            self.interativas_em_andamento += 1
+            self.ultima_interativa = time.monotonic()
+
+    def fim_interativa(self):
+        with self.lock:
+            self.interativas_em_andamento -= 1
+            self.ultima_interativa = time.monotonic()
+
+    def ociosa(self, janela_s):
+        with self.lock:
+            return (
+                self.interativas_em_andamento == 0
+                and time.monotonic() - self.ultima_interativa >= janela_s
+            )
+
+    def reservar_prefetch(self, max_por_minuto):
+        """Reserva uma chamada do orçamento de pré-geração (False se o orçamento do minuto acabou)."""
+        agora = time.monotonic()
+        with self.lock:
+            while self.chamadas_prefetch and agora - self.chamadas_prefetch[0] > 60:
+                self.chamadas_prefetch.popleft()
+            if len(self.chamadas_prefetch) >= max_por_minuto:
+                return False
+            self.chamadas_prefetch.append(agora)
+            return True
+
+
+@st.cache_resource
+def estado_ia():
+    return EstadoIA()
+
+
+def chamar_ia(tarefa, prompt_user, temperature, max_tokens, response_format=None):
+    """Retorna o texto gerado ou None quando a IA está desativada ou falhou."""
+    if not IA_ATIVA:
+        return None
+    parametros = {}
+    if response_format is not None:
+        parametros["response_format"] = response_format
+    estado = estado_ia()
+    interativa = not getattr(estado.thread, "prefetch", False)
+    if interativa:
+        estado.inicio_interativa()
+    inicio = time.perf_counter()
     try:
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
+        resp = cliente_openai().chat.completions.create(
+            model=MODELO_IA,
             messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "Você elabora planos pedagógicos para turmas, com foco em desenvolvimento global."
-                    ),
-                },
+                {"role": "system", "content": PROMPT_PREFIXO_ESTATICO},
                 {"role": "user", "content": prompt_user},
             ],
-            temperature=0.7,
-            max_tokens=1400,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            **parametros,
         )
-        return resp.choices[0].message.content.strip()
+        registrar_uso_ia(tarefa, resp, time.perf_counter() - inicio)
+        conteudo = resp.choices[0].message.content
+        # resposta sem texto (ex.: recusa ou corte) conta como falha
+        return conteudo.strip() if conteudo is not None else None
     except Exception:
-        return texto_sem_ia()
+        return None
+    finally:
+        if interativa:
+            estado.fim_interativa()
 
 
 # =========================================================
-# BANCO DE DADOS
+# IA – RELATÓRIO, SUGESTÕES, PLANO TURMA
 # =========================================================
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
+def secoes_dados_estudante(dominio_media, boletim_texto, pei_resumo, observacoes_gerais):
+    """Seções variáveis comuns a relatório e sugestões (sempre no final do prompt)."""
+    return [
+        ("Dimensões (valor interno)", resumo_dimensoes_prompt(dominio_media), "dimensoes"),
+        ("Boletim escolar", boletim_texto or "sem resumo específico informado.", "boletim"),
+        ("Plano educacional individualizado (PEI)",
+         pei_resumo or "sem registro complementar do plano educacional individualizado.", "pei"),
+        ("Observações gerais da professora",
+         observacoes_gerais or "sem registro adicional da professora.", "observacoes"),
+    ]
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS alunos (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        escola TEXT,
-        turno TEXT,
-        ano_escolar TEXT,
-        turma TEXT,
-        ano_letivo TEXT,
-        bimestre TEXT,
-        nome_crianca TEXT,
-        idade TEXT,
-        sexo TEXT,
-        nome_professora TEXT,
-        neuroatipico INTEGER,
-        boletim_texto TEXT,
-        media_geral REAL,
-        relatorio_texto TEXT,
-        sugestoes_texto TEXT,
-        observacoes_gerais TEXT
-    )
-    """)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS respostas (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        aluno_id INTEGER,
-        dominio TEXT,
-        dominio_nome TEXT,
-        item_codigo TEXT,
-        item_texto TEXT,
-        resposta INTEGER,
-        observacao TEXT,
-        FOREIGN KEY(aluno_id) REFERENCES alunos(id)
-    )
-    """)
+def _neuro_txt_relatorio(neuroatipico):
+    if neuroatipico:
+        return "Aluno com necessidades educacionais específicas, com informações complementares registradas em um plano individual."
+    return "Aluno sem registro de plano individual específico."
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS dominios (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        aluno_id INTEGER,
-        dominio TEXT,
-        dominio_nome TEXT,
-        media_dominio REAL,
-        FOREIGN KEY(aluno_id) REFERENCES alunos(id)
-    )
-    """)
 
-    cur.execute("""
-    CREATE TABLE IF NOT EXISTS pei (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        timestamp TEXT,
-        escola TEXT,
-        nome_crianca TEXT,
-        ano_escolar TEXT,
-        ano_letivo TEXT,
-        perfil TEXT,
-        pontos_fortes TEXT,
-        habilidades_desenvolvimento TEXT,
-        recursos_apoio TEXT,
-        estrategias_metodologicas TEXT,
-        adaptacoes_avaliacao TEXT,
-        participacao_familia TEXT
-    )
-    """)
+def _neuro_txt_sugestoes(neuroatipico):
+    if neuroatipico:
+        return "Considere que a criança se beneficia de adaptações simples, como tempos diferenciados, apoio visual e instruções em etapas."
+    return "Considere que as orientações devem ser gerais, acolhedoras e realistas para famílias diversas."
 
-    conn.commit()
-    conn.close()
 
+def _foco_sugestoes(ano_escolar):
+    if ano_tem_boletim(ano_escolar or ""):
+        return "plano de estudo complementar para o estudante"
+    return "sugestões de atividades em casa"
 
-def salvar_no_banco(
-    timestamp_str,
-    escola,
-    turno,
-    ano_escolar,
-    turma,
-    ano_letivo,
-    bimestre,
-    nome_crianca,
+
+def gerar_relatorio_ia(
     sexo,
-    nome_professora,
-    neuroatipico,
-    boletim_texto,
+    dominio_media,
     media_geral,
-    relatorio_texto,
-    sugestoes_texto,
+    ano_escolar,
+    boletim_texto,
+    neuroatipico,
+    pei_resumo,
     observacoes_gerais,
-    df_itens,
-    dominio_media,
+    fallback_local=True,
 ):
-    init_db()
-    conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        INSERT INTO alunos (
-            timestamp, escola, turno, ano_escolar, turma, ano_letivo, bimestre,
-            nome_crianca, idade, sexo, nome_professora, neuroatipico,
-            boletim_texto, media_geral, relatorio_texto, sugestoes_texto,
-            observacoes_gerais
+    """Sem IA, ou se a chamada falhar, usa o texto local; com fallback_local=False a falha retorna None."""
+    if not IA_ATIVA:
+        return gerar_relatorio_local(
+            sexo, dominio_media, media_geral, ano_escolar,
+            boletim_texto, neuroatipico, pei_resumo, observacoes_gerais,
         )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+
+    prompt_user = montar_prompt(
+        INSTRUCOES_RELATORIO,
+        [
+            ("Etapa / ano escolar", ano_escolar or "não informado", None),
+            ("Sexo declarado", sexo or "não informado", None),
+            ("Situação quanto a necessidades específicas", _neuro_txt_relatorio(neuroatipico), None),
+        ]
+        + secoes_dados_estudante(dominio_media, boletim_texto, pei_resumo, observacoes_gerais),
+    )
+    texto = chamar_ia("relatorio", prompt_user, temperature=0.65, max_tokens=1200)
+    if texto is None and fallback_local:
+        return gerar_relatorio_local(
+            sexo, dominio_media, media_geral, ano_escolar,
+            boletim_texto, neuroatipico, pei_resumo, observacoes_gerais,
+        )
+    return texto
+
+
+def gerar_sugestoes_ia(
+    dominio_media, ano_escolar, neuroatipico, boletim_texto, pei_resumo, observacoes_gerais, fallback_local=True,
+):
+    """Como gerar_relatorio_ia: falha da IA vira o texto local, ou None com fallback_local=False."""
+    if not IA_ATIVA:
+        return gerar_sugestoes_local(
+            dominio_media, ano_escolar, neuroatipico, boletim_texto, pei_resumo, observacoes_gerais,
+        )
+
+    prompt_user = montar_prompt(
+        INSTRUCOES_SUGESTOES,
+        [
+            ("Tipo de orientação", _foco_sugestoes(ano_escolar), None),
+            ("Etapa / ano escolar", ano_escolar or "não informado", None),
+            ("Orientação geral", _neuro_txt_sugestoes(neuroatipico), None),
+        ]
+        + secoes_dados_estudante(dominio_media, boletim_texto, pei_resumo, observacoes_gerais),
+    )
+    texto = chamar_ia("sugestoes", prompt_user, temperature=0.7, max_tokens=1200)
+    if texto is None and fallback_local:
+        return gerar_sugestoes_local(
+            dominio_media, ano_escolar, neuroatipico, boletim_texto, pei_resumo, observacoes_gerais,
+        )
+    return texto
+
+
+def separar_textos_json(conteudo):
+    """Valida a resposta estruturada e devolve (relatorio, sugestoes) ou None se inválida."""
+    if not conteudo:
+        return None
+    try:
+        dados = json.loads(conteudo)
+    except ValueError:
+        return None
+    if not isinstance(dados, dict):
+        return None
+    relatorio = dados.get("relatorio")
+    sugestoes = dados.get("sugestoes")
+    if not isinstance(relatorio, str) or not isinstance(sugestoes, str):
+        return None
+    if not relatorio.strip() or not sugestoes.strip():
+        return None
+    return relatorio.strip(), sugestoes.strip()
+
+
+def gerar_relatorio_e_sugestoes_ia(
+    sexo,
+    dominio_media,
+    ano_escolar,
+    boletim_texto,
+    neuroatipico,
+    pei_resumo,
+    observacoes_gerais,
+):
+    """
+    Relatório e sugestões em uma única chamada com saída JSON (o contexto do
+    estudante é enviado uma vez só). Retorna (relatorio, sugestoes), ou None se
+    a IA está inativa ou a resposta não pôde ser validada; a volta para as duas
+    chamadas separadas fica em gerar_textos_estudante.
+    """
+    if not IA_ATIVA:
+        return None
+    prompt_user = montar_prompt(
+        INSTRUCOES_RELATORIO_E_SUGESTOES,
+        [
+            ("Etapa / ano escolar", ano_escolar or "não informado", None),
+            ("Sexo declarado", sexo or "não informado", None),
+            ("Situação quanto a necessidades específicas", _neuro_txt_relatorio(neuroatipico), None),
+            ("Tipo de orientação", _foco_sugestoes(ano_escolar), None),
+            ("Orientação geral para a família", _neuro_txt_sugestoes(neuroatipico), None),
+        ]
+        + secoes_dados_estudante(dominio_media, boletim_texto, pei_resumo, observacoes_gerais),
+    )
+    conteudo = chamar_ia(
+        "relatorio_sugestoes",
+        prompt_user,
+        temperature=0.65,
+        max_tokens=2400,
+        response_format={"type": "json_object"},
+    )
+    return separar_textos_json(conteudo)
+
+
+def gerar_textos_estudante(
+    sexo,
+    dominio_media,
+    media_geral,
+    ano_escolar,
+    boletim_texto,
+    neuroatipico,
+    pei_resumo,
+    observacoes_gerais,
+    fallback_local=True,
+):
+    """
+    Relatório e sugestões do estudante, em chamada única ou em duas chamadas conforme IA_CHAMADA_UNICA
+    (a chamada única cuja resposta não pôde ser validada volta para as duas chamadas).
+    fallback_local=False: o texto cuja chamada à IA falhou vem como None em vez do texto local.
+    """
+    if IA_ATIVA and IA_CHAMADA_UNICA:
+        textos = gerar_relatorio_e_sugestoes_ia(
+            sexo, dominio_media, ano_escolar, boletim_texto, neuroatipico, pei_resumo, observacoes_gerais,
+        )
+        if textos is not None:
+            return textos
+        # resposta JSON inválida: duas chamadas separadas
+    relatorio = gerar_relatorio_ia(
+        sexo, dominio_media, media_geral, ano_escolar,
+        boletim_texto, neuroatipico, pei_resumo, observacoes_gerais, fallback_local,
+    )
+    sugestoes = gerar_sugestoes_ia(
+        dominio_media, ano_escolar, neuroatipico, boletim_texto, pei_resumo, observacoes_gerais, fallback_local,
+    )
+    return relatorio, sugestoes
+
+
+def gerar_plano_turma_ia(dominio_media_turma, contexto_str=""):
+    if not IA_ATIVA:
+        return texto_sem_ia()
+
+    prompt_user = montar_prompt(
+        INSTRUCOES_PLANO_TURMA,
+        [
+            ("Contexto da turma", contexto_str or "não informado", "contexto"),
+            ("Dimensões (valor interno)", resumo_dimensoes_prompt(dominio_media_turma), "dimensoes"),
+        ],
+    )
+    texto = chamar_ia("plano_turma", prompt_user, temperature=0.7, max_tokens=1400)
+    return texto if texto is not None else texto_sem_ia()
+
+
+def resumo_uso_ia():
+    """Consumo médio de tokens e latência por tipo de texto gerado."""
+    if not os.path.exists(USO_IA_DB_PATH) and not os.path.exists(DB_PATH):
+        return pd.DataFrame()
+    banco_uso_ia()
+    conn = sqlite3.connect(USO_IA_DB_PATH)
+    df_uso = pd.read_sql_query(
+        """
+        SELECT tarefa,
+               COUNT(*) AS chamadas,
+               AVG(prompt_tokens) AS prompt_tokens_medio,
+               AVG(completion_tokens) AS completion_tokens_medio,
+               SUM(COALESCE(prompt_tokens, 0) + COALESCE(completion_tokens, 0)) AS tokens_total,
+               AVG(duracao_s) AS latencia_media_s
+        FROM uso_ia
+        GROUP BY tarefa
+        ORDER BY tarefa
+        """,
+        conn,
+    )
+    conn.close()
+    return df_uso
+
+
+# =========================================================
+# TEXTOS LOCAIS (SEM IA) – RELATÓRIO E SUGESTÕES POR MODELO
+# =========================================================
+# Frases por faixa da escala (LIKERT_LABELS), usadas pelo gerador local.
+FRASES_FAIXA_RELATORIO = {
+    1: "as habilidades ainda estão começando a aparecer e se beneficiam de propostas intencionais e acompanhamento próximo",
+    2: "as habilidades já aparecem com o apoio do adulto, e cada nova experiência amplia a segurança para realizá-las",
+    3: "as habilidades estão em desenvolvimento, com avanços perceptíveis nas propostas do dia a dia",
+    4: "as habilidades estão quase consolidadas, sendo demonstradas com frequência e crescente autonomia",
+    5: "as habilidades estão consolidadas e são demonstradas com autonomia em diferentes situações",
+}
+
+FRASES_VISAO_GERAL = {
+    1: "vive um momento inicial de construção de muitas aprendizagens, com conquistas que merecem ser valorizadas a cada etapa",
+    2: "vem construindo suas aprendizagens com o apoio dos adultos, mostrando disposição para participar das propostas",
+    3: "apresenta um processo de desenvolvimento ativo, com avanços em diferentes dimensões observadas",
+    4: "apresenta um desenvolvimento consistente, com muitas habilidades próximas da consolidação",
+    5: "apresenta um desenvolvimento muito consistente, com autonomia nas diferentes dimensões observadas",
+}
+
+# Orientações para casa por área (códigos de dimensão dos instrumentos).
+SUGESTOES_CASA_POR_DOMINIO = {
+    "CE1": "brincadeiras em família que envolvam combinar regras, esperar a vez e cuidar de objetos e espaços da casa",
+    "CE2": "brincadeiras de movimento, como pular, equilibrar-se, dançar e montar circuitos simples com almofadas",
+    "CE3": "momentos para desenhar, pintar, modelar massinha e cantar ou ouvir músicas juntos",
+    "CE4": "leitura diária de histórias, conversas sobre o dia e perguntas abertas que incentivem a criança a contar suas ideias",
+    "CE5": "situações de contar objetos, comparar tamanhos, organizar brinquedos e conversar sobre a sequência da rotina",
+    "LP": "leitura compartilhada, conversa sobre os textos lidos e pequenas produções escritas, como listas, bilhetes e recados",
+    "MAT": "jogos de tabuleiro, situações de compra e troco, receitas e desafios com quantidades do cotidiano",
+    "CIE": "observação da natureza, pequenos experimentos caseiros e conversas sobre saúde, alimentação e cuidados com o corpo",
+    "HGE": "passeios pelo bairro, conversas sobre a história da família e uso de mapas simples ou aplicativos de localização",
+    "SOC": "combinados claros de rotina, responsabilidades adequadas à idade e conversas acolhedoras sobre sentimentos",
+    "LCH": "leitura e discussão de notícias, filmes e textos de opinião, valorizando argumentos respeitosos",
+    "CNM": "análise de gráficos e dados do cotidiano, como contas da casa ou notícias, e resolução de problemas práticos",
+    "PV": "conversas sobre interesses, metas de estudo e possibilidades de futuro, com pequenos planos de ação semanais",
+}
+
+SUGESTAO_CASA_PADRAO = "atividades do cotidiano que envolvam conversa, leitura e resolução de pequenos desafios"
+
+FRASES_FAIXA_SUGESTOES = {
+    1: "Com propostas curtas, frequentes e acompanhadas de perto, a família pode apoiar os primeiros passos nesta área",
+    2: "Com apoio e incentivo, a família pode ajudar a transformar as conquistas recentes em hábitos",
+    3: "Para fortalecer os avanços em andamento, vale manter momentos regulares em casa",
+    4: "Para ajudar a consolidar o que já está muito próximo, a família pode propor desafios com mais autonomia",
+    5: "Para ampliar o que já está consolidado, a família pode oferecer desafios novos e valorizar a autonomia",
+}
+
+# Campos do PEI na ordem em que aparecem no resumo (coluna, rótulo)
+PEI_CAMPOS = [
+    ("perfil", "Perfil do estudante"),
+    ("pontos_fortes", "Pontos fortes"),
+    ("habilidades_desenvolvimento", "Habilidades em desenvolvimento"),
+    ("recursos_apoio", "Recursos e apoios"),
+    ("estrategias_metodologicas", "Estratégias metodológicas"),
+    ("adaptacoes_avaliacao", "Adaptações para avaliação"),
+    ("participacao_familia", "Participação da família"),
+]
+
+
+def faixa_likert(media):
+    """Converte uma média 1–5 na faixa inteira da escala (None quando não há média)."""
+    if media is None or pd.isna(media):
+        return None
+    return int(min(5, max(1, np.floor(float(media) + 0.5))))
+
+
+def referencia_estudante(sexo, ano_escolar):
+    if "Educação Infantil" in (ano_escolar or ""):
+        return "a criança"
+    if sexo == "Feminino":
+        return "a estudante"
+    return "o estudante"
+
+
+def extrair_campos_pei(pei_resumo):
+    """Separa o resumo do PEI (carregar_pei_resumo) em {coluna: texto}."""
+    campos = {}
+    if not pei_resumo:
+        return campos
+    posicoes = []
+    for coluna, rotulo in PEI_CAMPOS:
+        pos = pei_resumo.find(f"{rotulo}:")
+        if pos >= 0:
+            posicoes.append((pos, coluna, rotulo))
+    posicoes.sort()
+    for i, (pos, coluna, rotulo) in enumerate(posicoes):
+        fim = posicoes[i + 1][0] if i + 1 < len(posicoes) else len(pei_resumo)
+        campos[coluna] = pei_resumo[pos + len(rotulo) + 1:fim].strip()
+    return campos
+
+
+def extrair_linhas_boletim(boletim_texto):
+    """Lê o boletim em texto ('Disciplina: ... | Nota: ... | Conteúdo: ...') como lista de dicts."""
+    linhas = []
+    for linha in (boletim_texto or "").split("\n"):
+        if not linha.strip():
+            continue
+        registro = {"disciplina": "", "nota": "", "conteudo": ""}
+        for ptxt in (p.strip() for p in linha.split("|")):
+            if ptxt.startswith("Disciplina:"):
+                registro["disciplina"] = ptxt.split("Disciplina:", 1)[1].strip()
+            elif ptxt.startswith("Nota:"):
+                registro["nota"] = ptxt.split("Nota:", 1)[1].strip()
+            elif ptxt.startswith("Conteúdo:"):
+                registro["conteudo"] = ptxt.split("Conteúdo:", 1)[1].strip()
+        linhas.append(registro)
+    return linhas
+
+
+def _lista_natural(itens):
+    itens = [i for i in itens if i]
+    if len(itens) <= 1:
+        return "".join(itens)
+    return ", ".join(itens[:-1]) + " e " + itens[-1]
+
+
+def _minuscula_inicial(texto):
+    texto = texto.strip().rstrip(".")
+    return texto[:1].lower() + texto[1:]
+
+
+def _faixas_dimensoes(dominio_media):
+    """Lista (codigo, nome, faixa) das dimensões com média válida, na ordem do instrumento."""
+    dominio_media_valid = dominio_media.dropna(subset=["media_dominio"])
+    codigos = dominio_media_valid["dominio"] if "dominio" in dominio_media_valid.columns else [""] * len(dominio_media_valid)
+    return [
+        (codigo, nome, faixa_likert(media))
+        for codigo, nome, media in zip(codigos, dominio_media_valid["dominio_nome"], dominio_media_valid["media_dominio"])
+    ]
+
+
+def gerar_relatorio_local(
+    sexo,
+    dominio_media,
+    media_geral,
+    ano_escolar,
+    boletim_texto,
+    neuroatipico,
+    pei_resumo,
+    observacoes_gerais,
+):
+    """Relatório descritivo determinístico, montado a partir das faixas da escala (sem IA)."""
+    ref = referencia_estudante(sexo, ano_escolar)
+    Ref = ref[:1].upper() + ref[1:]
+    dims = _faixas_dimensoes(dominio_media)
+    instrumento = get_instrumento_para_ano(ano_escolar or "")
+    pei = extrair_campos_pei(pei_resumo)
+
+    paragrafos = []
+
+    faixa_geral = faixa_likert(media_geral)
+    if faixa_geral is None and dims:
+        faixa_geral = faixa_likert(np.mean([f for _, _, f in dims]))
+    if faixa_geral is not None:
+        paragrafos.append(
+            f"Neste período, {ref} {FRASES_VISAO_GERAL[faixa_geral]}. "
+            "As observações a seguir foram organizadas a partir do acompanhamento em sala e "
+            "buscam apoiar escola e família no planejamento dos próximos passos."
+        )
+    else:
+        paragrafos.append(
+            f"Neste período, {ref} participou das propostas da turma. Os registros ainda são insuficientes "
+            "para uma leitura detalhada por dimensão, que será aprofundada nas próximas observações."
+        )
+
+    fortes = [nome for _, nome, faixa in dims if faixa >= 4]
+    em_desenvolvimento = [nome for _, nome, faixa in dims if faixa <= 3]
+    if fortes:
+        paragrafos.append(
+            f"Entre os pontos fortes, destacam-se as dimensões {_lista_natural(fortes)}, "
+            f"nas quais {ref} demonstra segurança e autonomia crescentes."
+        )
+    if pei.get("pontos_fortes"):
+        paragrafos.append(f"O plano individual também registra como potencialidades: {pei['pontos_fortes'].rstrip('.')}.")
+    if em_desenvolvimento:
+        paragrafos.append(
+            f"Seguem em desenvolvimento as habilidades ligadas a {_lista_natural(em_desenvolvimento)}, "
+            "que continuarão recebendo atenção especial nas propostas de sala."
+        )
+
+    for codigo, nome, faixa in dims:
+        texto_dim = f"Em {nome}, {FRASES_FAIXA_RELATORIO[faixa]}."
+        itens = instrumento.get(codigo, {}).get("itens", [])
+        if itens:
+            exemplos = _lista_natural([_minuscula_inicial(txt) for _, txt in itens[:3]])
+            texto_dim += f" Nesta dimensão, o acompanhamento considera, por exemplo, se {ref} {exemplos}."
+        paragrafos.append(texto_dim)
+
+    boletim = extrair_linhas_boletim(boletim_texto)
+    disciplinas = [b["disciplina"] for b in boletim if b["disciplina"] and (b["nota"] or b["conteudo"])]
+    conteudos = [b["conteudo"] for b in boletim if b["conteudo"]]
+    if disciplinas:
+        texto_bol = (
+            f"O boletim escolar complementa essas observações, com registros em {_lista_natural(disciplinas)}."
+        )
+        if conteudos:
+            texto_bol += f" Entre os conteúdos trabalhados no período estão: {'; '.join(conteudos)}."
+        paragrafos.append(texto_bol)
+
+    if neuroatipico:
+        texto_pei = (
+            f"O percurso de {ref} é acompanhado com um olhar individualizado, com adaptações que favorecem "
+            "sua participação e suas conquistas."
+        )
+        if pei.get("estrategias_metodologicas"):
+            texto_pei += f" Entre as estratégias que têm favorecido a aprendizagem estão: {pei['estrategias_metodologicas'].rstrip('.')}."
+        if pei.get("recursos_apoio"):
+            texto_pei += f" Os apoios utilizados incluem: {pei['recursos_apoio'].rstrip('.')}."
+        paragrafos.append(texto_pei)
+
+    if observacoes_gerais:
+        paragrafos.append(f"A professora registra ainda: {observacoes_gerais.strip()}")
+
+    texto_final = (
+        f"A parceria entre família e escola é fundamental para que {ref} siga avançando. "
+        "Manter o diálogo, valorizar cada conquista e retomar em casa o que é vivido na escola "
+        "ajudam a consolidar as aprendizagens nos próximos meses."
+    )
+    if pei.get("participacao_familia"):
+        texto_final += f" Conforme combinado no plano individual: {pei['participacao_familia'].rstrip('.')}."
+    paragrafos.append(texto_final)
+
+    return "\n\n".join(paragrafos)
+
+
+def gerar_sugestoes_local(dominio_media, ano_escolar, neuroatipico, boletim_texto, pei_resumo, observacoes_gerais):
+    """Orientações para a família montadas por dimensão e faixa da escala (sem IA)."""
+    com_boletim = ano_tem_boletim(ano_escolar or "")
+    dims = _faixas_dimensoes(dominio_media)
+    pei = extrair_campos_pei(pei_resumo)
+
+    paragrafos = []
+    if com_boletim:
+        paragrafos.append(
+            "Este plano de estudo complementar reúne sugestões simples para organizar, em casa, momentos "
+            "curtos e regulares de estudo, leitura e conversa sobre o que está sendo aprendido na escola."
+        )
+    else:
+        paragrafos.append(
+            "As sugestões a seguir trazem atividades simples para o dia a dia em casa, com brincadeiras, "
+            "conversas e rotinas que ajudam a criança a continuar aprendendo com prazer."
+        )
+
+    # Dimensões que mais precisam de apoio primeiro
+    for codigo, nome, faixa in sorted(dims, key=lambda d: d[2]):
+        atividade = SUGESTOES_CASA_POR_DOMINIO.get(codigo, SUGESTAO_CASA_PADRAO)
+        paragrafos.append(f"{nome}: {FRASES_FAIXA_SUGESTOES[faixa]}, com {atividade}.")
+
+    boletim = extrair_linhas_boletim(boletim_texto)
+    conteudos = [f"{b['disciplina']} ({b['conteudo']})" for b in boletim if b["disciplina"] and b["conteudo"]]
+    if com_boletim and conteudos:
+        paragrafos.append(
+            "Vale retomar em casa os conteúdos trabalhados no período, como "
+            f"{_lista_natural(conteudos)}, pedindo que o estudante explique com suas palavras o que aprendeu."
+        )
+
+    if neuroatipico:
+        texto_neuro = (
+            "Pequenas adaptações fazem diferença: tempos diferenciados, apoio visual, instruções em etapas "
+            "e pausas combinadas tornam as atividades mais tranquilas."
+        )
+        if pei.get("recursos_apoio"):
+            texto_neuro += f" Em casa, podem ser aproveitados os mesmos apoios usados na escola: {pei['recursos_apoio'].rstrip('.')}."
+        paragrafos.append(texto_neuro)
+
+    paragrafos.append(
+        "O mais importante é manter uma rotina acolhedora, elogiar o esforço e conversar com a escola "
+        "sempre que surgirem dúvidas ou novas descobertas."
+    )
+    return "\n\n".join(paragrafos)
+
+
+# =========================================================
+# BANCO DE DADOS
+# =========================================================
+def init_db():
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.cursor()
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS alunos (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        escola TEXT,
+        turno TEXT,
+        ano_escolar TEXT,
+        turma TEXT,
+        ano_letivo TEXT,
+        bimestre TEXT,
+        nome_crianca TEXT,
+        idade TEXT,
+        sexo TEXT,
+        nome_professora TEXT,
+        neuroatipico INTEGER,
+        boletim_texto TEXT,
+        media_geral REAL,
+        relatorio_texto TEXT,
+        sugestoes_texto TEXT,
+        observacoes_gerais TEXT
+    )
+    """)
+    # relatório mantido ao salvar uma edição que mudou respostas ou dados do estudante:
+    # o texto continua salvo, marcado como desatualizado até a professora gerar outro
+    if "relatorio_desatualizado" not in {linha[1] for linha in cur.execute("PRAGMA table_info(alunos)")}:
+        cur.execute("ALTER TABLE alunos ADD COLUMN relatorio_desatualizado INTEGER NOT NULL DEFAULT 0")
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS respostas (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        aluno_id INTEGER,
+        dominio TEXT,
+        dominio_nome TEXT,
+        item_codigo TEXT,
+        item_texto TEXT,
+        resposta INTEGER,
+        observacao TEXT,
+        FOREIGN KEY(aluno_id) REFERENCES alunos(id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS dominios (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        aluno_id INTEGER,
+        dominio TEXT,
+        dominio_nome TEXT,
+        media_dominio REAL,
+        FOREIGN KEY(aluno_id) REFERENCES alunos(id)
+    )
+    """)
+
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS pei (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        timestamp TEXT,
+        escola TEXT,
+        nome_crianca TEXT,
+        ano_escolar TEXT,
+        ano_letivo TEXT,
+        perfil TEXT,
+        pontos_fortes TEXT,
+        habilidades_desenvolvimento TEXT,
+        recursos_apoio TEXT,
+        estrategias_metodologicas TEXT,
+        adaptacoes_avaliacao TEXT,
+        participacao_familia TEXT
+    )
+    """)
+
+    # boletim em tabela (além do texto em alunos.boletim_texto, usado nos prompts e relatórios)
+    boletim_novo = cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'boletim'").fetchone() is None
+    cur.execute("""
+    CREATE TABLE IF NOT EXISTS boletim (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        aluno_id INTEGER,
+        disciplina TEXT,
+        nota TEXT,
+        nota_valor REAL,
+        conteudo TEXT
+    )
+    """)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_boletim_aluno ON boletim(aluno_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_boletim_disciplina_nota ON boletim(disciplina, nota_valor)")
+    if boletim_novo:
+        # bancos anteriores à tabela: boletins já salvos vêm do texto, uma única vez
+        for aluno_id, boletim_texto in cur.execute(
+            "SELECT id, boletim_texto FROM alunos WHERE boletim_texto IS NOT NULL AND boletim_texto <> ''"
+        ).fetchall():
+            linhas = [(b["disciplina"], b["nota"], b["conteudo"]) for b in extrair_linhas_boletim(boletim_texto)]
+            _gravar_boletim(cur, aluno_id, tabela_boletim(linhas))
+
+    # reimpressão, exportação em lote e livro da escola buscam respostas/dimensões por aluno
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_respostas_aluno ON respostas(aluno_id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_dominios_aluno ON dominios(aluno_id)")
+    # histórico e evolução do estudante (mesma escola + nome)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alunos_escola_nome ON alunos(escola, nome_crianca)")
+    # trajetórias da turma: estudantes de uma turma da escola
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alunos_escola_turma ON alunos(escola, turma)")
+    # busca por prefixo (sem FTS5): LIKE 'termo%' usa índices NOCASE
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alunos_nome_nocase ON alunos(nome_crianca COLLATE NOCASE)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alunos_escola_nocase ON alunos(escola COLLATE NOCASE)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_alunos_turma_nocase ON alunos(turma COLLATE NOCASE)")
+    criar_indice_busca(cur)
+    criar_cubo_dominios(cur)
+
+    conn.commit()
+    conn.close()
+
+
+def criar_indice_busca(cur):
+    """
+    Índice de texto (FTS5, sem acentos e sem diferenciar maiúsculas) sobre nome,
+    escola e turma, mantido pelos gatilhos de alunos. Sem FTS5 no SQLite, a busca
+    usa LIKE com prefixo nos índices NOCASE.
+    """
+    existe = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'alunos_busca'"
+    ).fetchone()
+    if existe:
+        return
+    try:
+        cur.execute("""
+        CREATE VIRTUAL TABLE alunos_busca USING fts5(
+            nome_crianca, escola, turma,
+            content='alunos', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """)
+    except sqlite3.OperationalError:
+        return
+    cur.executescript("""
+    CREATE TRIGGER IF NOT EXISTS alunos_busca_ai AFTER INSERT ON alunos BEGIN
+        INSERT INTO alunos_busca(rowid, nome_crianca, escola, turma)
+        VALUES (new.id, new.nome_crianca, new.escola, new.turma);
+    END;
+    CREATE TRIGGER IF NOT EXISTS alunos_busca_ad AFTER DELETE ON alunos BEGIN
+        INSERT INTO alunos_busca(alunos_busca, rowid, nome_crianca, escola, turma)
+        VALUES ('delete', old.id, old.nome_crianca, old.escola, old.turma);
+    END;
+    CREATE TRIGGER IF NOT EXISTS alunos_busca_au AFTER UPDATE OF nome_crianca, escola, turma ON alunos BEGIN
+        INSERT INTO alunos_busca(alunos_busca, rowid, nome_crianca, escola, turma)
+        VALUES ('delete', old.id, old.nome_crianca, old.escola, old.turma);
+        INSERT INTO alunos_busca(rowid, nome_crianca, escola, turma)
+        VALUES (new.id, new.nome_crianca, new.escola, new.turma);
+    END;
+    INSERT INTO alunos_busca(alunos_busca) VALUES ('rebuild');
+    """)
+
+
+# Recortes do cubo de médias por dimensão (além de dominio e dominio_nome)
+CHAVES_CUBO = ("ano_letivo", "bimestre", "escola", "turno", "ano_escolar", "turma", "nome_professora")
+
+
+def _sql_lancar_no_cubo(aluno, dominio, origem, sinal=""):
+    """
+    Soma (sinal "") ou retira (sinal "-") do cubo as linhas de dominios de origem,
+    com os recortes da avaliação `aluno` (new/old nos gatilhos).
+    """
+    chaves = ", ".join(f"COALESCE({aluno}.{coluna}, '')" for coluna in CHAVES_CUBO)
+    return f"""
+        INSERT INTO cubo_dominios ({", ".join(CHAVES_CUBO)}, dominio, dominio_nome, soma, contagem, linhas)
+        SELECT {chaves}, COALESCE({dominio}.dominio, ''), COALESCE({dominio}.dominio_nome, ''),
+               {sinal}COALESCE({dominio}.media_dominio, 0), {sinal}({dominio}.media_dominio IS NOT NULL), {sinal}1
+        FROM {origem}
+        ON CONFLICT DO UPDATE SET
+            soma = soma + excluded.soma,
+            contagem = contagem + excluded.contagem,
+            linhas = linhas + excluded.linhas;
+    """
+
+
+def criar_cubo_dominios(cur):
+    """
+    Cubo materializado das médias por dimensão: soma e quantidade de médias em
+    cada combinação de ano letivo, bimestre, escola, turno, ano escolar, turma,
+    professora e dimensão. Mantido pelos gatilhos de dominios e alunos (inclusão,
+    edição e exclusão), na mesma transação da gravação; as consultas agregam o
+    cubo em vez de reler dominios. Células que ficam vazias (linhas = 0) são
+    ignoradas nas consultas e removidas uma vez por processo, em banco_atualizado.
+    """
+    existe = cur.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'cubo_dominios'"
+    ).fetchone()
+    if existe:
+        return
+    cur.execute(f"""
+    CREATE TABLE cubo_dominios (
+        {" ".join(f"{coluna} TEXT NOT NULL," for coluna in CHAVES_CUBO)}
+        dominio TEXT NOT NULL,
+        dominio_nome TEXT NOT NULL,
+        soma REAL NOT NULL,
+        contagem INTEGER NOT NULL,
+        linhas INTEGER NOT NULL,
+        PRIMARY KEY ({", ".join(CHAVES_CUBO)}, dominio, dominio_nome)
+    ) WITHOUT ROWID
+    """)
+    avaliacao_do_dominio = "alunos a WHERE a.id = {}.aluno_id"
+    dominios_da_avaliacao = "dominios d WHERE d.aluno_id = {}.id"
+    cur.executescript(f"""
+    CREATE TRIGGER IF NOT EXISTS cubo_dominios_ai AFTER INSERT ON dominios BEGIN
+        {_sql_lancar_no_cubo("a", "new", avaliacao_do_dominio.format("new"))}
+    END;
+    CREATE TRIGGER IF NOT EXISTS cubo_dominios_ad AFTER DELETE ON dominios BEGIN
+        {_sql_lancar_no_cubo("a", "old", avaliacao_do_dominio.format("old"), "-")}
+    END;
+    CREATE TRIGGER IF NOT EXISTS cubo_dominios_au AFTER UPDATE ON dominios BEGIN
+        {_sql_lancar_no_cubo("a", "old", avaliacao_do_dominio.format("old"), "-")}
+        {_sql_lancar_no_cubo("a", "new", avaliacao_do_dominio.format("new"))}
+    END;
+    CREATE TRIGGER IF NOT EXISTS cubo_alunos_au AFTER UPDATE OF {", ".join(CHAVES_CUBO)} ON alunos BEGIN
+        {_sql_lancar_no_cubo("old", "d", dominios_da_avaliacao.format("old"), "-")}
+        {_sql_lancar_no_cubo("new", "d", dominios_da_avaliacao.format("new"))}
+    END;
+    -- exclusão: vale a que vier primeiro (avaliação ou dimensões); a outra não acha mais o par
+    CREATE TRIGGER IF NOT EXISTS cubo_alunos_ad AFTER DELETE ON alunos BEGIN
+        {_sql_lancar_no_cubo("old", "d", dominios_da_avaliacao.format("old"), "-")}
+    END;
+    """)
+    chaves = ", ".join(f"COALESCE(a.{coluna}, '')" for coluna in CHAVES_CUBO)
+    cur.execute(f"""
+    INSERT INTO cubo_dominios ({", ".join(CHAVES_CUBO)}, dominio, dominio_nome, soma, contagem, linhas)
+    SELECT {chaves}, COALESCE(d.dominio, ''), COALESCE(d.dominio_nome, ''),
+           TOTAL(d.media_dominio), COUNT(d.media_dominio), COUNT(*)
+    FROM dominios d
+    JOIN alunos a ON a.id = d.aluno_id
+    GROUP BY {chaves}, COALESCE(d.dominio, ''), COALESCE(d.dominio_nome, '')
+    """)
+
+
+@st.cache_resource(show_spinner=False)
+def banco_atualizado():
+    """
+    init_db uma vez por processo em um banco que já existe (tabelas, índices e
+    migrações novas), mais a manutenção que não precisa rodar a cada gravação:
+    a remoção das células vazias do cubo de dimensões.
+    """
+    init_db()
+    conn = sqlite3.connect(DB_PATH)
+    with conn:
+        conn.execute("DELETE FROM cubo_dominios WHERE linhas <= 0")
+    conn.close()
+    return True
+
+
+def padrao_prefixo_like(texto):
+    """Padrão LIKE "texto%" com % e _ do texto escapados (usar com ESCAPE '\\')."""
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def buscar_avaliacoes(termo, limite=BUSCA_MAX_RESULTADOS, somente_neuroatipicos=False, um_por_estudante=False):
+    """
+    Avaliações cujo nome do aluno, escola ou turma começam com as palavras do termo
+    (todas as palavras precisam aparecer), das mais recentes para as mais antigas,
+    no máximo `limite`. Termo vazio traz as mais recentes. Uma consulta indexada,
+    independente do tamanho do banco.
+    um_por_estudante: só a avaliação mais recente de cada estudante (escola + nome),
+    até `limite` estudantes; a leitura segue das mais recentes para as mais antigas e
+    para quando eles completam, sem agrupar todas as avaliações que casam com o termo.
+    """
+    nomes_colunas = ["id", "escola", "nome_crianca", "ano_escolar", "turma", "ano_letivo", "timestamp"]
+    colunas = ", ".join(f"a.{c}" for c in nomes_colunas)
+    filtro_neuro = " AND a.neuroatipico = 1" if somente_neuroatipicos else ""
+    palavras = (termo or "").split()
+    if not os.path.exists(DB_PATH):
+        return pd.DataFrame(columns=nomes_colunas)
+
+    def consultar(origem, params):
+        # origem: FROM ... WHERE ... com a tabela alunos como "a"
+        if not um_por_estudante:
+            sql = f"SELECT {colunas} {origem} ORDER BY a.id DESC LIMIT ?"
+            return pd.read_sql_query(sql, conn, params=(*params, limite))
+        vistos, linhas = set(), []
+        if limite > 0:
+            cursor = conn.execute(f"SELECT {colunas} {origem} ORDER BY a.id DESC", params)
+            try:
+                for linha in cursor:
+                    if (linha[1], linha[2]) not in vistos:
+                        vistos.add((linha[1], linha[2]))
+                        linhas.append(linha)
+                        if len(linhas) >= limite:
+                            break
+            finally:
+                cursor.close()
+        return pd.DataFrame(linhas, columns=nomes_colunas)
+
+    conn = sqlite3.connect(DB_PATH)
+    try:
+        if not palavras:
+            return consultar(f"FROM alunos a WHERE 1 = 1{filtro_neuro}", ())
+        consulta_fts = " ".join('"' + p.replace('"', '""') + '"*' for p in palavras)
+        try:
+            return consultar(
+                f"FROM alunos_busca b JOIN alunos a ON a.id = b.rowid WHERE alunos_busca MATCH ?{filtro_neuro}",
+                (consulta_fts,),
+            )
+        except (sqlite3.OperationalError, pd.errors.DatabaseError):
+            # SQLite sem FTS5: cada palavra precisa ser prefixo do nome, da escola ou da turma
+            condicoes = " AND ".join(
+                "(a.nome_crianca LIKE ? ESCAPE '\\' OR a.escola LIKE ? ESCAPE '\\' OR a.turma LIKE ? ESCAPE '\\')"
+                for _ in palavras
+            )
+            params = [padrao_prefixo_like(p) for p in palavras for _ in range(3)]
+            return consultar(f"FROM alunos a WHERE {condicoes}{filtro_neuro}", params)
+    finally:
+        conn.close()
+
+
+def _gravar_boletim(cur, aluno_id, df_boletim):
+    """Substitui o boletim da avaliação pelas linhas de df_boletim (tabela_boletim), em lote."""
+    cur.execute("DELETE FROM boletim WHERE aluno_id = ?", (aluno_id,))
+    notas = df_boletim["nota_valor"].astype(object).where(df_boletim["nota_valor"].notna(), None)
+    cur.executemany(
+        "INSERT INTO boletim (aluno_id, disciplina, nota, nota_valor, conteudo) VALUES (?, ?, ?, ?, ?)",
+        zip(
+            [aluno_id] * len(df_boletim),
+            df_boletim["Disciplina"].tolist(),
+            df_boletim["Nota"].tolist(),
+            notas.tolist(),
+            df_boletim["Conteúdo programático"].tolist(),
+        ),
+    )
+
+
+def salvar_no_banco(
+    timestamp_str,
+    escola,
+    turno,
+    ano_escolar,
+    turma,
+    ano_letivo,
+    bimestre,
+    nome_crianca,
+    sexo,
+    nome_professora,
+    neuroatipico,
+    boletim_texto,
+    media_geral,
+    relatorio_texto,
+    sugestoes_texto,
+    observacoes_gerais,
+    df_itens,
+    dominio_media,
+    df_boletim,
+):
+    init_db()
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.cursor()
+
+    cur.execute(
+        """
+        INSERT INTO alunos (
+            timestamp, escola, turno, ano_escolar, turma, ano_letivo, bimestre,
+            nome_crianca, idade, sexo, nome_professora, neuroatipico,
+            boletim_texto, media_geral, relatorio_texto, sugestoes_texto,
+            observacoes_gerais
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """,
         (
             timestamp_str,
@@ -1099,395 +2109,1690 @@ def salvar_no_banco(
             ),
         )
 
-    for _, row in dominio_media.iterrows():
-        cur.execute(
-            """
-            INSERT INTO dominios (aluno_id, dominio, dominio_nome, media_dominio)
-            VALUES (?, ?, ?, ?)
-            """,
-            (
-                aluno_id,
-                row["dominio"],
-                row["dominio_nome"],
-                float(row["media_dominio"]) if not pd.isna(row["media_dominio"]) else None,
-            ),
+    for _, row in dominio_media.iterrows():
+        cur.execute(
+            """
+            INSERT INTO dominios (aluno_id, dominio, dominio_nome, media_dominio)
+            VALUES (?, ?, ?, ?)
+            """,
+            (
+                aluno_id,
+                row["dominio"],
+                row["dominio_nome"],
+                float(row["media_dominio"]) if not pd.isna(row["media_dominio"]) else None,
+            ),
+        )
+
+    _gravar_boletim(cur, aluno_id, df_boletim)
+
+    conn.commit()
+    conn.close()
+    return aluno_id
+
+
+def avaliacoes_ja_registradas(escola, ano_letivo, bimestre, nomes):
+    """Quais dos estudantes já têm avaliação na escola para o mesmo ano letivo e bimestre (uma consulta)."""
+    if not nomes or not os.path.exists(DB_PATH):
+        return []
+    marcadores = ",".join("?" * len(nomes))
+    conn = sqlite3.connect(DB_PATH)
+    linhas = conn.execute(
+        f"""
+        SELECT DISTINCT nome_crianca FROM alunos
+        WHERE escola = ? AND ano_letivo = ? AND bimestre = ? AND nome_crianca IN ({marcadores})
+        """,
+        (escola, ano_letivo, bimestre, *nomes),
+    ).fetchall()
+    conn.close()
+    return sorted(nome for (nome,) in linhas)
+
+
+def salvar_turma_no_banco(
+    timestamp_str,
+    escola,
+    turno,
+    ano_escolar,
+    turma,
+    ano_letivo,
+    bimestre,
+    nome_professora,
+    estudantes,
+    respostas,
+    medias_dominio,
+    media_geral,
+):
+    """
+    Grava as avaliações de uma turma inteira em uma única transação.
+    estudantes: [(nome, sexo)]; respostas: matriz estudantes × itens (ordem de
+    mapa_itens_instrumento); medias_dominio e media_geral: calcular_scores_turma.
+    Os relatórios ficam em branco (pré-geração ou geração posterior em Consultas).
+    Retorna os ids criados.
+    """
+    itens = [(item_code, *dados) for item_code, dados in mapa_itens_instrumento(ano_escolar).items()]
+    dominios, _ = dominios_instrumento(ano_escolar)
+    init_db()
+    conn = sqlite3.connect(DB_PATH)
+    ids = []
+    with conn:
+        cur = conn.cursor()
+        for (nome, sexo), media in zip(estudantes, media_geral.tolist()):
+            cur.execute(
+                """
+                INSERT INTO alunos (
+                    timestamp, escola, turno, ano_escolar, turma, ano_letivo, bimestre,
+                    nome_crianca, idade, sexo, nome_professora, neuroatipico,
+                    boletim_texto, media_geral, relatorio_texto, sugestoes_texto,
+                    observacoes_gerais
+                )
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, '', ?, ?, 0, '', ?, '', '', '')
+                """,
+                (
+                    timestamp_str, escola, turno, ano_escolar, turma, ano_letivo, bimestre,
+                    nome, sexo, nome_professora, None if media != media else media,
+                ),
+            )
+            ids.append(cur.lastrowid)
+        cur.executemany(
+            """
+            INSERT INTO respostas (aluno_id, dominio, dominio_nome, item_codigo, item_texto, resposta, observacao)
+            VALUES (?, ?, ?, ?, ?, ?, NULL)
+            """,
+            [
+                (aluno_id, dom_code, dom_nome, item_code, item_text, valor)
+                for aluno_id, linha in zip(ids, respostas.astype(int).tolist())
+                for (item_code, dom_code, dom_nome, item_text), valor in zip(itens, linha)
+            ],
+        )
+        cur.executemany(
+            "INSERT INTO dominios (aluno_id, dominio, dominio_nome, media_dominio) VALUES (?, ?, ?, ?)",
+            [
+                (aluno_id, dom_code, dom_nome, None if media != media else media)
+                for aluno_id, linha in zip(ids, medias_dominio.tolist())
+                for (dom_code, dom_nome), media in zip(dominios, linha)
+            ],
+        )
+    conn.close()
+    return ids
+
+
+def _diff_respostas(cur, aluno_id, df_itens):
+    """
+    Compara as respostas do formulário com as salvas.
+    Retorna (alteradas, novas, removidas): alteradas e novas como linhas de df_itens
+    (dicts), removidas como códigos de item que não estão mais no instrumento.
+    """
+    salvas = dict(cur.execute(
+        "SELECT item_codigo, resposta FROM respostas WHERE aluno_id = ?", (aluno_id,)
+    ).fetchall())
+    alteradas, novas = [], []
+    for row in df_itens[["dominio", "dominio_nome", "item_codigo", "item_texto", "resposta"]].to_dict("records"):
+        if row["item_codigo"] not in salvas:
+            novas.append(row)
+        elif salvas[row["item_codigo"]] != int(row["resposta"]):
+            alteradas.append(row)
+    removidas = set(salvas) - set(df_itens["item_codigo"])
+    return alteradas, novas, removidas
+
+
+def atualizar_avaliacao(
+    aluno_id,
+    timestamp_str,
+    escola,
+    turno,
+    ano_escolar,
+    turma,
+    ano_letivo,
+    bimestre,
+    nome_crianca,
+    sexo,
+    nome_professora,
+    neuroatipico,
+    boletim_texto,
+    observacoes_gerais,
+    df_itens,
+    df_boletim,
+):
+    """
+    Grava uma avaliação editada sobre a linha existente (em vez de inserir outra).
+    Só as respostas que mudaram são escritas e só as médias das dimensões
+    afetadas (e a média geral) são recalculadas, tudo em uma transação. O
+    relatório e as sugestões salvos não são apagados (ver gravar_textos_avaliacao);
+    se as respostas ou os dados usados para redigi-los mudaram, ficam marcados
+    como desatualizados. A comparação com o que estava salvo é feita dentro da
+    mesma transação da gravação.
+    Retorna (respostas alteradas, textos, textos_valem): textos é (relatorio,
+    sugestoes) salvos, ou None se a avaliação ainda não tem relatório;
+    textos_valem diz se eles continuam valendo.
+    """
+    aluno_id = int(aluno_id)
+    conn = sqlite3.connect(DB_PATH)
+    with conn:
+        cur = conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        anterior = cur.execute(
+            """
+            SELECT sexo, ano_escolar, neuroatipico, boletim_texto, observacoes_gerais, relatorio_texto, sugestoes_texto,
+                   relatorio_desatualizado
+            FROM alunos WHERE id = ?
+            """,
+            (aluno_id,),
+        ).fetchone()
+        alteradas, novas, removidas = _diff_respostas(cur, aluno_id, df_itens)
+        n_alteradas = len(alteradas) + len(novas) + len(removidas)
+        textos = (anterior[5], anterior[6] or "") if anterior is not None and anterior[5] else None
+        textos_valem = textos is not None and not anterior[7] and n_alteradas == 0 and (
+            anterior[0] == sexo
+            and anterior[1] == ano_escolar
+            and bool(anterior[2]) == bool(neuroatipico)
+            and (anterior[3] or "") == boletim_texto
+            and (anterior[4] or "") == observacoes_gerais
+        )
+
+        cur.executemany(
+            "UPDATE respostas SET resposta = ? WHERE aluno_id = ? AND item_codigo = ?",
+            [(int(r["resposta"]), aluno_id, r["item_codigo"]) for r in alteradas],
+        )
+        cur.executemany(
+            """
+            INSERT INTO respostas (aluno_id, dominio, dominio_nome, item_codigo, item_texto, resposta, observacao)
+            VALUES (?, ?, ?, ?, ?, ?, NULL)
+            """,
+            [
+                (aluno_id, r["dominio"], r["dominio_nome"], r["item_codigo"], r["item_texto"], int(r["resposta"]))
+                for r in novas
+            ],
+        )
+        dominios_afetados = {r["dominio"] for r in alteradas + novas}
+        if removidas:
+            marcadores = ",".join("?" * len(removidas))
+            dominios_afetados.update(d for (d,) in cur.execute(
+                f"SELECT DISTINCT dominio FROM respostas WHERE aluno_id = ? AND item_codigo IN ({marcadores})",
+                (aluno_id, *removidas),
+            ))
+            cur.execute(
+                f"DELETE FROM respostas WHERE aluno_id = ? AND item_codigo IN ({marcadores})",
+                (aluno_id, *removidas),
+            )
+
+        # mesma conta de calcular_scores: resposta 0 (não respondido) fica fora da média
+        for dominio in dominios_afetados:
+            cur.execute("DELETE FROM dominios WHERE aluno_id = ? AND dominio = ?", (aluno_id, dominio))
+            cur.execute(
+                """
+                INSERT INTO dominios (aluno_id, dominio, dominio_nome, media_dominio)
+                SELECT aluno_id, dominio, MAX(dominio_nome), AVG(NULLIF(resposta, 0))
+                FROM respostas
+                WHERE aluno_id = ? AND dominio = ?
+                GROUP BY aluno_id, dominio
+                """,
+                (aluno_id, dominio),
+            )
+
+        cur.execute(
+            """
+            UPDATE alunos
+            SET timestamp = ?, escola = ?, turno = ?, ano_escolar = ?, turma = ?, ano_letivo = ?,
+                bimestre = ?, nome_crianca = ?, sexo = ?, nome_professora = ?, neuroatipico = ?,
+                boletim_texto = ?, observacoes_gerais = ?, relatorio_desatualizado = ?
+            WHERE id = ?
+            """,
+            (
+                timestamp_str,
+                escola,
+                turno,
+                ano_escolar,
+                turma,
+                ano_letivo,
+                bimestre,
+                nome_crianca,
+                sexo,
+                nome_professora,
+                1 if neuroatipico else 0,
+                boletim_texto,
+                observacoes_gerais,
+                1 if textos is not None and not textos_valem else 0,
+                aluno_id,
+            ),
+        )
+        _gravar_boletim(cur, aluno_id, df_boletim)
+        if dominios_afetados:
+            cur.execute(
+                """
+                UPDATE alunos
+                SET media_geral = (SELECT AVG(NULLIF(resposta, 0)) FROM respostas WHERE aluno_id = ?)
+                WHERE id = ?
+                """,
+                (aluno_id, aluno_id),
+            )
+    conn.close()
+    return n_alteradas, textos, textos_valem
+
+
+def gravar_textos_avaliacao(aluno_id, relatorio_texto, sugestoes_texto):
+    """Substitui relatório e sugestões de uma avaliação salva (novo relatório pedido pela professora)."""
+    conn = sqlite3.connect(DB_PATH)
+    with conn:
+        conn.execute(
+            "UPDATE alunos SET relatorio_texto = ?, sugestoes_texto = ?, relatorio_desatualizado = 0 WHERE id = ?",
+            (relatorio_texto, sugestoes_texto, int(aluno_id)),
+        )
+    conn.close()
+
+
+def salvar_pei(
+    escola,
+    nome_crianca,
+    ano_escolar,
+    ano_letivo,
+    perfil,
+    pontos_fortes,
+    habilidades_desenvolvimento,
+    recursos_apoio,
+    estrategias_metodologicas,
+    adaptacoes_avaliacao,
+    participacao_familia,
+):
+    init_db()
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.cursor()
+    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
+    cur.execute(
+        """
+        INSERT INTO pei (
+            timestamp, escola, nome_crianca, ano_escolar, ano_letivo,
+            perfil, pontos_fortes, habilidades_desenvolvimento,
+            recursos_apoio, estrategias_metodologicas,
+            adaptacoes_avaliacao, participacao_familia
+        )
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            ts,
+            escola,
+            nome_crianca,
+            ano_escolar,
+            ano_letivo,
+            perfil,
+            pontos_fortes,
+            habilidades_desenvolvimento,
+            recursos_apoio,
+            estrategias_metodologicas,
+            adaptacoes_avaliacao,
+            participacao_familia,
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+
+def versao_banco():
+    """Versão dos dados para as chaves de cache: o instante da última gravação no arquivo do banco."""
+    try:
+        return os.stat(DB_PATH).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def excluir_avaliacoes(aluno_ids):
+    """Remove as avaliações (e suas respostas e médias por dimensão) em uma única transação."""
+    params = [(int(i),) for i in aluno_ids]
+    conn = sqlite3.connect(DB_PATH)
+    with conn:
+        conn.executemany("DELETE FROM respostas WHERE aluno_id = ?", params)
+        conn.executemany("DELETE FROM dominios WHERE aluno_id = ?", params)
+        conn.executemany("DELETE FROM boletim WHERE aluno_id = ?", params)
+        conn.executemany("DELETE FROM alunos WHERE id = ?", params)
+    conn.close()
+
+
+@st.cache_data(show_spinner=False, max_entries=512)
+def carregar_avaliacao(aluno_id, versao):
+    """Linha da avaliação (cadastro e textos) como dict, ou None se ela não existe mais."""
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM alunos WHERE id = ?", (int(aluno_id),)).fetchone()
+    conn.close()
+    return dict(row) if row is not None else None
+
+
+@st.cache_resource(show_spinner=False)
+def banco_rascunhos():
+    """
+    Cria, uma vez por processo, o banco dos rascunhos (um campo por linha, só os
+    campos alterados são regravados). Rascunhos de versões que os guardavam no
+    banco das avaliações são trazidos para cá e a tabela antiga é removida.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    conn = sqlite3.connect(RASCUNHOS_DB_PATH)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rascunhos (
+        nome_professora TEXT NOT NULL,
+        escola TEXT NOT NULL,
+        nome_crianca TEXT NOT NULL,
+        campo TEXT NOT NULL,
+        valor TEXT,
+        atualizado_em TEXT,
+        PRIMARY KEY (nome_professora, escola, nome_crianca, campo)
+    ) WITHOUT ROWID
+    """)
+    if os.path.exists(DB_PATH):
+        conn.execute("ATTACH DATABASE ? AS avaliacoes", (DB_PATH,))
+        antiga = conn.execute(
+            "SELECT 1 FROM avaliacoes.sqlite_master WHERE type = 'table' AND name = 'rascunhos'"
+        ).fetchone()
+        if antiga:
+            with conn:
+                conn.execute("INSERT OR IGNORE INTO main.rascunhos SELECT * FROM avaliacoes.rascunhos")
+                conn.execute("DROP TABLE avaliacoes.rascunhos")
+        conn.execute("DETACH DATABASE avaliacoes")
+    conn.commit()
+    conn.close()
+    return True
+
+
+def salvar_rascunho(chave, campos):
+    """Grava (upsert) os campos do rascunho. chave: (professora, escola, estudante); campos: {campo: valor em JSON}."""
+    banco_rascunhos()
+    agora = datetime.now().strftime("%Y%m%d_%H%M%S")
+    conn = sqlite3.connect(RASCUNHOS_DB_PATH)
+    with conn:
+        conn.executemany(
+            """
+            INSERT INTO rascunhos (nome_professora, escola, nome_crianca, campo, valor, atualizado_em)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (nome_professora, escola, nome_crianca, campo)
+            DO UPDATE SET valor = excluded.valor, atualizado_em = excluded.atualizado_em
+            """,
+            [(*chave, campo, valor, agora) for campo, valor in campos.items()],
+        )
+    conn.close()
+
+
+def carregar_rascunho(chave):
+    """Campos do rascunho ({campo: valor em JSON}) em uma consulta; vazio se não houver."""
+    if not os.path.exists(RASCUNHOS_DB_PATH) and not os.path.exists(DB_PATH):
+        return {}
+    banco_rascunhos()
+    conn = sqlite3.connect(RASCUNHOS_DB_PATH)
+    linhas = conn.execute(
+        "SELECT campo, valor FROM rascunhos WHERE nome_professora = ? AND escola = ? AND nome_crianca = ?",
+        chave,
+    ).fetchall()
+    conn.close()
+    return dict(linhas)
+
+
+def excluir_rascunho(chave):
+    if not os.path.exists(RASCUNHOS_DB_PATH):
+        return
+    conn = sqlite3.connect(RASCUNHOS_DB_PATH)
+    with conn:
+        conn.execute(
+            "DELETE FROM rascunhos WHERE nome_professora = ? AND escola = ? AND nome_crianca = ?",
+            chave,
+        )
+    conn.close()
+
+
+def carregar_pei_resumo(escola, nome_crianca):
+    if not os.path.exists(DB_PATH):
+        return ""
+    conn = sqlite3.connect(DB_PATH)
+    df_pei = pd.read_sql_query(
+        """
+        SELECT * FROM pei
+        WHERE escola = ? AND nome_crianca = ?
+        ORDER BY timestamp DESC
+        """,
+        conn,
+        params=(escola, nome_crianca),
+    )
+    conn.close()
+    if df_pei.empty:
+        return ""
+    return texto_resumo_pei(df_pei.iloc[0])
+
+
+def texto_resumo_pei(row):
+    textos = [f"{rotulo}: {row[coluna]}" for coluna, rotulo in PEI_CAMPOS if row[coluna]]
+    return " ".join(textos)
+
+
+def carregar_historicos(aluno_ids):
+    """
+    Histórico de avaliações (mesma escola + nome) de um conjunto de avaliações,
+    numa única consulta: uma linha por período com a média geral e a variação
+    em relação ao período anterior; se um período tem mais de uma avaliação vale
+    a última, como na trajetória. Texto simples (o template faz o escape).
+    Retorna {aluno_id: texto}; "" quando o estudante só tem um período.
+    """
+    aluno_ids = [int(i) for i in aluno_ids]
+    if not aluno_ids or not os.path.exists(DB_PATH):
+        return {}
+    conn = sqlite3.connect(DB_PATH)
+    linhas = conn.execute(
+        """
+        WITH alvo AS (
+            SELECT id, escola, nome_crianca FROM alunos
+            WHERE id IN (SELECT value FROM json_each(?))
+        ),
+        periodos AS (
+            SELECT alvo.id AS alvo_id, a.ano_escolar, a.ano_letivo, a.bimestre, a.timestamp, a.media_geral,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY alvo.id, a.ano_letivo, a.bimestre
+                       ORDER BY a.timestamp DESC, a.id DESC
+                   ) AS repeticao
+            FROM alvo
+            JOIN alunos a ON a.escola IS alvo.escola AND a.nome_crianca IS alvo.nome_crianca
+        )
+        SELECT alvo_id, ano_escolar, ano_letivo, bimestre, timestamp, media_geral,
+               media_geral - LAG(media_geral) OVER (
+                   PARTITION BY alvo_id ORDER BY ano_letivo, bimestre, timestamp
+               ) AS delta
+        FROM periodos
+        WHERE repeticao = 1
+        ORDER BY alvo_id, ano_letivo, bimestre, timestamp
+        """,
+        (json.dumps(aluno_ids),),
+    ).fetchall()
+    conn.close()
+
+    historicos = {aluno_id: "" for aluno_id in aluno_ids}
+    for aluno_id, periodos in _grupos_por_aluno(linhas):
+        if len(periodos) <= 1:
+            continue
+        textos = []
+        for ano_escolar, ano_letivo, bimestre, timestamp, media_geral, delta in periodos:
+            linha = f"{rotulo_periodo(bimestre, ano_letivo, timestamp)} - {ano_escolar or ''}"
+            if media_geral is not None:
+                linha += f": média {media_geral:.2f}"
+                if delta is not None:
+                    linha += f" ({delta:+.2f})"
+            textos.append(linha + f" (registro em {timestamp})")
+        historicos[aluno_id] = "\n".join(textos)
+    return historicos
+
+
+def rotulo_periodo(bimestre, ano_letivo, timestamp):
+    """Rótulo curto do período no gráfico de evolução, ex.: "1º bim/2025"."""
+    bim = (bimestre or "").replace("bimestre", "bim").strip()
+    if not bim:
+        bim = (timestamp or "")[:10]
+    return f"{bim}/{ano_letivo}" if ano_letivo else bim
+
+
+def carregar_tendencias(aluno_ids):
+    """
+    Gráficos de evolução (médias por dimensão em todas as avaliações do estudante,
+    mesma escola + nome) para um conjunto de avaliações, com uma única consulta.
+    Retorna {aluno_id: tag HTML}; "" quando o estudante só tem um período.
+    """
+    aluno_ids = [int(i) for i in aluno_ids]
+    if not aluno_ids or not os.path.exists(DB_PATH):
+        return {}
+    conn = sqlite3.connect(DB_PATH)
+    linhas = conn.execute(
+        """
+        WITH alvo AS (
+            SELECT id, escola, nome_crianca FROM alunos
+            WHERE id IN (SELECT value FROM json_each(?))
+        )
+        SELECT alvo.id, a.bimestre, a.ano_letivo, a.timestamp, d.dominio_nome, d.media_dominio
+        FROM alvo
+        JOIN alunos a ON a.escola IS alvo.escola AND a.nome_crianca IS alvo.nome_crianca
+        JOIN dominios d ON d.aluno_id = a.id
+        ORDER BY alvo.id, a.ano_letivo, a.bimestre, a.timestamp, d.id
+        """,
+        (json.dumps(aluno_ids),),
+    ).fetchall()
+    conn.close()
+    return tendencias_em_lote(
+        (aluno_id, rotulo_periodo(bimestre, ano_letivo, timestamp), dominio_nome, media)
+        for aluno_id, bimestre, ano_letivo, timestamp, dominio_nome, media in linhas
+    )
+
+
+# =========================================================
+# TRAJETÓRIAS – MÉDIAS POR DIMENSÃO AO LONGO DOS PERÍODOS
+# =========================================================
+def condicoes_recorte(filtros, tabela="a"):
+    """Cláusulas SQL (e parâmetros) dos filtros de Consultas: escola, turno, professora, turma e aluno."""
+    condicoes, params = [], []
+    for coluna, valor in zip(("escola", "turno", "nome_professora", "turma", "nome_crianca"), filtros):
+        if valor not in ("(Todas)", "(Todos)"):
+            condicoes.append(f"{tabela}.{coluna} = ?")
+            params.append(valor)
+    return condicoes, params
+
+
+def carregar_trajetoria(filtros):
+    """
+    Trajetória de todos os estudantes do recorte (mesma escola + nome), em todos
+    os períodos em que foram avaliados, numa única consulta: uma linha por
+    estudante, período e dimensão, em ordem de ano letivo e bimestre. Se um
+    período tem mais de uma avaliação vale a última (como nos gráficos de
+    evolução). delta é a variação da média da dimensão em relação ao período
+    anterior do mesmo estudante (NaN no primeiro).
+    """
+    colunas = [
+        "escola", "nome_crianca", "aluno_id", "ano_escolar", "turma", "ano_letivo", "bimestre", "timestamp",
+        "media_geral", "dominio", "dominio_nome", "media_dominio", "delta",
+    ]
+    if not os.path.exists(DB_PATH):
+        return pd.DataFrame(columns=colunas)
+    condicoes, params = condicoes_recorte(filtros)
+    conn = sqlite3.connect(DB_PATH)
+    df = pd.read_sql_query(
+        f"""
+        WITH alvo AS (
+            SELECT DISTINCT a.escola, a.nome_crianca FROM alunos a
+            {"WHERE " + " AND ".join(condicoes) if condicoes else ""}
+        ),
+        periodos AS (
+            SELECT a.*,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY a.escola, a.nome_crianca, a.ano_letivo, a.bimestre
+                       ORDER BY a.timestamp DESC, a.id DESC
+                   ) AS repeticao
+            FROM alvo
+            JOIN alunos a ON a.escola IS alvo.escola AND a.nome_crianca IS alvo.nome_crianca
         )
+        SELECT p.escola, p.nome_crianca, p.id AS aluno_id, p.ano_escolar, p.turma, p.ano_letivo,
+               p.bimestre, p.timestamp, p.media_geral, d.dominio, d.dominio_nome, d.media_dominio,
+               d.media_dominio - LAG(d.media_dominio) OVER (
+                   PARTITION BY p.escola, p.nome_crianca, d.dominio
+                   ORDER BY p.ano_letivo, p.bimestre, p.timestamp
+               ) AS delta
+        FROM periodos p
+        JOIN dominios d ON d.aluno_id = p.id
+        WHERE p.repeticao = 1 AND d.media_dominio IS NOT NULL
+        ORDER BY p.escola, p.nome_crianca, p.ano_letivo, p.bimestre, p.timestamp, d.id
+        """,
+        conn,
+        params=params,
+    )
+    conn.close()
+    return df
+
+
+def resumo_trajetoria(df_traj):
+    """
+    Série do grupo (turma ou estudante) por período × dimensão, numa passada:
+    média das médias da dimensão, média dos deltas individuais (crescimento dos
+    mesmos estudantes, sem misturar quem entrou ou saiu) e número de estudantes.
+    Retorna (medias, deltas, n_estudantes), DataFrames com períodos nas linhas.
+    """
+    if df_traj.empty:
+        vazio = pd.DataFrame()
+        return vazio, vazio, vazio
+    grupos = (
+        df_traj.fillna({"ano_letivo": "", "bimestre": ""})
+        .groupby(["ano_letivo", "bimestre", "dominio_nome"], sort=True)
+        .agg(media=("media_dominio", "mean"), delta=("delta", "mean"), n=("media_dominio", "count"))
+        .unstack("dominio_nome")
+    )
+    rotulos = [rotulo_periodo(bimestre, ano_letivo, "sem bim.") for ano_letivo, bimestre in grupos.index]
+    return tuple(grupos[coluna].set_axis(rotulos) for coluna in ("media", "delta", "n"))
+
+
+# =========================================================
+# PRÉ-GERAÇÃO DE RELATÓRIOS EM SEGUNDO PLANO
+# =========================================================
+SQL_AVALIACOES_SEM_RELATORIO = """
+    FROM alunos
+    WHERE (relatorio_texto IS NULL OR relatorio_texto = '')
+      AND (sugestoes_texto IS NULL OR sugestoes_texto = '')
+"""
+
+
+def contar_avaliacoes_sem_relatorio():
+    if not os.path.exists(DB_PATH):
+        return 0
+    conn = sqlite3.connect(DB_PATH)
+    n = conn.execute("SELECT COUNT(*)" + SQL_AVALIACOES_SEM_RELATORIO).fetchone()[0]
+    conn.close()
+    return n
+
+
+def proxima_avaliacao_sem_relatorio(escola_prioritaria="", ignorar=()):
+    """
+    Id da próxima avaliação a pré-gerar: escola prioritária primeiro, depois a mais antiga.
+    ignorar: ids que não devem ser escolhidos agora (falharam há pouco).
+    """
+    if not os.path.exists(DB_PATH):
+        return None
+    conn = sqlite3.connect(DB_PATH)
+    row = conn.execute(
+        "SELECT id" + SQL_AVALIACOES_SEM_RELATORIO
+        + " AND id NOT IN (SELECT value FROM json_each(?))"
+        + " ORDER BY (escola = ?) DESC, timestamp ASC, id ASC LIMIT 1",
+        (json.dumps([int(i) for i in ignorar]), escola_prioritaria or ""),
+    ).fetchone()
+    conn.close()
+    return row[0] if row else None
+
+
+def gerar_relatorio_pendente(aluno_id):
+    """
+    Gera e grava relatório e sugestões de uma avaliação salva sem relatório.
+    Retorna False sem gravar nada se a IA falhou: o texto local de reserva não
+    é guardado no lugar do da IA, e a avaliação volta a ser tentada depois.
+    """
+    conn = sqlite3.connect(DB_PATH)
+    df_al = pd.read_sql_query("SELECT * FROM alunos WHERE id = ?", conn, params=(aluno_id,))
+    dominio_media = pd.read_sql_query(
+        "SELECT dominio, dominio_nome, media_dominio FROM dominios WHERE aluno_id = ?",
+        conn,
+        params=(aluno_id,),
+    )
+    conn.close()
+    if df_al.empty:
+        return False
+    row = df_al.iloc[0]
+
+    relatorio, sugestoes = gerar_textos_estudante(
+        row["sexo"],
+        dominio_media,
+        row["media_geral"],
+        row["ano_escolar"],
+        row["boletim_texto"] or "",
+        bool(row["neuroatipico"]),
+        carregar_pei_resumo(row["escola"], row["nome_crianca"]),
+        row["observacoes_gerais"] or "",
+        fallback_local=False,
+    )
+    if relatorio is None or sugestoes is None:
+        return False
 
+    # Só grava se ninguém salvou um texto enquanto a IA trabalhava
+    conn = sqlite3.connect(DB_PATH)
+    cur = conn.execute(
+        "UPDATE alunos SET relatorio_texto = ?, sugestoes_texto = ?"
+        " WHERE id = ? AND (relatorio_texto IS NULL OR relatorio_texto = '')"
+        " AND (sugestoes_texto IS NULL OR sugestoes_texto = '')",
+        (relatorio, sugestoes, aluno_id),
+    )
     conn.commit()
     conn.close()
-    return aluno_id
+    return cur.rowcount > 0
 
 
-def salvar_pei(
+def _loop_prefetch(estado, intervalo_s=5.0):
+    estado.thread.prefetch = True
+    falhas = {}  # aluno_id -> (falhas seguidas, instante a partir do qual pode tentar de novo)
+    while True:
+        time.sleep(intervalo_s)
+        aluno_id = None
+        try:
+            if not estado.ociosa(PREFETCH_OCIOSO_S):
+                continue
+            agora = time.monotonic()
+            aluno_id = proxima_avaliacao_sem_relatorio(
+                PREFETCH_ESCOLA, ignorar=[i for i, (_, liberada) in falhas.items() if liberada > agora],
+            )
+            if aluno_id is None:
+                continue
+            if not estado.reservar_prefetch(PREFETCH_MAX_POR_MINUTO):
+                continue
+            if gerar_relatorio_pendente(aluno_id):
+                falhas.pop(aluno_id, None)
+                continue
+        except Exception:
+            # banco ocupado ou falha pontual: conta como falha desta avaliação
+            if aluno_id is None:
+                continue
+        n = falhas.get(aluno_id, (0, 0.0))[0] + 1
+        espera = min(PREFETCH_ESPERA_FALHA_MAX_S, PREFETCH_ESPERA_FALHA_S * 2 ** (n - 1))
+        falhas[aluno_id] = (n, time.monotonic() + espera)
+
+
+@st.cache_resource
+def iniciar_prefetch():
+    """Inicia uma única thread de pré-geração por processo do servidor."""
+    thread = threading.Thread(target=_loop_prefetch, args=(estado_ia(),), name="ade-prefetch", daemon=True)
+    thread.start()
+    return thread
+
+
+# =========================================================
+# HTML – RELATÓRIO INDIVIDUAL E CONSOLIDADO
+# =========================================================
+def gerar_html_impressao(
     escola,
-    nome_crianca,
+    turno,
     ano_escolar,
+    turma,
     ano_letivo,
-    perfil,
-    pontos_fortes,
-    habilidades_desenvolvimento,
-    recursos_apoio,
-    estrategias_metodologicas,
-    adaptacoes_avaliacao,
-    participacao_familia,
+    bimestre,
+    crianca,
+    professora,
+    sexo,
+    boletim_texto,
+    df_itens,
+    dominio_media,
+    media_geral,
+    relatorio,
+    sugestoes,
+    radar_tag,
+    historico_html,
+    pei_resumo_html,
+    observacoes_gerais,
+    logo_src=None,
+    tendencia_tag="",
 ):
-    init_db()
+    """
+    logo_src: caminho do logo (ex.: no ZIP da exportação em lote); por padrão vai embutido em base64.
+    tendencia_tag: gráfico de evolução (carregar_tendencias), vazio quando não há histórico.
+    """
+    # colunas como listas: bem mais barato que itertuples/apply para ~20–60 itens
+    linhas_itens = linhas_itens_relatorio(
+        zip(df_itens["dominio_nome"].tolist(), df_itens["item_texto"].tolist(), df_itens["resposta"].tolist())
+    )
+
+    return compilar_templates(PRIMARY_BLUE, DARK_GRAY).relatorio_aluno(
+        escola=escola,
+        turno=turno,
+        ano_escolar=ano_escolar,
+        turma=turma,
+        ano_letivo=ano_letivo,
+        bimestre=bimestre,
+        crianca=crianca,
+        professora=professora,
+        sexo=sexo,
+        linhas_itens=linhas_itens,
+        linhas_boletim=linhas_boletim_relatorio(boletim_texto),
+        relatorio=relatorio,
+        sugestoes=sugestoes,
+        radar_tag=radar_tag,
+        logo_tag=logo_tag_relatorio(logo_src),
+        pei_resumo=pei_resumo_html,
+        tendencia_tag=tendencia_tag,
+        historico=historico_html,
+        observacoes=observacoes_gerais,
+    )
+
+
+def escala_descritiva(v):
+    try:
+        v = int(v)
+    except Exception:
+        return ""
+    if v in LIKERT_LABELS:
+        return LIKERT_LABELS[v]
+    if v == 0:
+        return "Não respondido"
+    return ""
+
+
+def linhas_itens_relatorio(itens):
+    """itens: (dimensão, descrição, resposta) → linhas da tabela de respostas do relatório."""
+    return [(dominio_nome, item_texto, escala_descritiva(resposta)) for dominio_nome, item_texto, resposta in itens]
+
+
+def linhas_boletim_relatorio(boletim_texto):
+    if not boletim_texto:
+        return []
+    return [(b["disciplina"], b["nota"], b["conteudo"]) for b in extrair_linhas_boletim(boletim_texto)]
+
+
+def logo_tag_relatorio(logo_src=None):
+    if logo_src:
+        return f'<img src="{logo_src}" class="logo" />'
+    logo_b64 = get_logo_base64()
+    return f'<img src="data:image/png;base64,{logo_b64}" class="logo" />' if logo_b64 else ""
+
+
+def gerar_html_relatorio_professora(
+    nome_professora,
+    escola,
+    turno,
+    turma,
+    ano_letivo,
+    n_alunos,
+    media_geral_prof,
+    dominio_media_prof,
+    plano_prof,
+    radar_tag
+):
+    return compilar_templates(PRIMARY_BLUE, DARK_GRAY).relatorio_professora(
+        professora=nome_professora,
+        escola=escola,
+        turno=turno,
+        turma=turma,
+        ano_letivo=ano_letivo,
+        n_alunos=n_alunos,
+        media_geral=media_geral_prof,
+        linhas_dominios=list(dominio_media_prof.itertuples(index=False, name=None)),
+        plano=plano_prof,
+        radar_tag=radar_tag,
+        logo_tag=logo_tag_relatorio(),
+    )
+
+
+def gerar_html_aluno(aluno_id, logo_src=None, tendencia_tag=None, historico=None):
+    """
+    Relatório individual de uma avaliação salva. Retorna (nome_crianca, html) ou None sem dados.
+    tendencia_tag e historico: já calculados em lote; None busca os do estudante.
+    """
     conn = sqlite3.connect(DB_PATH)
-    cur = conn.cursor()
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    cur.execute(
-        """
-        INSERT INTO pei (
-            timestamp, escola, nome_crianca, ano_escolar, ano_letivo,
-            perfil, pontos_fortes, habilidades_desenvolvimento,
-            recursos_apoio, estrategias_metodologicas,
-            adaptacoes_avaliacao, participacao_familia
-        )
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    df_res = pd.read_sql_query(
+        "SELECT dominio, dominio_nome, item_codigo, item_texto, resposta, observacao FROM respostas WHERE aluno_id = ?",
+        conn,
+        params=(aluno_id,),
+    )
+    df_dom_aluno = pd.read_sql_query(
+        "SELECT dominio, dominio_nome, media_dominio FROM dominios WHERE aluno_id = ?",
+        conn,
+        params=(aluno_id,),
+    )
+    df_al = pd.read_sql_query(
+        "SELECT * FROM alunos WHERE id = ?",
+        conn,
+        params=(aluno_id,),
+    )
+    conn.close()
+
+    if df_al.empty or df_res.empty or df_dom_aluno.empty:
+        return None
+
+    row_aluno = df_al.iloc[0]
+    radar_tag_aluno = radar_html(df_dom_aluno, "Radar da criança", RADAR_FORMATO, RADAR_SVG_INLINE, RADAR_MOTOR)
+    historico_html = carregar_historicos([aluno_id]).get(int(aluno_id), "") if historico is None else historico
+    pei_resumo_html = carregar_pei_resumo(row_aluno["escola"], row_aluno["nome_crianca"])
+    obs_gerais = row_aluno.get("observacoes_gerais", "") if "observacoes_gerais" in row_aluno else ""
+
+    html = gerar_html_impressao(
+        row_aluno["escola"],
+        row_aluno["turno"],
+        row_aluno["ano_escolar"],
+        row_aluno["turma"],
+        row_aluno["ano_letivo"],
+        row_aluno["bimestre"],
+        row_aluno["nome_crianca"],
+        row_aluno["nome_professora"],
+        row_aluno["sexo"],
+        row_aluno["boletim_texto"] or "",
+        df_res,
+        df_dom_aluno,
+        row_aluno["media_geral"],
+        row_aluno["relatorio_texto"] or "",
+        row_aluno["sugestoes_texto"] or "",
+        radar_tag_aluno,
+        historico_html,
+        pei_resumo_html,
+        obs_gerais or "",
+        logo_src=logo_src,
+        tendencia_tag=carregar_tendencias([aluno_id]).get(int(aluno_id), "") if tendencia_tag is None else tendencia_tag,
+    )
+    return row_aluno["nome_crianca"], html
+
+
+# =========================================================
+# EXPORTAÇÃO EM LOTE (ZIP)
+# =========================================================
+def nome_arquivo_seguro(texto):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in str(texto or "").strip()) or "sem_nome"
+
+
+def arquivo_exportacao(prefixo, sufixo, **abertura):
+    """
+    Novo arquivo temporário (delete=False) para uma exportação, com nome
+    "ade_<prefixo>_*<sufixo>" na pasta temporária do sistema. Antes, apaga os
+    arquivos da mesma exportação com mais de EXPORTACAO_VALIDADE_S.
+    """
+    pasta = tempfile.gettempdir()
+    limite = time.time() - EXPORTACAO_VALIDADE_S
+    for entrada in os.scandir(pasta):
+        if entrada.name.startswith(f"ade_{prefixo}_") and entrada.name.endswith(sufixo):
+            try:
+                if entrada.stat().st_mtime < limite:
+                    os.remove(entrada.path)
+            except OSError:
+                # outro processo já apagou ou ainda está usando
+                pass
+    return tempfile.NamedTemporaryFile(prefix=f"ade_{prefixo}_", suffix=sufixo, dir=pasta, delete=False, **abertura)
+
+
+def exportar_relatorios_zip(aluno_ids, progresso=None, workers=EXPORTACAO_WORKERS):
+    """
+    Monta os relatórios individuais em um pool de threads e grava cada um no ZIP
+    assim que fica pronto. O ZIP vai para um arquivo temporário em disco e só
+    ~2×workers relatórios ficam em memória ao mesmo tempo. O logo entra uma única
+    vez no ZIP (com o nome de LOGO_FILE) e os relatórios apontam para ele.
+    progresso(feitos, total) é chamado na thread principal.
+    Retorna (caminho_zip, n_relatorios, n_sem_dados).
+    """
+    aluno_ids = list(aluno_ids)
+    total = len(aluno_ids)
+    tem_logo = os.path.exists(LOGO_PATH)
+    logo_src = LOGO_FILE if tem_logo else None
+
+    # gráficos de evolução e históricos de todo o conjunto, antes de distribuir no pool
+    tendencias = carregar_tendencias(aluno_ids)
+    historicos = carregar_historicos(aluno_ids)
+
+    tmp = arquivo_exportacao("relatorios", ".zip")
+    tmp.close()
+
+    n_ok = n_sem_dados = feitos = 0
+    janela = max(1, workers) * 2
+    try:
+        with zipfile.ZipFile(tmp.name, "w", compression=zipfile.ZIP_DEFLATED) as zf, \
+                ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            if tem_logo:
+                zf.write(LOGO_PATH, LOGO_FILE)
+
+            pendentes = deque()
+            ids = iter(aluno_ids)
+            while True:
+                while len(pendentes) < janela:
+                    aluno_id = next(ids, None)
+                    if aluno_id is None:
+                        break
+                    pendentes.append((
+                        aluno_id,
+                        pool.submit(
+                            gerar_html_aluno, aluno_id, logo_src,
+                            tendencias.get(int(aluno_id), ""), historicos.get(int(aluno_id), ""),
+                        ),
+                    ))
+                if not pendentes:
+                    break
+
+                # grava na ordem de envio (a ordem do filtro) para o ZIP sair previsível
+                aluno_id, futuro = pendentes.popleft()
+                resultado = futuro.result()
+                if resultado is None:
+                    n_sem_dados += 1
+                else:
+                    nome, html = resultado
+                    zf.writestr(f"relatorio_{nome_arquivo_seguro(nome)}_{aluno_id}.html", html)
+                    n_ok += 1
+                feitos += 1
+                if progresso is not None:
+                    progresso(feitos, total)
+    except BaseException:
+        # falha no meio (ou sessão interrompida): o ZIP incompleto não fica no disco
+        os.remove(tmp.name)
+        raise
+
+    return tmp.name, n_ok, n_sem_dados
+
+
+# =========================================================
+# LIVRO DE RELATÓRIOS DA ESCOLA
+# =========================================================
+ORDEM_LIVRO = "a.turma, a.nome_crianca, a.id"
+
+
+def _grupos_por_aluno(cursor):
+    """Agrupa as linhas consecutivas (aluno_id, ...) de um cursor já ordenado pelo aluno."""
+    for aluno_id, linhas in groupby(cursor, key=itemgetter(0)):
+        yield aluno_id, [linha[1:] for linha in linhas]
+
+
+def gerar_livro_relatorios(escola, turma=None, bimestre=None, progresso=None):
+    """
+    Livro com os relatórios individuais de uma escola (opcionalmente de uma turma
+    e/ou bimestre) em um único HTML: CSS e logo uma só vez, sumário por turma e
+    uma página por avaliação. O sumário sai de uma consulta leve (id, turma,
+    nome); avaliações, respostas e dimensões vêm em três cursores ordenados da
+    mesma forma e percorridos juntos, sem carregar a escola inteira em memória,
+    e o documento é gravado aos poucos em disco. Todas as leituras ficam em uma
+    única transação, para uma gravação concorrente não desalinhar os cursores.
+    progresso(feitos, total) é chamado a cada estudante.
+    Retorna (caminho_html, n_estudantes).
+    """
+    filtros, params = ["a.escola = ?"], [escola]
+    if turma:
+        filtros.append("a.turma = ?")
+        params.append(turma)
+    if bimestre:
+        filtros.append("a.bimestre = ?")
+        params.append(bimestre)
+    # só avaliações com dados detalhados, como na reimpressão
+    filtros.append("EXISTS (SELECT 1 FROM respostas r WHERE r.aluno_id = a.id)")
+    filtros.append("EXISTS (SELECT 1 FROM dominios d WHERE d.aluno_id = a.id)")
+    where = " AND ".join(filtros)
+
+    conn = sqlite3.connect(DB_PATH, isolation_level=None)
+    conn.execute("BEGIN")
+    sumario = conn.execute(
+        f"SELECT a.id, a.turma, a.nome_crianca, a.bimestre FROM alunos a WHERE {where} ORDER BY {ORDEM_LIVRO}",
+        params,
+    ).fetchall()
+    cur_alunos = conn.execute(
+        f"""
+        SELECT a.id, a.escola, a.turno, a.ano_escolar, a.turma, a.ano_letivo, a.bimestre,
+               a.nome_crianca, a.nome_professora, a.sexo, a.boletim_texto, a.relatorio_texto, a.sugestoes_texto,
+               a.observacoes_gerais
+        FROM alunos a WHERE {where} ORDER BY {ORDEM_LIVRO}
         """,
-        (
-            ts,
-            escola,
-            nome_crianca,
-            ano_escolar,
-            ano_letivo,
-            perfil,
-            pontos_fortes,
-            habilidades_desenvolvimento,
-            recursos_apoio,
-            estrategias_metodologicas,
-            adaptacoes_avaliacao,
-            participacao_familia,
-        ),
+        params,
     )
-    conn.commit()
+    cur_respostas = conn.execute(
+        f"""
+        SELECT r.aluno_id, r.dominio_nome, r.item_texto, r.resposta
+        FROM respostas r JOIN alunos a ON a.id = r.aluno_id
+        WHERE {where} ORDER BY {ORDEM_LIVRO}, r.id
+        """,
+        params,
+    )
+    cur_dominios = conn.execute(
+        f"""
+        SELECT d.aluno_id, d.dominio_nome, d.media_dominio
+        FROM dominios d JOIN alunos a ON a.id = d.aluno_id
+        WHERE {where} ORDER BY {ORDEM_LIVRO}, d.id
+        """,
+        params,
+    )
+    # PEI mais recente de cada estudante da escola
+    pei_por_nome = {
+        row["nome_crianca"]: texto_resumo_pei(row)
+        for row in pd.read_sql_query(
+            "SELECT * FROM pei WHERE escola = ? ORDER BY timestamp ASC", conn, params=(escola,),
+        ).to_dict("records")
+    }
+
+    tendencias = carregar_tendencias([a[0] for a in sumario])
+    historicos = carregar_historicos([a[0] for a in sumario])
+
+    templates = compilar_templates(PRIMARY_BLUE, DARK_GRAY)
+    grupos = [
+        (turma_grupo or "Sem turma", [
+            (f"aluno-{a[0]}", f"{a[2]} – {a[3]}" if a[3] and not bimestre else a[2]) for a in alunos_grupo
+        ])
+        for turma_grupo, alunos_grupo in groupby(sumario, key=itemgetter(1))
+    ]
+    subtitulo = " · ".join(p for p in (
+        f"Turma: {turma}" if turma else "",
+        f"Bimestre: {bimestre}" if bimestre else "",
+        f"{len(sumario)} relatório(s)",
+        f"Gerado em {datetime.now().strftime('%d/%m/%Y %H:%M')}",
+    ) if p)
+
+    tmp = arquivo_exportacao("livro", ".html", mode="w", encoding="utf-8")
+    total = len(sumario)
+    try:
+        with tmp:
+            tmp.write(templates.inicio_livro(
+                f"Livro de relatórios – {escola}", subtitulo, grupos, logo_tag=logo_tag_relatorio(),
+            ))
+            respostas_it = _grupos_por_aluno(cur_respostas)
+            dominios_it = _grupos_por_aluno(cur_dominios)
+            cursores = zip(cur_alunos, respostas_it, dominios_it)
+            for feitos, (aluno, (id_itens, itens), (id_dims, dims)) in enumerate(cursores, start=1):
+                (aluno_id, escola_al, turno, ano_escolar, turma_al, ano_letivo, bimestre_al,
+                 crianca, professora, sexo, boletim_texto, relatorio, sugestoes, observacoes) = aluno
+                if not aluno_id == id_itens == id_dims:
+                    raise RuntimeError(
+                        f"Livro: respostas/dimensões fora de ordem (avaliação {aluno_id}, "
+                        f"respostas de {id_itens}, dimensões de {id_dims})."
+                    )
+                radar_tag = radar_html(
+                    pd.DataFrame(dims, columns=["dominio_nome", "media_dominio"]),
+                    "Radar da criança", RADAR_FORMATO, RADAR_SVG_INLINE, RADAR_MOTOR,
+                )
+                tmp.write(templates.pagina_livro(
+                    f"aluno-{aluno_id}",
+                    escola=escola_al,
+                    turno=turno,
+                    ano_escolar=ano_escolar,
+                    turma=turma_al,
+                    ano_letivo=ano_letivo,
+                    bimestre=bimestre_al,
+                    crianca=crianca,
+                    professora=professora,
+                    sexo=sexo,
+                    linhas_itens=linhas_itens_relatorio(itens),
+                    linhas_boletim=linhas_boletim_relatorio(boletim_texto),
+                    relatorio=relatorio or "",
+                    sugestoes=sugestoes or "",
+                    radar_tag=radar_tag,
+                    pei_resumo=pei_por_nome.get(crianca, ""),
+                    tendencia_tag=tendencias.get(aluno_id, ""),
+                    historico=historicos.get(aluno_id, ""),
+                    observacoes=observacoes or "",
+                ))
+                if progresso is not None:
+                    progresso(feitos, total)
+            tmp.write(templates.fim_livro())
+        conn.execute("COMMIT")
+    except BaseException:
+        # livro pela metade não fica no disco
+        os.remove(tmp.name)
+        raise
+    finally:
+        conn.close()
+    return tmp.name, total
+
+
+# =========================================================
+# CONSULTAS – DADOS EM CACHE E BLOCOS ISOLADOS (FRAGMENTOS)
+# =========================================================
+# Os blocos pesados da aba de consultas (reimpressão, visão macro, cruzamentos,
+# trajetória e relatório da professora) são fragmentos: interagir com um deles
+# reexecuta só aquele bloco, e cada um lê seus dados de caches indexados pela
+# versão do banco. As médias por dimensão saem do cubo_dominios (init_db).
+@st.cache_data(show_spinner=False, max_entries=4)
+def carregar_tabelas_consulta(versao):
+    conn = sqlite3.connect(DB_PATH)
+    df_alunos = pd.read_sql_query("SELECT * FROM alunos", conn)
     conn.close()
+    return df_alunos
+
+
+def filtrar_avaliacoes(df_alunos, escola, turno, professora, turma, aluno):
+    df_filt = df_alunos
+    if escola != "(Todas)":
+        df_filt = df_filt[df_filt["escola"] == escola]
+    if turno != "(Todos)":
+        df_filt = df_filt[df_filt["turno"] == turno]
+    if professora != "(Todos)":
+        df_filt = df_filt[df_filt["nome_professora"] == professora]
+    if turma != "(Todas)":
+        df_filt = df_filt[df_filt["turma"] == turma]
+    if aluno != "(Todos)":
+        df_filt = df_filt[df_filt["nome_crianca"] == aluno]
+    return df_filt.copy()
+
+
+# Recortes do cubo que podem ser cruzados em Consultas, com o rótulo das tabelas
+ROTULOS_CUBO = {
+    "dominio_nome": "Dimensão",
+    "ano_letivo": "Ano letivo",
+    "bimestre": "Bimestre",
+    "escola": "Escola",
+    "turno": "Turno",
+    "ano_escolar": "Ano escolar",
+    "turma": "Turma",
+    "nome_professora": "Professora",
+}
 
 
-def carregar_pei_resumo(escola, nome_crianca):
-    if not os.path.exists(DB_PATH):
-        return ""
+def fatia_cubo(filtros, colunas, fatias=None):
+    """
+    Fatia do cubo_dominios no recorte dos filtros de Consultas (e das fatias
+    extras {coluna: valor}), agregada pelas colunas pedidas: soma, contagem
+    (médias não nulas) e linhas. O estudante não é um recorte do cubo: com aluno
+    filtrado as mesmas colunas são montadas a partir das dimensões dele.
+    """
+    colunas = [c for c in colunas if c in ROTULOS_CUBO]
+    filtros = tuple(filtros)
+    origem, params = "cubo_dominios", []
+    if filtros[4] != "(Todos)":
+        chaves = ", ".join(f"COALESCE(a.{coluna}, '') AS {coluna}" for coluna in CHAVES_CUBO)
+        origem = f"""(
+            SELECT {chaves}, COALESCE(d.dominio, '') AS dominio, COALESCE(d.dominio_nome, '') AS dominio_nome,
+                   COALESCE(d.media_dominio, 0) AS soma, d.media_dominio IS NOT NULL AS contagem, 1 AS linhas
+            FROM dominios d
+            JOIN alunos a ON a.id = d.aluno_id
+            WHERE a.nome_crianca = ?
+        )"""
+        params.append(filtros[4])
+        filtros = filtros[:4] + ("(Todos)",)
+    condicoes, params_filtros = condicoes_recorte(filtros, "c")
+    condicoes.append("c.linhas > 0")
+    for coluna, valor in (fatias or {}).items():
+        condicoes.append(f"c.{coluna} = ?")
+        params_filtros.append(valor)
+    grupo = ", ".join(f"c.{coluna}" for coluna in colunas)
     conn = sqlite3.connect(DB_PATH)
-    df_pei = pd.read_sql_query(
-        """
-        SELECT * FROM pei
-        WHERE escola = ? AND nome_crianca = ?
-        ORDER BY timestamp DESC
+    df = pd.read_sql_query(
+        f"""
+        SELECT {grupo + "," if grupo else ""}
+               SUM(c.soma) AS soma, SUM(c.contagem) AS contagem, SUM(c.linhas) AS linhas
+        FROM {origem} c
+        WHERE {" AND ".join(condicoes)}
+        {"GROUP BY " + grupo if grupo else "HAVING COUNT(*) > 0"}
         """,
         conn,
-        params=(escola, nome_crianca),
+        params=params + params_filtros,
     )
     conn.close()
-    if df_pei.empty:
-        return ""
-    row = df_pei.iloc[0]
-    textos = []
-    if row["perfil"]:
-        textos.append(f"Perfil do estudante: {row['perfil']}")
-    if row["pontos_fortes"]:
-        textos.append(f"Pontos fortes: {row['pontos_fortes']}")
-    if row["habilidades_desenvolvimento"]:
-        textos.append(f"Habilidades em desenvolvimento: {row['habilidades_desenvolvimento']}")
-    if row["recursos_apoio"]:
-        textos.append(f"Recursos e apoios: {row['recursos_apoio']}")
-    if row["estrategias_metodologicas"]:
-        textos.append(f"Estratégias metodológicas: {row['estrategias_metodologicas']}")
-    if row["adaptacoes_avaliacao"]:
-        textos.append(f"Adaptações para avaliação: {row['adaptacoes_avaliacao']}")
-    if row["participacao_familia"]:
-        textos.append(f"Participação da família: {row['participacao_familia']}")
-    return " ".join(textos)
+    return df
+
+
+def _media_por(fatia, coluna, rotulo, rotulo_media="Média global (1–5)"):
+    """Roll-up de uma fatia do cubo para uma coluna: média = soma / contagem."""
+    somas = fatia.groupby(coluna)[["soma", "contagem"]].sum()
+    return (
+        (somas["soma"] / somas["contagem"].where(somas["contagem"] > 0))
+        .rename(rotulo_media)
+        .reset_index()
+        .rename(columns={coluna: rotulo})
+    )
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def agregados_macro(versao, filtros):
+    """Médias por escola, turno, turma, professora e dimensão do recorte; None sem dados detalhados."""
+    fatia = fatia_cubo(filtros, ["escola", "turno", "turma", "nome_professora", "dominio_nome"])
+    if fatia.empty:
+        return None
+    return {
+        "escola": _media_por(fatia, "escola", "Escola"),
+        "turno": _media_por(fatia, "turno", "Turno"),
+        "turma": _media_por(fatia, "turma", "Turma"),
+        "professora": _media_por(fatia, "nome_professora", "Professora"),
+        "dimensao": _media_por(fatia, "dominio_nome", "Dimensão", "Média (1–5)"),
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def cruzamento_cubo(versao, filtros, linhas, coluna):
+    """Tabela de médias com as colunas do cubo em linhas (e, opcionalmente, uma em colunas)."""
+    colunas = list(linhas) + ([coluna] if coluna else [])
+    fatia = fatia_cubo(filtros, colunas)
+    if fatia.empty:
+        return fatia
+    fatia["media"] = fatia["soma"] / fatia["contagem"].where(fatia["contagem"] > 0)
+    tabela = fatia.set_index(colunas)["media"]
+    if coluna:
+        tabela = tabela.unstack(coluna)
+    else:
+        tabela = tabela.to_frame("Média (1–5)")
+    return tabela.rename_axis(index=[ROTULOS_CUBO[c] for c in linhas], columns=ROTULOS_CUBO.get(coluna))
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def notas_boletim_por_disciplina(versao, filtros):
+    """Notas numéricas do boletim por disciplina no recorte (consulta na tabela boletim, sem ler o texto)."""
+    condicoes, params = condicoes_recorte(filtros)
+    condicoes.append("b.nota_valor IS NOT NULL")
+    conn = sqlite3.connect(DB_PATH)
+    df = pd.read_sql_query(
+        f"""
+        SELECT b.disciplina AS "Disciplina",
+               COUNT(*) AS "Notas",
+               AVG(b.nota_valor) AS "Média",
+               MIN(b.nota_valor) AS "Mínima",
+               MAX(b.nota_valor) AS "Máxima"
+        FROM boletim b
+        JOIN alunos a ON a.id = b.aluno_id
+        WHERE {" AND ".join(condicoes)}
+        GROUP BY b.disciplina
+        ORDER BY b.disciplina
+        """,
+        conn,
+        params=params,
+    )
+    conn.close()
+    return df
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def trajetoria_recorte(versao, filtros):
+    """Estudantes do recorte e a série do grupo por período × dimensão (resumo_trajetoria)."""
+    df_traj = carregar_trajetoria(filtros)
+    n_estudantes = df_traj[["escola", "nome_crianca"]].drop_duplicates().shape[0]
+    return n_estudantes, *resumo_trajetoria(df_traj)
 
 
-def montar_historico_aluno(escola, nome_crianca):
-    if not os.path.exists(DB_PATH):
-        return ""
+@st.cache_data(show_spinner=False, max_entries=2)
+def estatisticas_itens(versao):
+    """
+    Estatísticas dos itens (psicometria.py) de cada instrumento, sobre todas as
+    respostas gravadas, lidas de uma vez.
+    Retorna [(nome do instrumento, itens DataFrame, dimensões DataFrame, resumo)].
+    """
     conn = sqlite3.connect(DB_PATH)
-    df_hist = pd.read_sql_query(
+    # as respostas vêm como três arrays JSON numa única linha: criar uma tupla Python
+    # por resposta custava mais do que ler a tabela inteira
+    ids_json, itens_json, valores_json = conn.execute(
         """
-        SELECT timestamp, ano_escolar, ano_letivo, bimestre
-        FROM alunos
-        WHERE escola = ? AND nome_crianca = ?
-        ORDER BY timestamp ASC
-        """,
-        conn,
-        params=(escola, nome_crianca),
-    )
+        SELECT json_group_array(aluno_id), json_group_array(item_codigo), json_group_array(COALESCE(resposta, 0))
+        FROM respostas
+        """
+    ).fetchone()
+    ano_por_aluno = dict(conn.execute("SELECT id, COALESCE(ano_escolar, '') FROM alunos").fetchall())
     conn.close()
-    if df_hist.shape[0] <= 1:
-        return ""
-    linhas = []
-    for _, row in df_hist.iterrows():
-        linhas.append(
-            f"{row['bimestre'] or ''} - {row['ano_escolar'] or ''} {row['ano_letivo'] or ''} "
-            f"(registro em {row['timestamp']})"
+    avaliacoes = np.array(json.loads(ids_json), dtype=np.int64)
+    if not avaliacoes.size:
+        return []
+    itens = np.array(json.loads(itens_json), dtype=str)
+    valores = np.array(json.loads(valores_json), dtype=float)
+
+    ids_avaliacoes, avaliacao_idx = np.unique(avaliacoes, return_inverse=True)
+    nome_do_ano = {ano: instrumento_do_ano(ano)[0] for ano in set(ano_por_aluno.values())}
+    ano_exemplo = {nome: ano for ano, nome in nome_do_ano.items()}
+    # respostas de avaliações já excluídas ficam sem instrumento ("")
+    instrumento = np.array(
+        [nome_do_ano.get(ano_por_aluno.get(aluno_id), "") for aluno_id in ids_avaliacoes.tolist()]
+    )[avaliacao_idx]
+    resultado = []
+    for nome in sorted(ano_exemplo):
+        linhas_instrumento = instrumento == nome
+        if not linhas_instrumento.any():
+            continue
+        mapa = mapa_itens_instrumento(ano_exemplo[nome])
+        matriz, _ = matriz_respostas(
+            avaliacoes[linhas_instrumento], itens[linhas_instrumento], valores[linhas_instrumento], list(mapa),
         )
-    return "<br>".join(linhas)
+        analise = analisar_instrumento(matriz, [dom_nome for _, dom_nome, _ in mapa.values()])
+        por_item = analise["itens"]
+        df_itens = pd.DataFrame({
+            "Dimensão": [dom_nome for _, dom_nome, _ in mapa.values()],
+            "Item": list(mapa),
+            "Texto": [item_text for _, _, item_text in mapa.values()],
+            "Respostas": por_item["n"],
+            "Média": por_item["media"],
+            "Desvio": por_item["desvio"],
+            **{f"% {v}": 100 * por_item["distribuicao"][:, i] for i, v in enumerate(ESCALA)},
+            "Correlação com a dimensão": por_item["correlacao_dominio"],
+            "Correlação com o instrumento": por_item["correlacao_instrumento"],
+        })
+        df_dominios = pd.DataFrame(
+            analise["dominios"], columns=["Dimensão", "Itens", "Avaliações completas", "Alfa de Cronbach"],
+        )
+        resultado.append((nome, df_itens, df_dominios, {
+            "alfa": analise["alfa"],
+            "n_avaliacoes": analise["n_avaliacoes"],
+            "n_completas": analise["n_completas"],
+        }))
+    return resultado
 
 
-# =========================================================
-# HTML – RELATÓRIO INDIVIDUAL E CONSOLIDADO
-# =========================================================
-def gerar_html_impressao(
-    escola,
-    turno,
-    ano_escolar,
-    turma,
-    ano_letivo,
-    bimestre,
-    crianca,
-    professora,
-    sexo,
-    boletim_texto,
-    df_itens,
-    dominio_media,
-    media_geral,
-    relatorio,
-    sugestoes,
-    radar_b64,
-    historico_html,
-    pei_resumo_html,
-    observacoes_gerais,
-):
-    df_tmp = df_itens[["dominio_nome", "item_texto", "resposta"]].copy()
+@st.cache_data(show_spinner=False, max_entries=16)
+def dados_relatorio_professora(versao, filtros):
+    """
+    Recorte da professora filtrada (escola e turma do filtro, se houver).
+    Retorna (mensagem, None) quando não há o que mostrar, senão (None, dados).
+    """
+    escola, _turno, professora, turma, _aluno = filtros
+    df_alunos = carregar_tabelas_consulta(versao)
+    df_alunos_prof = filtrar_avaliacoes(df_alunos, escola, "(Todos)", professora, turma, "(Todos)")
+    if df_alunos_prof.empty:
+        return "Não há avaliações registradas para essa professora com o filtro atual.", None
+
+    fatia_prof = fatia_cubo((escola, "(Todos)", professora, turma, "(Todos)"), ["dominio_nome"])
+    if fatia_prof.empty:
+        return "Não há dados detalhados para essa professora com o filtro atual.", None
+
+    media_geral_prof = df_alunos_prof["media_geral"].mean()
+    return None, {
+        "n_alunos": df_alunos_prof.shape[0],
+        "media_geral": media_geral_prof if not pd.isna(media_geral_prof) else 0.0,
+        "escola": df_alunos_prof["escola"].iloc[0],
+        "turno": df_alunos_prof["turno"].iloc[0],
+        "turma": turma if turma != "(Todas)" else df_alunos_prof["turma"].iloc[0],
+        "ano_letivo": df_alunos_prof["ano_letivo"].iloc[0],
+        "dominio_media": _media_por(fatia_prof, "dominio_nome", "Dimensão", "Média (1–5)"),
+    }
 
-    def resp_str(v):
-        try:
-            v = int(v)
-        except Exception:
-            return ""
-        if v in LIKERT_LABELS:
-            return LIKERT_LABELS[v]
-        if v == 0:
-            return "Não respondido"
-        return ""
 
-    df_tmp["Escala descritiva"] = df_tmp["resposta"].apply(resp_str)
+@st.cache_data(show_spinner=False, max_entries=32)
+def html_relatorio_aluno(aluno_id, versao):
+    return gerar_html_aluno(aluno_id)
 
-    tabela_html = df_tmp[[
-        "dominio_nome",
-        "item_texto",
-        "Escala descritiva",
-    ]].rename(columns={
-        "dominio_nome": "Dimensão",
-        "item_texto": "Descrição",
-    }).to_html(index=False, border=0, justify="left")
 
-    relatorio_html = "<br>".join(textwrap.fill(l, 100) for l in relatorio.split("\n"))
-    sugestoes_html = "<br>".join(textwrap.fill(l, 100) for l in sugestoes.split("\n"))
+@st.fragment
+def bloco_reimpressao(aluno_id, versao):
+    if aluno_id is None:
+        return
+    relatorio_sel = html_relatorio_aluno(aluno_id, versao)
+    if relatorio_sel is not None:
+        nome_sel, html_sel = relatorio_sel
+        st.download_button(
+            label="Baixar relatório da criança selecionada (.html)",
+            data=html_sel,
+            file_name=f"relatorio_{nome_sel.replace(' ', '_')}.html",
+            mime="text/html",
+        )
+    else:
+        st.info("Não há dados detalhados suficientes para reimprimir essa avaliação.")
 
-    sexo_str = sexo if sexo else "não informado"
 
-    logo_b64 = get_logo_base64()
-    logo_tag = f'<img src="data:image/png;base64,{logo_b64}" class="logo" />' if logo_b64 else ""
-    radar_tag = f'<img src="data:image/png;base64,{radar_b64}" alt="Radar da criança" />' if radar_b64 else ""
-
-    historico_block = ""
-    if historico_html:
-        historico_block = f"""
-        <h2>Histórico de avaliações</h2>
-        <p>Registros anteriores deste estudante na plataforma:</p>
-        <p>{historico_html}</p>
-        """
+@st.fragment
+def bloco_visao_macro(versao, filtros):
+    macro = agregados_macro(versao, filtros)
+    if macro is None:
+        st.info("Nenhum dado detalhado para o filtro selecionado.")
+        return
 
-    pei_block = ""
-    if pei_resumo_html:
-        pei_block = f"""
-        <h2>Informações do Plano Educacional Individualizado (PEI)</h2>
-        <p>{pei_resumo_html}</p>
-        """
+    st.markdown("### Visão macro por escola, turno, turma e professora")
+    colm1, colm2 = st.columns(2)
+    colm3, colm4 = st.columns(2)
+    for coluna, chave, titulo in (
+        (colm1, "escola", "escola"),
+        (colm2, "turno", "turno"),
+        (colm3, "turma", "turma"),
+        (colm4, "professora", "professora"),
+    ):
+        with coluna:
+            st.markdown(f"**Médias por {titulo} (todas as dimensões)**")
+            st.dataframe(macro[chave].style.format({"Média global (1–5)": "{:.2f}"}))
+
+    st.markdown("### Relatório consolidado por dimensão (recorte atual)")
+    dim_consol = macro["dimensao"]
+    st.dataframe(dim_consol.style.format({"Média (1–5)": "{:.2f}"}))
+
+    st.download_button(
+        label="Baixar consolidado em CSV (dimensões - recorte atual)",
+        data=dim_consol.to_csv(index=False, encoding="utf-8-sig"),
+        file_name="consolidado_turma_dimensoes.csv",
+        mime="text/csv",
+    )
 
-    obs_block = ""
-    if observacoes_gerais:
-        obs_texto = textwrap.fill(observacoes_gerais, 100)
-        obs_texto_html = obs_texto.replace("\n", "<br>")
-        obs_block = f"""
-        <h2>Observações da professora</h2>
-        <p>{obs_texto_html}</p>
-        """
+    notas = notas_boletim_por_disciplina(versao, filtros)
+    if not notas.empty:
+        st.markdown("### Boletim: notas por disciplina (recorte atual)")
+        st.dataframe(
+            notas.style.format({"Média": "{:.2f}", "Mínima": "{:.2f}", "Máxima": "{:.2f}"}),
+            hide_index=True,
+        )
 
-    # -------- AJUSTE 2: boletim como TABELA --------
-    boletim_block = ""
-    if boletim_texto:
-        linhas = [l.strip() for l in boletim_texto.split("\n") if l.strip()]
-        if linhas:
-            rows_html = []
-            for linha in linhas:
-                partes = [p.strip() for p in linha.split("|")]
-                disc_val = ""
-                nota_val = ""
-                conteudo_val = ""
-                for ptxt in partes:
-                    if ptxt.startswith("Disciplina:"):
-                        disc_val = ptxt.split("Disciplina:", 1)[1].strip()
-                    elif ptxt.startswith("Nota:"):
-                        nota_val = ptxt.split("Nota:", 1)[1].strip()
-                    elif ptxt.startswith("Conteúdo:"):
-                        conteudo_val = ptxt.split("Conteúdo:", 1)[1].strip()
-                rows_html.append(
-                    f"<tr><td>{disc_val}</td><td>{nota_val}</td><td>{conteudo_val}</td></tr>"
-                )
-            boletim_tabela_html = (
-                "<table>"
-                "<thead><tr><th>Disciplina</th><th>Nota</th><th>Conteúdo programático</th></tr></thead>"
-                "<tbody>"
-                + "\n".join(rows_html)
-                + "</tbody></table>"
+
+@st.fragment
+def bloco_cruzamentos(versao, filtros):
+    st.markdown("### Cruzamentos (médias por dimensão em qualquer recorte)")
+    rotulos = list(ROTULOS_CUBO.values())
+    coluna_do_rotulo = {rotulo: coluna for coluna, rotulo in ROTULOS_CUBO.items()}
+    colx1, colx2 = st.columns([2, 1])
+    with colx1:
+        linhas = st.multiselect("Linhas", rotulos, default=["Dimensão"], key="cubo_linhas")
+    with colx2:
+        coluna = st.selectbox(
+            "Colunas", ["(nenhuma)"] + [r for r in rotulos if r not in linhas], index=1, key="cubo_coluna",
+        )
+    if not linhas:
+        st.caption("Escolha pelo menos um recorte para as linhas.")
+        return
+    tabela = cruzamento_cubo(
+        versao,
+        filtros,
+        tuple(coluna_do_rotulo[r] for r in linhas),
+        coluna_do_rotulo.get(coluna),
+    )
+    if tabela.empty:
+        st.info("Nenhum dado detalhado para o recorte selecionado.")
+        return
+    st.dataframe(tabela.style.format("{:.2f}", na_rep="–"))
+    st.download_button(
+        label="Baixar cruzamento em CSV",
+        data=tabela.to_csv(encoding="utf-8-sig"),
+        file_name="cruzamento_dimensoes.csv",
+        mime="text/csv",
+    )
+
+
+@st.fragment
+def bloco_trajetoria(versao, filtros):
+    _escola, _turno, _professora, turma, aluno = filtros
+    if turma == "(Todas)" and aluno == "(Todos)":
+        return
+    n_estudantes, medias, deltas, n_por_periodo = trajetoria_recorte(versao, filtros)
+    if medias.empty:
+        return
+
+    st.markdown("### Trajetória por dimensão (período a período)")
+    st.caption(
+        f"{n_estudantes} estudante(s) do recorte, em todos os períodos em que foram avaliados. "
+        "A variação é calculada para cada estudante em relação ao seu período anterior e depois resumida pela média."
+    )
+    svg = tendencia_svg(
+        tuple(medias.index),
+        tuple(
+            (dimensao, tuple(None if pd.isna(v) else round(float(v), 2) for v in medias[dimensao]))
+            for dimensao in medias.columns
+        ),
+    )
+    if svg:
+        st.image(svg)
+    colt1, colt2 = st.columns(2)
+    with colt1:
+        st.markdown("**Média por dimensão (1–5)**")
+        st.dataframe(medias.style.format("{:.2f}", na_rep="–"))
+    with colt2:
+        st.markdown("**Variação em relação ao período anterior**")
+        st.dataframe(deltas.style.format("{:+.2f}", na_rep="–"))
+    if n_estudantes > 1:
+        with st.expander("Estudantes avaliados por período e dimensão"):
+            st.dataframe(n_por_periodo)
+
+
+# correlação item-total corrigida abaixo disso: item pouco alinhado com os demais
+CORRELACAO_ITEM_MINIMA = 0.3
+
+
+@st.fragment
+def bloco_qualidade_itens(versao):
+    if not st.toggle("Mostrar estatísticas dos itens do instrumento (todas as avaliações)", key="mostrar_psicometria"):
+        return
+    instrumentos = estatisticas_itens(versao)
+    if not instrumentos:
+        st.info("Ainda não há respostas gravadas para analisar.")
+        return
+    st.caption(
+        "Média, distribuição das respostas, correlação item-total corrigida (item contra a soma dos demais) e "
+        "alfa de Cronbach, calculados sobre as avaliações com todos os itens respondidos. Itens com correlação "
+        f"abaixo de {CORRELACAO_ITEM_MINIMA:.1f} aparecem destacados."
+    )
+    abas = st.tabs([nome for nome, *_ in instrumentos])
+    for aba, (nome, df_itens, df_dominios, resumo) in zip(abas, instrumentos):
+        with aba:
+            alfa = resumo["alfa"]
+            st.markdown(
+                f"**{nome}** – {resumo['n_avaliacoes']} avaliação(ões), {resumo['n_completas']} completa(s); "
+                f"alfa do instrumento: {'–' if pd.isna(alfa) else f'{alfa:.2f}'}"
+            )
+            st.dataframe(df_dominios.style.format({"Alfa de Cronbach": "{:.2f}"}, na_rep="–"), hide_index=True)
+            fracos = df_itens["Correlação com a dimensão"] < CORRELACAO_ITEM_MINIMA
+            st.dataframe(
+                df_itens.style.format(
+                    {coluna: "{:.2f}" for coluna in df_itens.columns[4:] if not coluna.startswith("%")}
+                    | {coluna: "{:.0f}%" for coluna in df_itens.columns if coluna.startswith("%")},
+                    na_rep="–",
+                ).apply(
+                    lambda coluna: np.where(fracos, "background-color: #fde2e1", ""),
+                    subset=["Correlação com a dimensão"],
+                ),
+                hide_index=True,
+            )
+            st.download_button(
+                label="Baixar estatísticas dos itens em CSV",
+                data=df_itens.to_csv(index=False, encoding="utf-8-sig"),
+                file_name=f"itens_{nome_arquivo_seguro(nome)}.csv",
+                mime="text/csv",
+                key=f"csv_itens_{nome}",
             )
-            boletim_block = f"""
-            <h2>Boletim escolar / desempenho formal</h2>
-            {boletim_tabela_html}
-            """
 
-    html = f"""
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <title>Relatório - {crianca}</title>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                margin: 20px;
-                color: {DARK_GRAY};
-            }}
-            h1, h2, h3 {{
-                color: {PRIMARY_BLUE};
-            }}
-            table {{
-                border-collapse: collapse;
-                width: 100%;
-                margin-bottom: 20px;
-            }}
-            th, td {{
-                border: 1px solid #ccc;
-                padding: 6px;
-                font-size: 12px;
-                text-align: left;
-            }}
-            .logo {{
-                position: absolute;
-                top: 20px;
-                right: 20px;
-                height: 80px;
-            }}
-        </style>
-    </head>
-    <body>
-        {logo_tag}
-        <h1>Relatório de desenvolvimento</h1>
-
-        <h2>Dados do estudante</h2>
-        <p><b>Escola:</b> {escola}</p>
-        <p><b>Turno:</b> {turno}</p>
-        <p><b>Ano escolar:</b> {ano_escolar}</p>
-        <p><b>Turma:</b> {turma}</p>
-        <p><b>Ano letivo:</b> {ano_letivo}</p>
-        <p><b>Bimestre:</b> {bimestre}</p>
-        <p><b>Nome do estudante:</b> {crianca}</p>
-        <p><b>Sexo:</b> {sexo_str}</p>
-        <p><b>Professora responsável:</b> {professora}</p>
-
-        {pei_block}
-        {boletim_block}
-
-        <h3>Perfil por dimensão (uso interno da escola)</h3>
-        {radar_tag}
-
-        <h3>Respostas por item (escala descritiva)</h3>
-        {tabela_html}
-
-        <h2>Relatório individual</h2>
-        <p>{relatorio_html}</p>
-
-        <h2>Plano de estudo complementar / orientações para a família</h2>
-        <p>{sugestoes_html}</p>
-    </body>
-    </html>
-    """
-    return html
 
+@st.fragment
+def bloco_relatorio_professora(versao, filtros):
+    if agregados_macro(versao, filtros) is None:
+        return
+    st.write("---")
+    st.markdown("### Relatório individualizado por professora")
 
-def gerar_html_relatorio_professora(
-    nome_professora,
-    escola,
-    turno,
-    turma,
-    ano_letivo,
-    n_alunos,
-    media_geral_prof,
-    dominio_media_prof,
-    plano_prof,
-    radar_b64
-):
-    dominios_html = dominio_media_prof.to_html(index=False, border=0, justify="left")
-    plano_html = "<br>".join(textwrap.fill(l, 100) for l in plano_prof.split("\n"))
+    filtro_prof = filtros[2]
+    if st.button("Gerar relatório consolidado da professora"):
+        if filtro_prof == "(Todos)":
+            st.warning("Selecione uma professora específica no filtro para gerar o relatório individualizado.")
+        else:
+            st.session_state["relatorio_prof_filtros"] = filtros
 
-    logo_b64 = get_logo_base64()
-    logo_tag = f'<img src="data:image/png;base64,{logo_b64}" class="logo" />' if logo_b64 else ""
-
-    html = f"""
-    <html>
-    <head>
-        <meta charset="utf-8">
-        <title>Relatório - Professora {nome_professora}</title>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                margin: 20px;
-                color: {DARK_GRAY};
-            }}
-            h1, h2, h3 {{
-                color: {PRIMARY_BLUE};
-            }}
-            table {{
-                border-collapse: collapse;
-                width: 100%;
-                margin-bottom: 20px;
-            }}
-            th, td {{
-                border: 1px solid #ccc;
-                padding: 6px;
-                font-size: 12px;
-                text-align: left;
-            }}
-            .logo {{
-                position: absolute;
-                top: 20px;
-                right: 20px;
-                height: 80px;
-            }}
-        </style>
-    </head>
-    <body>
-        {logo_tag}
-        <h1>Relatório consolidado da turma</h1>
-
-        <h2>Dados gerais</h2>
-        <p><b>Escola:</b> {escola or ""}</p>
-        <p><b>Turno:</b> {turno or ""}</p>
-        <p><b>Turma:</b> {turma or "Não especificada"}</p>
-        <p><b>Ano letivo:</b> {ano_letivo or ""}</p>
-        <p><b>Professora:</b> {nome_professora}</p>
-        <p><b>Número de estudantes avaliados:</b> {n_alunos}</p>
-        <p><b>Média geral (escala interna 1–5):</b> {media_geral_prof:.2f}</p>
-
-        <h2>Médias por dimensão</h2>
-        {dominios_html}
-
-        <h2>Perfil por dimensão (gráfico de radar)</h2>
-        <img src="data:image/png;base64,{radar_b64}" alt="Radar da turma" />
-
-        <h2>Plano de desenvolvimento da turma</h2>
-        <p>{plano_html}</p>
-    </body>
-    </html>
-    """
-    return html
+    # o relatório continua na tela nas reexecuções seguintes enquanto o filtro não mudar
+    if st.session_state.get("relatorio_prof_filtros") != filtros:
+        return
+
+    mensagem, dados = dados_relatorio_professora(versao, filtros)
+    if mensagem:
+        st.info(mensagem)
+        return
+
+    dominio_media_prof = dados["dominio_media"]
+    dominio_media_prof_plot = dominio_media_prof.rename(
+        columns={"Dimensão": "dominio_nome", "Média (1–5)": "media_dominio"},
+    )
+    dominio_media_prof_plot["dominio"] = ""
+
+    colp1, colp2 = st.columns(2)
+    with colp1:
+        st.markdown("#### Médias por dimensão (turma da professora)")
+        st.dataframe(dominio_media_prof.style.format({"Média (1–5)": "{:.2f}"}))
+    with colp2:
+        st.markdown("#### Gráfico de radar da turma da professora")
+        mostrar_radar(dominio_media_prof_plot)
+
+    # o plano só é gerado de novo quando mudam os dados enviados à IA (recorte e médias),
+    # não a cada reexecução do bloco (edição do texto, download)
+    contexto_prof_str = " ".join([
+        f"Relatório individualizado da professora {filtro_prof}.",
+        f"Escola: {dados['escola']}.",
+        f"Turno: {dados['turno']}.",
+        f"Turma: {dados['turma']}.",
+        f"Ano letivo: {dados['ano_letivo']}.",
+        f"Número de estudantes avaliados: {dados['n_alunos']}.",
+    ])
+    chave_plano = (contexto_prof_str, tuple(dominio_media_prof.itertuples(index=False, name=None)))
+    if st.session_state.get("plano_prof_chave") != chave_plano or "plano_prof_texto" not in st.session_state:
+        st.session_state["plano_prof_texto"] = gerar_plano_turma_ia(
+            dominio_media_prof_plot[["dominio_nome", "media_dominio"]],
+            contexto_prof_str,
+        )
+        st.session_state["plano_prof_chave"] = chave_plano
+
+    plano_prof_editado = st.text_area(
+        "Plano de desenvolvimento global da turma (edite se desejar):",
+        height=350,
+        key="plano_prof_texto",
+    )
+
+    radar_tag_prof = radar_html(
+        dominio_media_prof_plot, "Radar da turma", RADAR_FORMATO, RADAR_SVG_INLINE, RADAR_MOTOR,
+    )
+    html_prof = gerar_html_relatorio_professora(
+        nome_professora=filtro_prof,
+        escola=dados["escola"],
+        turno=dados["turno"],
+        turma=dados["turma"],
+        ano_letivo=dados["ano_letivo"],
+        n_alunos=dados["n_alunos"],
+        media_geral_prof=dados["media_geral"],
+        dominio_media_prof=dominio_media_prof,
+        plano_prof=plano_prof_editado,
+        radar_tag=radar_tag_prof,
+    )
+
+    safe_prof = filtro_prof.replace(" ", "_")
+    st.download_button(
+        label="Exportar relatório da professora (.html)",
+        data=html_prof,
+        file_name=f"relatorio_professora_{safe_prof}.html",
+        mime="text/html",
+    )
 
 
 # =========================================================
 # ESTADO STREAMLIT
 # =========================================================
+if os.path.exists(DB_PATH):
+    banco_atualizado()
+
+if PREFETCH_ATIVO:
+    iniciar_prefetch()
+
 if "resultado" not in st.session_state:
     st.session_state["resultado"] = None
 
@@ -1500,8 +3805,8 @@ if "reprint_id" not in st.session_state:
 if "aluno_cadastrado" not in st.session_state:
     st.session_state["aluno_cadastrado"] = False
 
-if "boletim_df" not in st.session_state:
-    st.session_state["boletim_df"] = None
+if "boletim_linhas" not in st.session_state:
+    st.session_state["boletim_linhas"] = None
     st.session_state["ano_escolar_boletim"] = None
     st.session_state["nome_crianca_boletim"] = None
 
@@ -1522,11 +3827,10 @@ def resetar_avaliacao():
     st.session_state["nome_professora"] = ""
     st.session_state["bimestre"] = ""
     st.session_state["neuroatipico"] = False    
-    st.session_state["boletim_texto"] = ""
     st.session_state["observacoes_gerais"] = ""
     st.session_state["aluno_cadastrado"] = False
     st.session_state["resultado"] = None
-    st.session_state["boletim_df"] = None
+    st.session_state["boletim_linhas"] = None
     st.session_state["ano_escolar_boletim"] = None
     st.session_state["nome_crianca_boletim"] = None
     st.session_state["edit_id"] = None
@@ -1543,6 +3847,9 @@ def carregar_avaliacao_para_form(aluno_id):
         conn,
         params=(aluno_id,),
     )
+    boletim_salvo = conn.execute(
+        "SELECT disciplina, nota, conteudo FROM boletim WHERE aluno_id = ? ORDER BY id", (aluno_id,)
+    ).fetchall()
     conn.close()
     if df_alunos.empty:
         return
@@ -1559,7 +3866,6 @@ def carregar_avaliacao_para_form(aluno_id):
     st.session_state["nome_professora"] = row["nome_professora"] or ""
     st.session_state["bimestre"] = row["bimestre"] or ""
     st.session_state["neuroatipico"] = bool(row["neuroatipico"])
-    st.session_state["boletim_texto"] = row["boletim_texto"] or ""
     st.session_state["observacoes_gerais"] = row.get("observacoes_gerais", "") or ""
 
     # Carrega as respostas numéricas (1–5) nos widgets de escala
@@ -1580,25 +3886,290 @@ def carregar_avaliacao_para_form(aluno_id):
             # fallback: valor central da escala
             st.session_state[key] = 3
 
+    # boletim salvo de volta no editor, para a edição não gravar um boletim em branco
+    if boletim_salvo:
+        st.session_state["boletim_linhas"] = boletim_salvo
+        st.session_state["ano_escolar_boletim"] = st.session_state["ano_escolar"]
+        st.session_state["nome_crianca_boletim"] = st.session_state["nome_crianca"]
+
     st.session_state["aluno_cadastrado"] = True
     st.session_state["resultado"] = None
+    marcar_em_edicao(aluno_id)
+
+
+def marcar_em_edicao(aluno_id):
+    """
+    Faz os próximos salvamentos do formulário atualizarem essa avaliação (aberta
+    por Editar/Carregar ou recém-salva), enquanto o cadastro continuar sendo o
+    dela; ver avaliacao_em_edicao.
+    """
+    st.session_state["edit_id"] = int(aluno_id)
+    st.session_state["edit_loaded"] = True
+
+
+# ---------------------------------------------------------
+# Rascunho do formulário de avaliação (professora + estudante). A cada rerun da
+# seção, os campos que mudaram desde a última gravação são regravados, no máximo
+# uma vez a cada RASCUNHO_INTERVALO_S (os botões do formulário gravam na hora);
+# o que ficou pendente dentro do intervalo é gravado pelo bloco_rascunho, que
+# roda de novo sozinho ao fim de cada intervalo.
+# ---------------------------------------------------------
+CAMPOS_CADASTRO = {
+    "escola", "turno", "ano_escolar", "turma_crianca", "ano_letivo", "bimestre",
+    "nome_crianca", "nome_social", "sexo_crianca", "nome_professora", "neuroatipico",
+}
+
+
+def chave_rascunho():
+    chave = tuple(
+        str(st.session_state.get(c) or "").strip() for c in ("nome_professora", "escola", "nome_crianca")
+    )
+    return chave if all(chave) else None
+
+
+def campos_rascunho():
+    """Estado atual do formulário como {campo: valor em JSON}."""
+    campos = {
+        c: json.dumps(st.session_state[c], ensure_ascii=False, default=str)
+        for c in CAMPOS_FORMULARIO_AVALIACAO
+        if c in st.session_state
+    }
+    if st.session_state.get("boletim_linhas") is not None:
+        campos["boletim_linhas"] = json.dumps(st.session_state["boletim_linhas"], ensure_ascii=False, default=str)
+    return campos
+
+
+def autosalvar_rascunho(forcar=False):
+    """Grava os campos alterados; dentro do intervalo mínimo só marca o rascunho como pendente."""
+    chave = chave_rascunho()
+    if chave is None:
+        return
+    gravado = st.session_state.get("rascunho_gravado")
+    if gravado is None or gravado["chave"] != chave:
+        gravado = {"chave": chave, "campos": {}, "instante": 0.0}
+    atuais = campos_rascunho()
+    alterados = {c: v for c, v in atuais.items() if gravado["campos"].get(c) != v}
+    if alterados and not forcar and time.monotonic() - gravado["instante"] < RASCUNHO_INTERVALO_S:
+        gravado["pendente"] = True
+    else:
+        if alterados:
+            salvar_rascunho(chave, alterados)
+            gravado["instante"] = time.monotonic()
+            gravado["hora"] = datetime.now().strftime("%H:%M:%S")
+        gravado["campos"] = atuais
+        gravado["pendente"] = False
+    st.session_state["rascunho_gravado"] = gravado
+
+
+@st.fragment(run_every=RASCUNHO_INTERVALO_S)
+def bloco_rascunho():
+    """Grava o que ficou pendente quando o intervalo termina, mesmo sem nova interação, e mostra o estado."""
+    autosalvar_rascunho()
+    gravado = st.session_state.get("rascunho_gravado")
+    if gravado is None or gravado["chave"] != chave_rascunho():
+        return
+    if gravado.get("pendente"):
+        st.caption("Rascunho: alterações recentes serão guardadas em instantes.")
+    elif gravado.get("hora"):
+        st.caption(f"Rascunho guardado às {gravado['hora']}.")
+
+
+def restaurar_rascunho():
+    """
+    Ao cadastrar o estudante, recoloca no formulário o rascunho salvo para a mesma
+    professora e estudante (escala, boletim e observações; o cadastro já foi digitado).
+    Retorna o número de campos restaurados.
+    """
+    chave = chave_rascunho()
+    if chave is None:
+        return 0
+    salvos = carregar_rascunho(chave)
+    restaurados = 0
+    for campo, valor in salvos.items():
+        if campo in CAMPOS_CADASTRO:
+            continue
+        valor = json.loads(valor)
+        if campo == "boletim_linhas":
+            st.session_state["boletim_linhas"] = [tuple(linha) for linha in valor]
+            st.session_state["ano_escolar_boletim"] = st.session_state.get("ano_escolar")
+            st.session_state["nome_crianca_boletim"] = st.session_state.get("nome_crianca")
+        else:
+            st.session_state[campo] = valor
+        restaurados += 1
+    st.session_state["rascunho_gravado"] = {"chave": chave, "campos": salvos, "instante": time.monotonic()}
+    return restaurados
+
+
+def descartar_rascunho():
+    """Depois de salvar a avaliação no banco o rascunho não é mais necessário."""
+    chave = chave_rascunho()
+    if chave is None:
+        return
+    excluir_rascunho(chave)
+    st.session_state["rascunho_gravado"] = {"chave": chave, "campos": campos_rascunho(), "instante": time.monotonic()}
+
+
+CHAVE_AVALIACAO = ("escola", "nome_crianca", "ano_letivo", "bimestre")
+
+
+def avaliacao_em_edicao(escola, nome_crianca, ano_letivo, bimestre):
+    """
+    Id da avaliação que o formulário deve atualizar, ou None para inserir uma nova.
+    Só atualiza se escola, estudante, ano letivo e bimestre do formulário são os
+    da avaliação em edição: trocar o período (ou o estudante) grava outra
+    avaliação em vez de sobrescrever a de um período anterior.
+    """
+    edit_id = st.session_state.get("edit_id")
+    if edit_id is None:
+        return None
+    anterior = carregar_avaliacao(edit_id, versao_banco())
+    if anterior is None:
+        return None
+    if tuple(anterior[c] or "" for c in CHAVE_AVALIACAO) != (escola, nome_crianca, ano_letivo, bimestre):
+        return None
+    return edit_id
+
+
+# ---------- Lançamento da turma (grade estudantes × itens) ----------
+OPCOES_SEXO = ["", "Masculino", "Feminino", "Outro", "Prefere não informar"]
+
+
+def nomes_lancamento_turma(texto):
+    """Um estudante por linha, sem linhas vazias nem espaços nas pontas."""
+    return [linha.strip() for linha in (texto or "").splitlines() if linha.strip()]
+
+
+def grade_turma(ano_escolar, nomes):
+    """
+    Estado da grade em st.session_state["turma_grade"]: sexos e matriz de
+    respostas (float, NaN = em branco) na ordem de mapa_itens_instrumento.
+    Quando a lista de estudantes ou o ano mudam, as linhas já preenchidas são
+    mantidas pelo nome do estudante (se o instrumento é o mesmo) e a versão
+    avança, o que cria um editor novo.
+    """
+    itens = tuple(mapa_itens_instrumento(ano_escolar))
+    chave = (itens, tuple(nomes))
+    grade = st.session_state.get("turma_grade")
+    if grade is not None and grade["chave"] == chave:
+        return grade
+
+    respostas = np.full((len(nomes), len(itens)), np.nan)
+    sexos = [""] * len(nomes)
+    versao = 0
+    if grade is not None:
+        versao = grade["versao"] + 1
+        if grade["chave"] is not None and grade["chave"][0] == itens:
+            linha_anterior = {nome: i for i, nome in enumerate(grade["chave"][1])}
+            for i, nome in enumerate(nomes):
+                if nome in linha_anterior:
+                    respostas[i] = grade["respostas"][linha_anterior[nome]]
+                    sexos[i] = grade["sexos"][linha_anterior[nome]]
+    grade = {"chave": chave, "sexos": sexos, "respostas": respostas, "base": None, "versao": versao}
+    st.session_state["turma_grade"] = grade
+    return grade
+
+
+def validar_lancamento_turma(cabecalho, nomes, respostas, itens):
+    """Validação da turma inteira de uma vez; retorna a lista de problemas (vazia se pode salvar)."""
+    problemas = []
+    faltando = [rotulo for rotulo, valor in cabecalho.items() if not valor]
+    if faltando:
+        problemas.append("Preencha: " + ", ".join(faltando) + ".")
+    if not nomes:
+        problemas.append("Informe pelo menos um estudante (um nome por linha).")
+        return problemas
+
+    vistos = set()
+    repetidos = sorted({nome for nome in nomes if nome in vistos or vistos.add(nome)})
+    if repetidos:
+        problemas.append("Estudantes repetidos na lista: " + ", ".join(repetidos) + ".")
+
+    em_branco = np.isnan(respostas)
+    fora_da_escala = ~em_branco & ((respostas < 1) | (respostas > 5) | (respostas != np.round(respostas)))
+    for i in np.flatnonzero(fora_da_escala.any(axis=1)):
+        codigos = [itens[j] for j in np.flatnonzero(fora_da_escala[i])]
+        problemas.append(f"{nomes[i]}: valores fora da escala 1–5 em {', '.join(codigos)}.")
+    for i in np.flatnonzero(em_branco.any(axis=1)):
+        n = int(em_branco[i].sum())
+        problemas.append(f"{nomes[i]}: {n} item(ns) sem resposta.")
+
+    if not faltando:
+        ja_avaliados = avaliacoes_ja_registradas(
+            cabecalho["escola"], cabecalho["ano letivo"], cabecalho["bimestre"], nomes,
+        )
+        if ja_avaliados:
+            problemas.append(
+                "Já existe avaliação neste bimestre para: " + ", ".join(ja_avaliados)
+                + ". Edite essas avaliações em Consultas ou retire os nomes da lista."
+            )
+    return problemas
 
 
 # =========================================================
-# LAYOUT – TABS
+# LAYOUT – NAVEGAÇÃO ENTRE SEÇÕES
 # =========================================================
-tab_avaliar, tab_consulta, tab_pei = st.tabs(
-    ["Nova avaliação", "Consultas / Relatórios", "PEI – Plano Individual"]
-)
+# Só a seção escolhida é executada a cada interação (com st.tabs as três abas,
+# inclusive as consultas ao banco de Consultas e PEI, rodavam em todo rerun)
+SECAO_AVALIAR = "Nova avaliação"
+SECAO_TURMA = "Lançamento da turma"
+SECAO_CONSULTA = "Consultas / Relatórios"
+SECAO_PEI = "PEI – Plano Individual"
+SECOES = [SECAO_AVALIAR, SECAO_TURMA, SECAO_CONSULTA, SECAO_PEI]
+
+# Campos do cadastro e da escala: o Streamlit descarta o estado de widgets que
+# não são desenhados na execução, então eles são "tocados" a cada rerun para o
+# formulário continuar preenchido enquanto outra seção está aberta
+CAMPOS_FORMULARIO_AVALIACAO = [
+    "escola",
+    "turno",
+    "ano_escolar",
+    "turma_crianca",
+    "ano_letivo",
+    "bimestre",
+    "nome_crianca",
+    "nome_social",
+    "sexo_crianca",
+    "nome_professora",
+    "neuroatipico",
+    "observacoes_gerais",
+] + [
+    f"{dom_code}_{item_code}"
+    for instrumento_ano in (
+        instrumento_ei(), instrumento_1_ano_ef(), instrumento_2a5_ef(), instrumento_6a9_ef(), instrumento_em(),
+    )
+    for dom_code, dom_data in instrumento_ano.items()
+    for item_code, _ in dom_data["itens"]
+]
+CAMPOS_LANCAMENTO_TURMA = [
+    "lanc_escola",
+    "lanc_turno",
+    "lanc_ano_escolar",
+    "lanc_turma",
+    "lanc_ano_letivo",
+    "lanc_bimestre",
+    "lanc_professora",
+    "lanc_estudantes",
+]
+for chave in CAMPOS_FORMULARIO_AVALIACAO + CAMPOS_LANCAMENTO_TURMA:
+    if chave in st.session_state:
+        st.session_state[chave] = st.session_state[chave]
+
+# Troca de seção pedida por um botão (ex.: "Editar" em Consultas) no rerun anterior
+if st.session_state.get("secao_destino"):
+    st.session_state["secao"] = st.session_state.pop("secao_destino")
+
+secao = st.radio("Seção", SECOES, horizontal=True, key="secao", label_visibility="collapsed")
+
 # Se houver uma avaliação marcada para edição, carrega antes de desenhar os widgets
 if st.session_state.get("edit_id") is not None and not st.session_state.get("edit_loaded", False):
     carregar_avaliacao_para_form(st.session_state["edit_id"])
     st.session_state["edit_loaded"] = True
 
 # ---------------------------------------------------------
-# ABA 1 – NOVA AVALIAÇÃO
+# SEÇÃO 1 – NOVA AVALIAÇÃO
 # ---------------------------------------------------------
-with tab_avaliar:
+if secao == SECAO_AVALIAR:
+    forcar_rascunho = False
     col_title, col_logo = st.columns([5, 1])
     with col_title:
         st.markdown(
@@ -1624,24 +4195,28 @@ with tab_avaliar:
             resetar_avaliacao()
     with col_ar2:
         if os.path.exists(DB_PATH):
-            conn = sqlite3.connect(DB_PATH)
-            df_alunos_all = pd.read_sql_query(
-                "SELECT id, escola, nome_crianca, ano_escolar, turma, timestamp FROM alunos ORDER BY timestamp DESC",
-                conn,
+            termo_busca = st.text_input(
+                "Continuar avaliação já registrada – buscar por aluno, escola ou turma:",
+                key="busca_avaliacao",
+                placeholder="Digite o início do nome e tecle Enter",
             )
-            conn.close()
-            if not df_alunos_all.empty:
+            df_encontradas = buscar_avaliacoes(termo_busca)
+            if not df_encontradas.empty:
                 opcoes = ["(Selecionar avaliação para carregar)"]
                 mapa = {}
-                for _, row in df_alunos_all.iterrows():
-                    label = f"{row['id']} – {row['nome_crianca']} – {row['escola']} – {row['ano_escolar']} – {row['turma']} ({row['timestamp']})"
+                for row in df_encontradas.itertuples(index=False):
+                    label = f"{row.id} – {row.nome_crianca} – {row.escola} – {row.ano_escolar} – {row.turma} ({row.timestamp})"
                     opcoes.append(label)
-                    mapa[label] = int(row["id"])
-                escolha = st.selectbox("Continuar avaliação já registrada:", opcoes)
+                    mapa[label] = int(row.id)
+                escolha = st.selectbox(
+                    f"Avaliações encontradas (até {BUSCA_MAX_RESULTADOS}, das mais recentes):", opcoes,
+                )
                 if escolha != "(Selecionar avaliação para carregar)":
                     if st.button("Carregar avaliação selecionada"):
                         carregar_avaliacao_para_form(mapa[escolha])
                         st.success("Avaliação carregada no formulário.")
+            elif termo_busca:
+                st.caption("Nenhuma avaliação encontrada para essa busca.")
             else:
                 st.caption("Nenhuma avaliação registrada ainda para carregamento.")
         else:
@@ -1702,6 +4277,8 @@ with tab_avaliar:
         else:
             st.session_state["aluno_cadastrado"] = True
             st.success("Estudante cadastrado. O instrumento de avaliação será exibido abaixo.")
+            if restaurar_rascunho():
+                st.info("Rascunho anterior desta professora para este estudante restaurado no formulário.")
 
     # -------- APENAS MOSTRAR QUESTIONÁRIO APÓS CADASTRO --------
     if st.session_state.get("aluno_cadastrado"):
@@ -1730,24 +4307,18 @@ with tab_avaliar:
             if ano_tem_boletim(ano_escolar):
                 disciplinas_base = get_disciplinas_boletim_mec(ano_escolar)
 
-                # Inicializa ou reaproveita tabela do boletim
+                # Inicializa ou reaproveita tabela do boletim (na sessão ficam só as linhas, como tuplas)
                 precisa_novo_df = (
-                    st.session_state.get("boletim_df") is None
+                    st.session_state.get("boletim_linhas") is None
                     or st.session_state.get("ano_escolar_boletim") != ano_escolar
                     or st.session_state.get("nome_crianca_boletim") != nome_crianca
                 )
 
                 if precisa_novo_df:
-                    boletim_df = pd.DataFrame({
-                        "Disciplina": disciplinas_base,
-                        "Nota": ["" for _ in disciplinas_base],
-                        "Conteúdo programático": ["" for _ in disciplinas_base],
-                    })
-                    st.session_state["boletim_df"] = boletim_df
+                    st.session_state["boletim_linhas"] = [(disc, "", "") for disc in disciplinas_base]
                     st.session_state["ano_escolar_boletim"] = ano_escolar
                     st.session_state["nome_crianca_boletim"] = nome_crianca
-                else:
-                    boletim_df = st.session_state["boletim_df"]
+                boletim_df = pd.DataFrame(st.session_state["boletim_linhas"], columns=COLUNAS_BOLETIM)
 
                 st.caption("Preencha a nota e o conteúdo programático trabalhado em cada disciplina.")
                 boletim_editado = st.data_editor(
@@ -1756,26 +4327,10 @@ with tab_avaliar:
                     use_container_width=True,
                     key="boletim_editor",
                 )
-                st.session_state["boletim_df"] = boletim_editado
-
-                # Converte o boletim em texto para salvar no banco e usar no relatório
-                linhas_boletim = []
-                for _, row_b in boletim_editado.iterrows():
-                    disc = str(row_b.get("Disciplina", "")).strip()
-                    nota_b = str(row_b.get("Nota", "")).strip()
-                    conteudo = str(row_b.get("Conteúdo programático", "")).strip()
-                    if disc or nota_b or conteudo:
-                        partes = []
-                        if disc:
-                            partes.append(f"Disciplina: {disc}")
-                        if nota_b:
-                            partes.append(f"Nota: {nota_b}")
-                        if conteudo:
-                            partes.append(f"Conteúdo: {conteudo}")
-                        linhas_boletim.append(" | ".join(partes))
-                st.session_state["boletim_texto"] = "\n".join(linhas_boletim)
+                st.session_state["boletim_linhas"] = list(
+                    boletim_editado[COLUNAS_BOLETIM].itertuples(index=False, name=None)
+                )
             else:
-                st.session_state["boletim_texto"] = ""
                 st.caption("Para esta etapa, o foco principal são os registros de desenvolvimento global.")
 
             st.write("---")
@@ -1826,11 +4381,18 @@ with tab_avaliar:
                     height=120,
                 )
 
-                col_btn1, col_btn2 = st.columns(2)
+                col_btn1, col_btn2, col_btn3 = st.columns(3)
                 with col_btn1:
                     salvar_sem_relatorio = st.form_submit_button("Salvar avaliação (sem gerar relatório)")
                 with col_btn2:
                     enviado = st.form_submit_button("Gerar relatório com IA")
+                with col_btn3:
+                    guardar_rascunho = st.form_submit_button("Guardar rascunho")
+
+            # qualquer envio do formulário grava o rascunho na hora (as respostas só chegam ao servidor no envio)
+            forcar_rascunho = salvar_sem_relatorio or enviado or guardar_rascunho
+            if guardar_rascunho:
+                st.success("Rascunho guardado. Ele volta ao formulário ao cadastrar de novo a mesma professora e estudante.")
 
             if salvar_sem_relatorio or enviado:
                 escola = st.session_state.get("escola", "")
@@ -1844,27 +4406,12 @@ with tab_avaliar:
                 nome_professora = st.session_state.get("nome_professora", "")
                 neuroatipico = st.session_state.get("neuroatipico", False)
 
-                # -------- AJUSTE 1: recalcular boletim_texto com o DF atual --------
-                boletim_texto = ""
-                if ano_tem_boletim(ano_escolar):
-                    boletim_df_atual = st.session_state.get("boletim_df")
-                    if boletim_df_atual is not None:
-                        linhas_boletim = []
-                        for _, row_b in boletim_df_atual.iterrows():
-                            disc = str(row_b.get("Disciplina", "")).strip()
-                            nota_b = str(row_b.get("Nota", "")).strip()
-                            conteudo = str(row_b.get("Conteúdo programático", "")).strip()
-                            if disc or nota_b or conteudo:
-                                partes = []
-                                if disc:
-                                    partes.append(f"Disciplina: {disc}")
-                                if nota_b:
-                                    partes.append(f"Nota: {nota_b}")
-                                if conteudo:
-                                    partes.append(f"Conteúdo: {conteudo}")
-                                linhas_boletim.append(" | ".join(partes))
-                        boletim_texto = "\n".join(linhas_boletim)
-                st.session_state["boletim_texto"] = boletim_texto
+                # Boletim do editor: tabela (gravada na tabela boletim) e texto (prompts e relatórios)
+                boletim_linhas_atual = st.session_state.get("boletim_linhas")
+                df_boletim = tabela_boletim(
+                    boletim_linhas_atual if ano_tem_boletim(ano_escolar) and boletim_linhas_atual else []
+                )
+                boletim_texto = texto_boletim(df_boletim)
 
                 observacoes_gerais = st.session_state.get("observacoes_gerais", "")
 
@@ -1887,8 +4434,17 @@ with tab_avaliar:
                         pei_resumo_texto = carregar_pei_resumo(escola, nome_crianca)
                         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 
-                        if salvar_sem_relatorio and not enviado:
-                            aluno_id = salvar_no_banco(
+                        # Avaliação já salva (editada ou salva antes nesta sessão), mesmo estudante e período: atualiza no lugar.
+                        # Os textos salvos continuam valendo se nem as respostas nem os dados usados
+                        # para redigi-los mudaram; assim a IA não é chamada de novo à toa.
+                        edit_id = avaliacao_em_edicao(escola, nome_crianca, ano_letivo, bimestre)
+                        textos_salvos = None
+                        texto_desatualizado = False
+                        if edit_id is not None:
+                            # relatório e sugestões salvos (inclusive os editados à mão) ficam como estão;
+                            # só "Gerar relatório" os substitui
+                            _, textos_anteriores, textos_valem = atualizar_avaliacao(
+                                edit_id,
                                 timestamp,
                                 escola,
                                 turno,
@@ -1901,37 +4457,18 @@ with tab_avaliar:
                                 nome_professora,
                                 neuroatipico,
                                 boletim_texto,
-                                media_geral,
-                                "",
-                                "",
                                 observacoes_gerais,
                                 df_itens,
-                                dominio_media,
-                            )
-                            st.success("Avaliação salva no banco de dados. Você poderá gerar o relatório depois na aba 'Consultas / Relatórios'.")
-                            st.session_state["resultado"] = None
-
-                        if enviado:
-                            relatorio_generico = gerar_relatorio_ia(
-                                sexo,
-                                dominio_media,
-                                media_geral,
-                                ano_escolar,
-                                boletim_texto,
-                                neuroatipico,
-                                pei_resumo_texto,
-                                observacoes_gerais,
-                            )
-                            sugestoes_auto = gerar_sugestoes_ia(
-                                dominio_media,
-                                ano_escolar,
-                                neuroatipico,
-                                boletim_texto,
-                                pei_resumo_texto,
-                                observacoes_gerais,
+                                df_boletim,
                             )
-
-                            aluno_id = salvar_no_banco(
+                            textos_salvos = textos_anteriores if textos_valem else None
+                            texto_desatualizado = textos_anteriores is not None and not textos_valem
+
+                        def gravar_avaliacao(relatorio_texto, sugestoes_texto):
+                            if edit_id is not None:
+                                gravar_textos_avaliacao(edit_id, relatorio_texto, sugestoes_texto)
+                                return edit_id
+                            novo_id = salvar_no_banco(
                                 timestamp,
                                 escola,
                                 turno,
@@ -1945,40 +4482,89 @@ with tab_avaliar:
                                 neuroatipico,
                                 boletim_texto,
                                 media_geral,
-                                relatorio_generico,
-                                sugestoes_auto,
+                                relatorio_texto,
+                                sugestoes_texto,
                                 observacoes_gerais,
                                 df_itens,
                                 dominio_media,
+                                df_boletim,
                             )
+                            marcar_em_edicao(novo_id)
+                            return novo_id
+
+                        if salvar_sem_relatorio and not enviado:
+                            if edit_id is None:
+                                # sem texto: a pré-geração redige depois
+                                gravar_avaliacao("", "")
+                            descartar_rascunho()
+                            if texto_desatualizado:
+                                st.success(
+                                    "Avaliação salva no banco de dados. O relatório salvo anteriormente foi mantido; "
+                                    "como as respostas ou os dados do estudante mudaram, use 'Gerar relatório com IA' "
+                                    "para atualizá-lo."
+                                )
+                            else:
+                                st.success(
+                                    "Avaliação salva no banco de dados. O relatório será gerado automaticamente em segundo plano "
+                                    "e ficará disponível para impressão na aba 'Consultas / Relatórios'."
+                                    if PREFETCH_ATIVO and textos_salvos is None
+                                    else "Avaliação salva no banco de dados. Você poderá gerar o relatório depois na aba 'Consultas / Relatórios'."
+                                )
+                            st.session_state["resultado"] = None
+
+                        if enviado:
+                            if textos_salvos is not None:
+                                relatorio_generico, sugestoes_auto = textos_salvos
+                                st.info("Respostas e dados do estudante sem alteração: mantido o relatório já salvo.")
+                            else:
+                                # Rascunho local instantâneo enquanto a IA redige o texto final
+                                rascunho_area = st.empty()
+                                if IA_ATIVA:
+                                    rascunho_local = gerar_relatorio_local(
+                                        sexo,
+                                        dominio_media,
+                                        media_geral,
+                                        ano_escolar,
+                                        boletim_texto,
+                                        neuroatipico,
+                                        pei_resumo_texto,
+                                        observacoes_gerais,
+                                    )
+                                    with rascunho_area.container():
+                                        st.info("Rascunho gerado localmente. A versão da IA substituirá este texto em instantes.")
+                                        st.markdown(rascunho_local)
+
+                                relatorio_generico, sugestoes_auto = gerar_textos_estudante(
+                                    sexo,
+                                    dominio_media,
+                                    media_geral,
+                                    ano_escolar,
+                                    boletim_texto,
+                                    neuroatipico,
+                                    pei_resumo_texto,
+                                    observacoes_gerais,
+                                )
+                                rascunho_area.empty()
+
+                            if textos_salvos is not None:
+                                aluno_id = edit_id
+                            else:
+                                aluno_id = gravar_avaliacao(relatorio_generico, sugestoes_auto)
+                            descartar_rascunho()
+
+                            st.session_state["resultado"] = resultado_compacto(aluno_id, df_itens)
+
+    resultado = st.session_state.get("resultado")
+    data = carregar_avaliacao(resultado["aluno_id"], versao_banco()) if resultado is not None else None
+    if resultado is not None and data is None:
+        # avaliação excluída em Consultas enquanto estava aberta aqui
+        st.session_state["resultado"] = None
 
-                            st.session_state["resultado"] = {
-                                "aluno_id": aluno_id,
-                                "escola": escola,
-                                "turno": turno,
-                                "ano_escolar": ano_escolar,
-                                "turma": turma,
-                                "ano_letivo": ano_letivo,
-                                "bimestre": bimestre,
-                                "nome_crianca": nome_crianca,
-                                "sexo": sexo,
-                                "nome_professora": nome_professora,
-                                "neuroatipico": neuroatipico,
-                                "boletim_texto": boletim_texto,
-                                "df_itens": df_itens,
-                                "dominio_media": dominio_media,
-                                "media_geral": media_geral,
-                                "relatorio": relatorio_generico,
-                                "sugestoes": sugestoes_auto,
-                                "observacoes_gerais": observacoes_gerais,
-                            }
-
-    if st.session_state.get("resultado") is not None:
-        data = st.session_state["resultado"]
-        df_itens = data["df_itens"]
-        dominio_media = data["dominio_media"]
-        media_geral = data["media_geral"]
-        observacoes_gerais = data.get("observacoes_gerais", "")
+    if data is not None:
+        df_itens, dominio_media, media_geral = escores_avaliacao(
+            data["ano_escolar"], resultado["itens"], resultado["respostas"],
+        )
+        observacoes_gerais = data["observacoes_gerais"] or ""
 
         st.success("Avaliação processada. Revise o relatório e as orientações antes de gerar o arquivo para impressão.")
 
@@ -1997,21 +4583,20 @@ with tab_avaliar:
                 st.markdown("**Média geral:** sem cálculo (muitas respostas ausentes).")
         with col_b:
             st.markdown("### Gráfico de radar (uso interno)")
-            fig = plot_radar(dominio_media)
-            st.pyplot(fig)
+            mostrar_radar(dominio_media)
 
         st.write("---")
 
         relatorio_editado = st.text_area(
             "Relatório individual do aluno (edite se desejar):",
-            value=data["relatorio"],
+            value=data["relatorio_texto"] or "",
             height=260,
             key="relatorio_editado",
         )
 
         sugestoes_editadas = st.text_area(
             "Plano de estudo complementar / orientações para a família (edite se desejar):",
-            value=data["sugestoes"],
+            value=data["sugestoes_texto"] or "",
             height=260,
             key="sugestoes_editadas",
         )
@@ -2025,14 +4610,14 @@ with tab_avaliar:
             cur.execute(
                 """
                 UPDATE alunos
-                SET relatorio_texto = ?, sugestoes_texto = ?, observacoes_gerais = ?
+                SET relatorio_texto = ?, sugestoes_texto = ?, observacoes_gerais = ?, relatorio_desatualizado = 0
                 WHERE id = ?
                 """,
                 (
                     relatorio_editado,
                     sugestoes_editadas,
                     observacoes_gerais,
-                    data["aluno_id"],
+                    data["id"],
                 ),
             )
             conn.commit()
@@ -2041,16 +4626,9 @@ with tab_avaliar:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             safe_name = data["nome_crianca"].replace(" ", "_")
 
-            img_bytes = io.BytesIO()
-            fig = plot_radar(dominio_media)
-            fig.savefig(img_bytes, format="png", bbox_inches="tight")
-            img_bytes.seek(0)
-            radar_b64 = base64.b64encode(img_bytes.getvalue()).decode("utf-8")
+            radar_tag = radar_html(dominio_media, "Radar da criança", RADAR_FORMATO, RADAR_SVG_INLINE, RADAR_MOTOR)
 
-            historico_html = montar_historico_aluno(
-                data["escola"],
-                data["nome_crianca"],
-            )
+            historico_html = carregar_historicos([data["id"]]).get(data["id"], "")
             pei_resumo_html = carregar_pei_resumo(
                 data["escola"],
                 data["nome_crianca"],
@@ -2066,16 +4644,17 @@ with tab_avaliar:
                 data["nome_crianca"],
                 data["nome_professora"],
                 data["sexo"],
-                data["boletim_texto"],
+                data["boletim_texto"] or "",
                 df_itens,
                 dominio_media,
                 media_geral,
                 relatorio_editado,
                 sugestoes_editadas,
-                radar_b64,
+                radar_tag,
                 historico_html,
                 pei_resumo_html,
                 observacoes_gerais,
+                tendencia_tag=carregar_tendencias([data["id"]]).get(data["id"], ""),
             )
 
             html_path = os.path.join(BASE_DIR, f"{safe_name}_{timestamp}.html")
@@ -2091,19 +4670,20 @@ with tab_avaliar:
                 mime="text/html",
             )
 
+    autosalvar_rascunho(forcar=forcar_rascunho)
+    bloco_rascunho()
+
 # ---------------------------------------------------------
-# ABA 2 – CONSULTAS / RELATÓRIOS CONSOLIDADOS
+# SEÇÃO 2 – CONSULTAS / RELATÓRIOS CONSOLIDADOS
 # ---------------------------------------------------------
-with tab_consulta:
+if secao == SECAO_CONSULTA:
     st.markdown("## Consultas e relatórios consolidados")
 
     if not os.path.exists(DB_PATH):
         st.info("Ainda não há banco de dados criado. Salve ao menos uma avaliação na aba 'Nova avaliação'.")
     else:
-        conn = sqlite3.connect(DB_PATH)
-        df_alunos = pd.read_sql_query("SELECT * FROM alunos", conn)
-        df_dom = pd.read_sql_query("SELECT * FROM dominios", conn)
-        conn.close()
+        versao = versao_banco()
+        df_alunos = carregar_tabelas_consulta(versao)
 
         if df_alunos.empty:
             st.info("Nenhuma avaliação registrada até o momento.")
@@ -2128,337 +4708,211 @@ with tab_consulta:
             with colf5:
                 filtro_aluno = st.selectbox("Filtrar por aluno", alunos_list)
 
-            df_filt = df_alunos.copy()
-            if filtro_escola != "(Todas)":
-                df_filt = df_filt[df_filt["escola"] == filtro_escola]
-            if filtro_turno != "(Todos)":
-                df_filt = df_filt[df_filt["turno"] == filtro_turno]
-            if filtro_prof != "(Todos)":
-                df_filt = df_filt[df_filt["nome_professora"] == filtro_prof]
-            if filtro_turma != "(Todas)":
-                df_filt = df_filt[df_filt["turma"] == filtro_turma]
-            if filtro_aluno != "(Todos)":
-                df_filt = df_filt[df_filt["nome_crianca"] == filtro_aluno]
+            filtros = (filtro_escola, filtro_turno, filtro_prof, filtro_turma, filtro_aluno)
+            df_filt = filtrar_avaliacoes(df_alunos, *filtros)
 
             st.markdown("### Avaliações encontradas")
+            if PREFETCH_ATIVO:
+                n_pendentes = contar_avaliacoes_sem_relatorio()
+                if n_pendentes:
+                    st.caption(
+                        f"{n_pendentes} avaliação(ões) salva(s) sem relatório; os textos estão sendo gerados "
+                        "em segundo plano quando a IA está livre."
+                    )
             if df_filt.empty:
                 st.info("Nenhuma avaliação encontrada para o filtro selecionado.")
             else:
-                df_filt_sorted = df_filt.sort_values("timestamp", ascending=False)
-
-                header_cols = st.columns([2, 2, 1.5, 1.5, 2, 1.2, 1, 1, 1])
-                headers = [
-                    "Data/Hora",
-                    "Aluno",
-                    "Escola",
-                    "Turma",
-                    "Professora",
-                    "Bimestre",
-                    "Reimprimir",
-                    "Editar",
-                    "Excluir",
-                ]
-                for col, h in zip(header_cols, headers):
-                    col.markdown(f"**{h}**")
-
-                for _, row in df_filt_sorted.iterrows():
-                    c1, c2, c3, c4, c5, c6, c7, c8, c9 = st.columns([2, 2, 1.5, 1.5, 2, 1.2, 1, 1, 1])
-                    c1.write(row["timestamp"])
-                    c2.write(row["nome_crianca"])
-                    c3.write(row["escola"] or "")
-                    c4.write(f"{row['ano_escolar'] or ''} / {row['turma'] or ''}")
-                    c5.write(row["nome_professora"] or "")
-                    c6.write(row["bimestre"] or "")
-
-                    reprint_key = f"reprint_{row['id']}"
-                    edit_key = f"edit_{row['id']}"
-                    del_key = f"del_{row['id']}"
-
-                    if c7.button("Reimprimir", key=reprint_key):
-                        st.session_state["reprint_id"] = row["id"]
-                        st.success("Botão de download gerado abaixo na página.")
-                        st.rerun()
+                df_filt_sorted = df_filt.sort_values("timestamp", ascending=False).reset_index(drop=True)
+
+                # Uma única grade (virtualizada no navegador) com seleção de linhas, no lugar de
+                # uma linha de colunas e três botões por avaliação
+                df_grade = pd.DataFrame({
+                    "Data/Hora": df_filt_sorted["timestamp"],
+                    "Aluno": df_filt_sorted["nome_crianca"],
+                    "Escola": df_filt_sorted["escola"].fillna(""),
+                    "Turma": df_filt_sorted["ano_escolar"].fillna("") + " / " + df_filt_sorted["turma"].fillna(""),
+                    "Professora": df_filt_sorted["nome_professora"].fillna(""),
+                    "Bimestre": df_filt_sorted["bimestre"].fillna(""),
+                })
+                # a seleção guarda posições de linha: a chave muda com os dados e o filtro, para
+                # uma seleção antiga nunca apontar para outras avaliações
+                chave_grade = f"grade_avaliacoes_{versao}_{hash(filtros)}"
+                grade = st.dataframe(
+                    df_grade,
+                    hide_index=True,
+                    on_select="rerun",
+                    selection_mode="multi-row",
+                    key=chave_grade,
+                )
+                linhas_sel = [r for r in grade.selection.rows if r < len(df_filt_sorted)]
+                ids_sel = df_filt_sorted.loc[linhas_sel, "id"].tolist()
+                n_sel = len(ids_sel)
 
-                    if c8.button("Editar", key=edit_key):
-                        st.session_state["edit_id"] = row["id"]
-                        st.session_state["edit_loaded"] = False
-                        # Força um novo rerun para a aba "Nova avaliação" já vir preenchida
+                st.caption(
+                    f"{len(df_grade)} avaliação(ões), {n_sel} selecionada(s). Selecione linhas na grade "
+                    "para reimprimir, editar ou excluir."
+                )
+                tb1, tb2, tb3 = st.columns(3)
+                if tb1.button("Reimprimir", disabled=n_sel != 1, key="btn_reimprimir"):
+                    st.session_state["reprint_id"] = ids_sel[0]
+
+                if tb2.button("Editar", disabled=n_sel != 1, key="btn_editar"):
+                    st.session_state["edit_id"] = ids_sel[0]
+                    st.session_state["edit_loaded"] = False
+                    # Força um novo rerun já na seção "Nova avaliação", com o formulário preenchido
+                    st.session_state["secao_destino"] = SECAO_AVALIAR
+                    st.rerun()
+
+                if tb3.button(f"Excluir ({n_sel})", disabled=n_sel == 0, key="btn_excluir"):
+                    st.session_state["excluir_ids"] = ids_sel
+
+                excluir_ids = st.session_state.get("excluir_ids")
+                if excluir_ids:
+                    st.warning(f"Excluir {len(excluir_ids)} avaliação(ões)? Esta ação não pode ser desfeita.")
+                    cx1, cx2 = st.columns(2)
+                    if cx1.button("Confirmar exclusão", key="btn_confirmar_exclusao"):
+                        excluir_avaliacoes(excluir_ids)
+                        st.session_state.pop("excluir_ids", None)
+                        st.session_state.pop(chave_grade, None)
+                        if st.session_state.get("reprint_id") in excluir_ids:
+                            st.session_state["reprint_id"] = None
+                        st.success("Avaliação(ões) excluída(s) com sucesso.")
                         st.rerun()
-
-                    if c9.button("Excluir", key=del_key):
-                        conn = sqlite3.connect(DB_PATH)
-                        cur = conn.cursor()
-                        cur.execute("DELETE FROM respostas WHERE aluno_id = ?", (row["id"],))
-                        cur.execute("DELETE FROM dominios WHERE aluno_id = ?", (row["id"],))
-                        cur.execute("DELETE FROM alunos WHERE id = ?", (row["id"],))
-                        conn.commit()
-                        conn.close()
-                        st.success("Avaliação excluída com sucesso.")
+                    if cx2.button("Cancelar", key="btn_cancelar_exclusao"):
+                        st.session_state.pop("excluir_ids", None)
                         st.rerun()
 
-                if st.session_state.get("reprint_id") is not None:
-                    selected_id = st.session_state["reprint_id"]
-                    conn = sqlite3.connect(DB_PATH)
-                    df_res = pd.read_sql_query(
-                        "SELECT dominio, dominio_nome, item_codigo, item_texto, resposta, observacao FROM respostas WHERE aluno_id = ?",
-                        conn,
-                        params=(selected_id,),
-                    )
-                    df_dom_aluno = pd.read_sql_query(
-                        "SELECT dominio, dominio_nome, media_dominio FROM dominios WHERE aluno_id = ?",
-                        conn,
-                        params=(selected_id,),
-                    )
-                    df_al = pd.read_sql_query(
-                        "SELECT * FROM alunos WHERE id = ?",
-                        conn,
-                        params=(selected_id,),
+                bloco_reimpressao(st.session_state.get("reprint_id"), versao)
+
+                # com linhas selecionadas na grade, exporta só a seleção
+                ids_exportar = ids_sel or df_filt_sorted["id"].tolist()
+                with st.expander("Exportar relatórios em ZIP"):
+                    st.caption(
+                        f"Gera os relatórios individuais de {len(ids_exportar)} avaliação(ões) "
+                        f"({'selecionadas na grade' if ids_sel else 'todas as listadas acima'}) em um único "
+                        "arquivo .zip (um HTML por avaliação)."
                     )
-                    conn.close()
+                    if st.button("Gerar ZIP dos relatórios", key="btn_exportar_zip"):
+                        barra = st.progress(0.0, text="Preparando relatórios...")
 
-                    if not df_al.empty and not df_res.empty and not df_dom_aluno.empty:
-                        row_aluno = df_al.iloc[0]
-                        dominio_media_aluno = df_dom_aluno.rename(
-                            columns={"dominio_nome": "dominio_nome", "media_dominio": "media_dominio"},
+                        def _progresso_zip(feitos, total):
+                            barra.progress(feitos / total, text=f"{feitos} de {total} relatório(s)")
+
+                        zip_anterior = st.session_state.get("exportacao_zip")
+                        if zip_anterior and os.path.exists(zip_anterior["caminho"]):
+                            os.remove(zip_anterior["caminho"])
+                        caminho_zip, n_ok, n_sem_dados = exportar_relatorios_zip(
+                            ids_exportar, progresso=_progresso_zip,
                         )
+                        st.session_state["exportacao_zip"] = {
+                            "caminho": caminho_zip,
+                            "n_ok": n_ok,
+                            "n_sem_dados": n_sem_dados,
+                        }
 
-                        fig_aluno = plot_radar(dominio_media_aluno)
-                        img_bytes_aluno = io.BytesIO()
-                        fig_aluno.savefig(img_bytes_aluno, format="png", bbox_inches="tight")
-                        img_bytes_aluno.seek(0)
-                        radar_b64_aluno = base64.b64encode(img_bytes_aluno.getvalue()).decode("utf-8")
+                    exportacao = st.session_state.get("exportacao_zip")
+                    if exportacao and os.path.exists(exportacao["caminho"]):
+                        msg_zip = f"{exportacao['n_ok']} relatório(s) no arquivo."
+                        if exportacao["n_sem_dados"]:
+                            msg_zip += f" {exportacao['n_sem_dados']} avaliação(ões) sem dados detalhados ficaram de fora."
+                        st.success(msg_zip)
+                        with open(exportacao["caminho"], "rb") as f_zip:
+                            st.download_button(
+                                label="Baixar relatórios (.zip)",
+                                data=f_zip,
+                                file_name=f"relatorios_{datetime.now().strftime('%Y%m%d_%H%M')}.zip",
+                                mime="application/zip",
+                            )
 
-                        historico_html = montar_historico_aluno(
-                            row_aluno["escola"],
-                            row_aluno["nome_crianca"],
+                with st.expander("Livro de relatórios da escola (um único HTML com sumário)"):
+                    escolas_livro = escolas[1:]
+                    colL1, colL2, colL3 = st.columns(3)
+                    with colL1:
+                        escola_livro = st.selectbox(
+                            "Escola do livro",
+                            escolas_livro,
+                            index=escolas_livro.index(filtro_escola) if filtro_escola in escolas_livro else 0,
+                            key="livro_escola",
                         )
-                        pei_resumo_html = carregar_pei_resumo(
-                            row_aluno["escola"],
-                            row_aluno["nome_crianca"],
+                    df_alunos_escola = df_alunos[df_alunos["escola"] == escola_livro]
+                    with colL2:
+                        turma_livro = st.selectbox(
+                            "Turma do livro",
+                            ["(Todas)"] + sorted(df_alunos_escola["turma"].dropna().unique().tolist()),
+                            key="livro_turma",
                         )
-                        obs_gerais = row_aluno.get("observacoes_gerais", "") if "observacoes_gerais" in row_aluno else ""
-
-                        html_sel = gerar_html_impressao(
-                            row_aluno["escola"],
-                            row_aluno["turno"],
-                            row_aluno["ano_escolar"],
-                            row_aluno["turma"],
-                            row_aluno["ano_letivo"],
-                            row_aluno["bimestre"],
-                            row_aluno["nome_crianca"],
-                            row_aluno["nome_professora"],
-                            row_aluno["sexo"],
-                            row_aluno["boletim_texto"] or "",
-                            df_res,
-                            dominio_media_aluno,
-                            row_aluno["media_geral"],
-                            row_aluno["relatorio_texto"] or "",
-                            row_aluno["sugestoes_texto"] or "",
-                            radar_b64_aluno,
-                            historico_html,
-                            pei_resumo_html,
-                            obs_gerais,
+                    with colL3:
+                        bimestre_livro = st.selectbox(
+                            "Bimestre do livro",
+                            ["(Todos)"] + sorted(df_alunos_escola["bimestre"].dropna().unique().tolist()),
+                            key="livro_bimestre",
                         )
 
-                        st.download_button(
-                            label="Baixar relatório da criança selecionada (.html)",
-                            data=html_sel,
-                            file_name=f"relatorio_{row_aluno['nome_crianca'].replace(' ', '_')}.html",
-                            mime="text/html",
+                    if st.button("Gerar livro da escola", key="btn_livro_escola"):
+                        barra_livro = st.progress(0.0, text="Montando o livro...")
+
+                        def _progresso_livro(feitos, total):
+                            if feitos % 25 == 0 or feitos == total:
+                                barra_livro.progress(feitos / total, text=f"{feitos} de {total} relatório(s)")
+
+                        livro_anterior = st.session_state.get("livro_gerado")
+                        if livro_anterior and os.path.exists(livro_anterior["caminho"]):
+                            os.remove(livro_anterior["caminho"])
+                        caminho_livro, n_livro = gerar_livro_relatorios(
+                            escola_livro,
+                            turma=None if turma_livro == "(Todas)" else turma_livro,
+                            bimestre=None if bimestre_livro == "(Todos)" else bimestre_livro,
+                            progresso=_progresso_livro,
                         )
-                    else:
-                        st.info("Não há dados detalhados suficientes para reimprimir essa avaliação.")
-                    # opcional: limpar para não reutilizar automaticamente
-                    # st.session_state["reprint_id"] = None
-
-                if not df_filt.empty:
-                    df_merged = df_dom.merge(
-                        df_filt[["id", "escola", "turno", "turma", "nome_professora", "nome_crianca"]],
-                        left_on="aluno_id",
-                        right_on="id",
-                        how="inner",
-                    )
+                        st.session_state["livro_gerado"] = {
+                            "caminho": caminho_livro,
+                            "n": n_livro,
+                            "escola": escola_livro,
+                        }
 
-                    if df_merged.empty:
-                        st.info("Nenhum dado detalhado para o filtro selecionado.")
-                    else:
-                        st.markdown("### Visão macro por escola, turno, turma e professora")
-
-                        colm1, colm2 = st.columns(2)
-                        with colm1:
-                            st.markdown("**Médias por escola (todas as dimensões)**")
-                            macro_escola = (
-                                df_merged.groupby("escola")["media_dominio"]
-                                .mean()
-                                .reset_index()
-                                .rename(columns={"escola": "Escola", "media_dominio": "Média global (1–5)"})
-                            )
-                            st.dataframe(macro_escola.style.format({"Média global (1–5)": "{:.2f}"}))
-
-                        with colm2:
-                            st.markdown("**Médias por turno (todas as dimensões)**")
-                            macro_turno = (
-                                df_merged.groupby("turno")["media_dominio"]
-                                .mean()
-                                .reset_index()
-                                .rename(columns={"turno": "Turno", "media_dominio": "Média global (1–5)"})
+                    livro = st.session_state.get("livro_gerado")
+                    if livro and os.path.exists(livro["caminho"]):
+                        st.success(f"Livro com {livro['n']} relatório(s) de {livro['escola']}.")
+                        with open(livro["caminho"], "rb") as f_livro:
+                            st.download_button(
+                                label="Baixar livro da escola (.html)",
+                                data=f_livro,
+                                file_name=f"livro_relatorios_{nome_arquivo_seguro(livro['escola'])}.html",
+                                mime="text/html",
                             )
-                            st.dataframe(macro_turno.style.format({"Média global (1–5)": "{:.2f}"}))
-
-                        colm3, colm4 = st.columns(2)
-                        with colm3:
-                            st.markdown("**Médias por turma (todas as dimensões)**")
-                            macro_turma = (
-                                df_merged.groupby("turma")["media_dominio"]
-                                .mean()
-                                .reset_index()
-                                .rename(columns={"turma": "Turma", "media_dominio": "Média global (1–5)"})
-                            )
-                            st.dataframe(macro_turma.style.format({"Média global (1–5)": "{:.2f}"}))
-
-                        with colm4:
-                            st.markdown("**Médias por professora (todas as dimensões)**")
-                            macro_prof = (
-                                df_merged.groupby("nome_professora")["media_dominio"]
-                                .mean()
-                                .reset_index()
-                                .rename(columns={"nome_professora": "Professora", "media_dominio": "Média global (1–5)"})
-                            )
-                            st.dataframe(macro_prof.style.format({"Média global (1–5)": "{:.2f}"}))
-
-                        st.markdown("### Relatório consolidado por dimensão (recorte atual)")
-                        dim_consol = (
-                            df_merged.groupby("dominio_nome")["media_dominio"]
-                            .mean()
-                            .reset_index()
-                            .rename(columns={"dominio_nome": "Dimensão", "media_dominio": "Média (1–5)"})
-                        )
-                        st.dataframe(dim_consol.style.format({"Média (1–5)": "{:.2f}"}))
-
-                        st.download_button(
-                            label="Baixar consolidado em CSV (dimensões - recorte atual)",
-                            data=dim_consol.to_csv(index=False, encoding="utf-8-sig"),
-                            file_name="consolidado_turma_dimensoes.csv",
-                            mime="text/csv",
-                        )
-
-                        st.write("---")
-                        st.markdown("### Relatório individualizado por professora")
-
-                        if st.button("Gerar relatório consolidado da professora"):
-                            if filtro_prof == "(Todos)":
-                                st.warning("Selecione uma professora específica no filtro para gerar o relatório individualizado.")
-                            else:
-                                df_alunos_prof = df_alunos[df_alunos["nome_professora"] == filtro_prof]
-                                if filtro_escola != "(Todas)":
-                                    df_alunos_prof = df_alunos_prof[df_alunos_prof["escola"] == filtro_escola]
-                                if filtro_turma != "(Todas)":
-                                    df_alunos_prof = df_alunos_prof[df_alunos_prof["turma"] == filtro_turma]
-
-                                if df_alunos_prof.empty:
-                                    st.info("Não há avaliações registradas para essa professora com o filtro atual.")
-                                else:
-                                    df_prof_merged = df_dom.merge(
-                                        df_alunos_prof[
-                                            ["id", "escola", "turno", "turma", "nome_professora", "nome_crianca", "ano_letivo"]
-                                        ],
-                                        left_on="aluno_id",
-                                        right_on="id",
-                                        how="inner",
-                                    )
 
-                                    if df_prof_merged.empty:
-                                        st.info("Não há dados detalhados para essa professora com o filtro atual.")
-                                    else:
-                                        n_alunos_prof = df_alunos_prof.shape[0]
-                                        media_geral_prof = df_alunos_prof["media_geral"].mean()
-
-                                        escola_prof = df_alunos_prof["escola"].iloc[0]
-                                        turno_prof = df_alunos_prof["turno"].iloc[0]
-                                        turma_prof = (
-                                            filtro_turma if filtro_turma != "(Todas)" else df_alunos_prof["turma"].iloc[0]
-                                        )
-                                        ano_letivo_prof = df_alunos_prof["ano_letivo"].iloc[0]
-
-                                        dominio_media_prof = (
-                                            df_prof_merged.groupby("dominio_nome")["media_dominio"]
-                                            .mean()
-                                            .reset_index()
-                                            .rename(columns={"dominio_nome": "Dimensão", "media_dominio": "Média (1–5)"})
-                                        )
-
-                                        colp1, colp2 = st.columns(2)
-                                        with colp1:
-                                            st.markdown("#### Médias por dimensão (turma da professora)")
-                                            st.dataframe(
-                                                dominio_media_prof.style.format({"Média (1–5)": "{:.2f}"}),
-                                            )
-
-                                        with colp2:
-                                            st.markdown("#### Gráfico de radar da turma da professora")
-                                            dominio_media_prof_plot = dominio_media_prof.rename(
-                                                columns={"Dimensão": "dominio_nome", "Média (1–5)": "media_dominio"},
-                                            )
-                                            if "dominio" not in dominio_media_prof_plot.columns:
-                                                dominio_media_prof_plot["dominio"] = ""
-                                            fig_prof = plot_radar(dominio_media_prof_plot)
-                                            st.pyplot(fig_prof)
-
-                                        dominio_media_prof_base = dominio_media_prof.rename(
-                                            columns={"Dimensão": "dominio_nome", "Média (1–5)": "media_dominio"},
-                                        )
-                                        contexto_parts_prof = [
-                                            f"Relatório individualizado da professora {filtro_prof}.",
-                                            f"Escola: {escola_prof}.",
-                                            f"Turno: {turno_prof}.",
-                                            f"Turma: {turma_prof}.",
-                                            f"Ano letivo: {ano_letivo_prof}.",
-                                            f"Número de estudantes avaliados: {n_alunos_prof}.",
-                                        ]
-                                        contexto_prof_str = " ".join(contexto_parts_prof)
-
-                                        plano_prof = gerar_plano_turma_ia(
-                                            dominio_media_prof_base,
-                                            contexto_prof_str,
-                                        )
-
-                                        plano_prof_editado = st.text_area(
-                                            "Plano de desenvolvimento global da turma (edite se desejar):",
-                                            value=plano_prof,
-                                            height=350,
-                                            key="plano_prof_texto",
-                                        )
-
-                                        img_prof_bytes = io.BytesIO()
-                                        fig_prof.savefig(img_prof_bytes, format="png", bbox_inches="tight")
-                                        img_prof_bytes.seek(0)
-                                        radar_b64 = base64.b64encode(img_prof_bytes.getvalue()).decode("utf-8")
-
-                                        html_prof = gerar_html_relatorio_professora(
-                                            nome_professora=filtro_prof,
-                                            escola=escola_prof,
-                                            turno=turno_prof,
-                                            turma=turma_prof,
-                                            ano_letivo=ano_letivo_prof,
-                                            n_alunos=n_alunos_prof,
-                                            media_geral_prof=media_geral_prof if not pd.isna(media_geral_prof) else 0.0,
-                                            dominio_media_prof=dominio_media_prof,
-                                            plano_prof=plano_prof_editado,
-                                            radar_b64=radar_b64,
-                                        )
-
-                                        safe_prof = filtro_prof.replace(" ", "_")
-                                        st.download_button(
-                                            label="Exportar relatório da professora (.html)",
-                                            data=html_prof,
-                                            file_name=f"relatorio_professora_{safe_prof}.html",
-                                            mime="text/html",
-                                        )
+                if not df_filt.empty:
+                    bloco_visao_macro(versao, filtros)
+                    bloco_cruzamentos(versao, filtros)
+                    bloco_trajetoria(versao, filtros)
+                    bloco_relatorio_professora(versao, filtros)
+
+        if not df_alunos.empty:
+            with st.expander("Qualidade dos itens do instrumento"):
+                bloco_qualidade_itens(versao)
+
+        df_uso_ia = resumo_uso_ia()
+        if not df_uso_ia.empty:
+            with st.expander("Consumo da IA (tokens e latência por tipo de texto)"):
+                st.dataframe(
+                    df_uso_ia.rename(columns={
+                        "tarefa": "Texto",
+                        "chamadas": "Chamadas",
+                        "prompt_tokens_medio": "Tokens de entrada (média)",
+                        "completion_tokens_medio": "Tokens de saída (média)",
+                        "tokens_total": "Tokens (total)",
+                        "latencia_media_s": "Latência média (s)",
+                    }).style.format({
+                        "Tokens de entrada (média)": "{:.0f}",
+                        "Tokens de saída (média)": "{:.0f}",
+                        "Latência média (s)": "{:.2f}",
+                    })
+                )
 
 # ---------------------------------------------------------
-# ABA 3 – PEI – PLANO EDUCACIONAL INDIVIDUAL
+# SEÇÃO 3 – PEI – PLANO EDUCACIONAL INDIVIDUAL
 # ---------------------------------------------------------
-with tab_pei:
+if secao == SECAO_PEI:
     st.markdown("## Plano Educacional Individualizado (PEI)")
     st.markdown(
         "Registro de informações para estudantes com necessidades educacionais específicas. "
@@ -2484,17 +4938,12 @@ with tab_pei:
     escolha_pei = None
 
     if os.path.exists(DB_PATH):
-        conn = sqlite3.connect(DB_PATH)
-        df_alunos_pei = pd.read_sql_query(
-            """
-            SELECT DISTINCT escola, nome_crianca, ano_escolar, ano_letivo, neuroatipico
-            FROM alunos
-            WHERE neuroatipico = 1
-            ORDER BY escola, nome_crianca
-            """,
-            conn,
+        termo_pei = st.text_input(
+            "Buscar aluno neuroatípico já cadastrado (nome, escola ou turma):",
+            value=st.session_state.get("nome_crianca", "") if session_has_neuro else "",
+            placeholder="Digite o início do nome e tecle Enter",
         )
-        conn.close()
+        df_alunos_pei = buscar_avaliacoes(termo_pei, somente_neuroatipicos=True, um_por_estudante=True)
 
         if df_alunos_pei is not None and not df_alunos_pei.empty:
             opcoes_pei = ["(Selecionar aluno neuroatípico cadastrado)"]
@@ -2532,6 +4981,8 @@ with tab_pei:
                 nome_pei_default = row_sel["nome_crianca"] or ""
                 ano_escolar_pei_default = row_sel["ano_escolar"] or ANOS_ESCOLARES[0]
                 ano_letivo_pei_default = row_sel["ano_letivo"] or ""
+        elif termo_pei:
+            st.caption("Nenhum aluno neuroatípico encontrado para essa busca.")
         else:
             st.caption("Ainda não há alunos neuroatípicos com avaliações registradas no banco de dados.")
 
@@ -2612,3 +5063,116 @@ with tab_pei:
                 participacao_familia,
             )
             st.success("PEI salvo com sucesso. As informações serão consideradas nos relatórios dos estudantes marcados como neuroatípicos.")
+
+
+# ---------------------------------------------------------
+# SEÇÃO 4 – LANÇAMENTO DA TURMA
+# ---------------------------------------------------------
+if secao == SECAO_TURMA:
+    st.markdown("### Lançamento da turma")
+    st.caption(
+        "Registre a escala de desenvolvimento da turma inteira em uma grade (estudantes × itens, valores de 1 a 5) "
+        "e salve tudo de uma vez. Boletim, observações e estudantes neuroatípicos (PEI) seguem pela "
+        "'Nova avaliação'; os relatórios descritivos são gerados depois, em Consultas ou pela pré-geração."
+    )
+
+    colt1, colt2 = st.columns(2)
+    with colt1:
+        escola_turma = st.text_input("Nome da escola", key="lanc_escola")
+        turno_turma = st.selectbox("Turno", ["", "Matutino", "Vespertino", "Noturno", "Integral"], key="lanc_turno")
+        ano_escolar_turma = st.selectbox("Ano escolar", ANOS_ESCOLARES, key="lanc_ano_escolar")
+        professora_turma = st.text_input("Nome da professora/professor", key="lanc_professora")
+    with colt2:
+        turma_turma = st.text_input("Turma", key="lanc_turma")
+        ano_letivo_turma = st.text_input("Ano letivo (ex.: 2025)", key="lanc_ano_letivo")
+        bimestre_turma = st.selectbox(
+            "Bimestre de avaliação",
+            ["", "1º bimestre", "2º bimestre", "3º bimestre", "4º bimestre"],
+            key="lanc_bimestre",
+        )
+    nomes_turma = nomes_lancamento_turma(
+        st.text_area("Estudantes da turma (um nome por linha)", key="lanc_estudantes", height=150)
+    )
+
+    if not ano_escolar_turma:
+        st.info("Escolha o ano escolar para montar a grade com os itens do instrumento.")
+    elif not nomes_turma:
+        st.info("Informe os estudantes da turma para montar a grade.")
+    else:
+        mapa_turma = mapa_itens_instrumento(ano_escolar_turma)
+        itens_turma = list(mapa_turma)
+        grade = grade_turma(ano_escolar_turma, nomes_turma)
+        chave_editor = f"turma_grade_editor_{grade['versao']}"
+        # O editor guarda só as alterações sobre os dados de entrada; ao voltar para a
+        # seção (editor descartado pelo Streamlit) ele recomeça do que já foi digitado
+        if grade["base"] is None or chave_editor not in st.session_state:
+            grade["base"] = (list(grade["sexos"]), grade["respostas"].copy())
+        sexos_base, respostas_base = grade["base"]
+        df_grade = pd.DataFrame(respostas_base, columns=itens_turma)
+        df_grade.insert(0, "Sexo", sexos_base)
+        df_grade.insert(0, "Estudante", nomes_turma)
+
+        config_colunas = {
+            "Estudante": st.column_config.TextColumn("Estudante", disabled=True),
+            "Sexo": st.column_config.SelectboxColumn("Sexo", options=OPCOES_SEXO),
+        }
+        for item_code, (_, dom_nome, item_text) in mapa_turma.items():
+            config_colunas[item_code] = st.column_config.NumberColumn(
+                item_code, help=f"{dom_nome}: {item_text}", min_value=1, max_value=5, step=1, format="%d",
+            )
+        st.markdown(
+            "Escala: 1 = ainda não demonstra · 2 = em início · 3 = em desenvolvimento · "
+            "4 = quase consolidado · 5 = consolidado. Passe o mouse no código do item para ver o texto."
+        )
+        df_editado = st.data_editor(
+            df_grade,
+            column_config=config_colunas,
+            hide_index=True,
+            num_rows="fixed",
+            use_container_width=True,
+            key=chave_editor,
+        )
+        grade["sexos"] = df_editado["Sexo"].fillna("").tolist()
+        grade["respostas"] = df_editado[itens_turma].to_numpy(dtype=float, na_value=np.nan)
+
+        preenchidos = int((~np.isnan(grade["respostas"])).sum())
+        st.caption(f"{preenchidos} de {grade['respostas'].size} respostas preenchidas.")
+
+        if st.button("Salvar avaliações da turma", type="primary"):
+            cabecalho = {
+                "escola": escola_turma.strip(),
+                "turno": turno_turma,
+                "turma": turma_turma.strip(),
+                "ano letivo": ano_letivo_turma.strip(),
+                "bimestre": bimestre_turma,
+                "professora/professor": professora_turma.strip(),
+            }
+            problemas = validar_lancamento_turma(cabecalho, nomes_turma, grade["respostas"], itens_turma)
+            if problemas:
+                st.error("A turma não foi salva. Corrija os pontos abaixo:\n\n" + "\n".join(f"- {p}" for p in problemas))
+            else:
+                medias_dominio, media_geral = calcular_scores_turma(ano_escolar_turma, grade["respostas"])
+                salvar_turma_no_banco(
+                    datetime.now().strftime("%Y%m%d_%H%M%S"),
+                    cabecalho["escola"],
+                    turno_turma,
+                    ano_escolar_turma,
+                    cabecalho["turma"],
+                    cabecalho["ano letivo"],
+                    bimestre_turma,
+                    cabecalho["professora/professor"],
+                    list(zip(nomes_turma, grade["sexos"])),
+                    grade["respostas"],
+                    medias_dominio,
+                    media_geral,
+                )
+                st.success(f"{len(nomes_turma)} avaliação(ões) da turma salvas.")
+                dominios_turma, _ = dominios_instrumento(ano_escolar_turma)
+                df_medias = pd.DataFrame(
+                    np.round(medias_dominio, 2), columns=[dom_nome for _, dom_nome in dominios_turma],
+                )
+                df_medias.insert(0, "Média geral", np.round(media_geral, 2))
+                df_medias.insert(0, "Estudante", nomes_turma)
+                st.dataframe(df_medias, hide_index=True, use_container_width=True)
+                # grade em branco para a próxima turma (a versão nova descarta o editor atual)
+                grade["chave"] = None
@@ -0,0 +1,148 @@
+"""
+Benchmark da memória por sessão da avaliação processada.
+
+Compara o estado antigo de st.session_state["resultado"] (cadastro, textos do
+relatório e DataFrames df_itens / dominio_media copiados em cada sessão) e do
+boletim (DataFrame) com o estado compacto atual (id da avaliação, códigos dos
+itens e respostas int8; boletim como lista de tuplas). Mede o tamanho em
+memória (profundo) e o tamanho serializado com pickle, por sessão e para
+--sessoes sessões simultâneas.
+
+Serve de guarda: termina com código 1 se o estado compacto passar de
+--limite-bytes por sessão.
+
+Uso:
+    python benchmarks/bench_estado_sessao.py --sessoes 100
+"""
+import argparse
+import pickle
+import sys
+
+import numpy as np
+import pandas as pd
+
+PARAGRAFO = (
+    "A estudante demonstra avanços importantes nas propostas do cotidiano escolar e participa das "
+    "atividades com interesse crescente. A família pode apoiar esse processo com leitura compartilhada, "
+    "conversas sobre o dia e rotinas organizadas que favorecem a autonomia e a confiança."
+)
+DIMENSOES = [
+    ("LP", "Língua Portuguesa – Leitura e escrita"),
+    ("MAT", "Matemática – Números, operações e resolução de problemas"),
+    ("CIE", "Ciências – Ambiente, corpo humano e tecnologia"),
+    ("HGE", "História e Geografia – Tempo, espaço e sociedade"),
+    ("SOC", "Socioemocional – Projeto de vida e convivência"),
+]
+DISCIPLINAS = ["Língua Portuguesa", "Matemática", "Ciências", "História", "Geografia", "Arte", "Educação Física", "Inglês"]
+
+
+def respostas_exemplo():
+    return {
+        f"{dom}2_{i}": {
+            "dominio": dom,
+            "dominio_nome": nome,
+            "item_codigo": f"{dom}2_{i}",
+            "item_texto": f"Descrição do item {i} observado em sala de aula ao longo do bimestre.",
+            "resposta": (i + len(dom)) % 5 + 1,
+        }
+        for dom, nome in DIMENSOES
+        for i in range(1, 4)
+    }
+
+
+def calcular_scores(respostas_dict):
+    """Mesma conta de app.calcular_scores."""
+    df = pd.DataFrame(respostas_dict.values())
+    df["resposta_util"] = df["resposta"].replace(0, np.nan)
+    dominio_media = (
+        df.groupby(["dominio", "dominio_nome"])["resposta_util"]
+        .mean()
+        .reset_index()
+        .rename(columns={"resposta_util": "media_dominio"})
+    )
+    return df, dominio_media, df["resposta_util"].mean()
+
+
+def estado_antigo():
+    df_itens, dominio_media, media_geral = calcular_scores(respostas_exemplo())
+    boletim = [(d, "7,5", "Conteúdo programático do bimestre") for d in DISCIPLINAS]
+    return {
+        "resultado": {
+            "aluno_id": 1234,
+            "escola": "Escola Municipal Exemplo",
+            "turno": "Manhã",
+            "ano_escolar": "3º ano EF",
+            "turma": "3A",
+            "ano_letivo": "2025",
+            "bimestre": "1º bimestre",
+            "nome_crianca": "Ana Souza",
+            "sexo": "Feminino",
+            "nome_professora": "Maria",
+            "neuroatipico": False,
+            "boletim_texto": "\n".join(f"Disciplina: {d} | Nota: {n} | Conteúdo: {c}" for d, n, c in boletim),
+            "df_itens": df_itens,
+            "dominio_media": dominio_media,
+            "media_geral": media_geral,
+            "relatorio": "\n\n".join([PARAGRAFO] * 4),
+            "sugestoes": "\n".join(f"- {PARAGRAFO}" for _ in range(5)),
+            "observacoes_gerais": PARAGRAFO,
+        },
+        "boletim_df": pd.DataFrame(boletim, columns=["Disciplina", "Nota", "Conteúdo programático"]),
+    }
+
+
+def estado_compacto():
+    df_itens, _, _ = calcular_scores(respostas_exemplo())
+    return {
+        "resultado": {
+            "aluno_id": 1234,
+            "itens": tuple(df_itens["item_codigo"].tolist()),
+            "respostas": df_itens["resposta"].to_numpy(dtype=np.int8),
+        },
+        "boletim_linhas": [(d, "7,5", "Conteúdo programático do bimestre") for d in DISCIPLINAS],
+    }
+
+
+def tamanho_profundo(obj, vistos=None):
+    """Bytes ocupados pelo objeto e tudo o que ele referencia (DataFrames pelo memory_usage do pandas)."""
+    vistos = set() if vistos is None else vistos
+    if id(obj) in vistos:
+        return 0
+    vistos.add(id(obj))
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, np.ndarray):
+        return sys.getsizeof(obj)
+    tamanho = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        tamanho += sum(tamanho_profundo(k, vistos) + tamanho_profundo(v, vistos) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set)):
+        tamanho += sum(tamanho_profundo(v, vistos) for v in obj)
+    return tamanho
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessoes", type=int, default=100)
+    parser.add_argument("--limite-bytes", type=int, default=4096, help="Máximo por sessão no estado compacto.")
+    args = parser.parse_args()
+
+    falhas = []
+    for nome, montar in (("antigo", estado_antigo), ("compacto", estado_compacto)):
+        estado = montar()
+        memoria = tamanho_profundo(estado)
+        serializado = len(pickle.dumps(estado, protocol=pickle.HIGHEST_PROTOCOL))
+        print(
+            f"{nome:9s} memória: {memoria / 1024:7.1f} KiB/sessão ({memoria * args.sessoes / 1024 / 1024:6.2f} MiB "
+            f"em {args.sessoes} sessões) | pickle: {serializado / 1024:6.1f} KiB/sessão"
+        )
+        if nome == "compacto" and memoria > args.limite_bytes:
+            falhas.append(f"estado compacto com {memoria} bytes por sessão, acima de {args.limite_bytes}")
+
+    for falha in falhas:
+        print(f"FALHA: {falha}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
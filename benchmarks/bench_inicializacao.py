@@ -0,0 +1,142 @@
+"""
+Relatório do tempo de inicialização do app (primeira página de um servidor novo).
+
+Cada rodada abre um processo Python novo com -X importtime e executa o app.py
+uma vez com o AppTest do Streamlit (como o primeiro acesso depois de subir o
+servidor) e depois uma segunda vez (acesso seguinte, módulos já carregados).
+O relatório separa:
+- importação do próprio Streamlit (acontece ao subir o servidor);
+- importações feitas durante a primeira execução do app, por pacote;
+- o restante da primeira execução (configuração, CSS, banco, desenho da página).
+
+Serve de guarda: termina com código 1 se algum módulo pesado que deveria ser
+carregado sob demanda (openai, matplotlib, pandas) já estiver carregado depois
+da primeira página.
+
+Uso:
+    python benchmarks/bench_inicializacao.py --rodadas 3
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MARCADOR = "### primeira execucao do app"
+MODULOS_SOB_DEMANDA = ("openai", "matplotlib", "pandas")
+# "import time: self [us] | cumulative | nome", com o nome recuado um espaço por nível
+LINHA_IMPORTTIME = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+
+def processo_filho():
+    """Roda dentro do processo medido; imprime um JSON com os tempos no stdout."""
+    import logging
+    import time
+
+    logging.disable(logging.WARNING)
+    inicio = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+    import streamlit.delta_generator as delta_generator
+
+    # o AppTest roda sem o Runtime do servidor e o aviso "use streamlit run" percorre
+    # inspect.stack(), o que carregaria todos os módulos sob demanda; no servidor real
+    # esse caminho não existe
+    delta_generator._use_warning_has_been_displayed = True
+    t_streamlit = time.perf_counter() - inicio
+
+    print(MARCADOR, file=sys.stderr, flush=True)
+    app = AppTest.from_file(os.path.join(RAIZ, "app.py"), default_timeout=300)
+    inicio = time.perf_counter()
+    app.run()
+    t_primeira = time.perf_counter() - inicio
+    print(MARCADOR + " (fim)", file=sys.stderr, flush=True)
+
+    inicio = time.perf_counter()
+    app.run()
+    t_segunda = time.perf_counter() - inicio
+
+    carregados = {
+        nome: nome in sys.modules and type(sys.modules[nome]).__name__ != "_LazyModule"
+        for nome in MODULOS_SOB_DEMANDA
+    }
+    print(json.dumps({
+        "streamlit": t_streamlit,
+        "primeira": t_primeira,
+        "segunda": t_segunda,
+        "carregados": carregados,
+        "erros": [str(e.value) for e in app.exception],
+    }))
+
+
+def importacoes_por_pacote(stderr):
+    """Tempo cumulativo (s) das importações de topo feitas durante a primeira execução, por pacote raiz."""
+    por_pacote = defaultdict(float)
+    dentro = False
+    for linha in stderr.splitlines():
+        if linha.startswith(MARCADOR):
+            dentro = not linha.endswith("(fim)")
+            continue
+        m = LINHA_IMPORTTIME.match(linha)
+        if dentro and m and len(m.group(3)) == 1:
+            por_pacote[m.group(4).split(".")[0]] += int(m.group(2)) / 1e6
+    return por_pacote
+
+
+def rodada():
+    with tempfile.TemporaryDirectory() as pasta_dados:
+        # banco vazio: a medição não depende dos dados locais
+        ambiente = dict(os.environ, STREAMLIT_SHARING_MODE="1", ADE_PREFETCH="0", TMPDIR=pasta_dados)
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", os.path.abspath(__file__), "--filho"],
+            capture_output=True, text=True, cwd=RAIZ, env=ambiente, check=True,
+        )
+    resultado = json.loads(proc.stdout.strip().splitlines()[-1])
+    resultado["importacoes"] = importacoes_por_pacote(proc.stderr)
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rodadas", type=int, default=3)
+    parser.add_argument("--filho", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.filho:
+        processo_filho()
+        return
+
+    rodadas = [rodada() for _ in range(args.rodadas)]
+    n = len(rodadas)
+    media = lambda chave: sum(r[chave] for r in rodadas) / n  # noqa: E731
+    importacoes = defaultdict(float)
+    for r in rodadas:
+        for pacote, t in r["importacoes"].items():
+            importacoes[pacote] += t / n
+    t_importacoes = sum(importacoes.values())
+
+    print(f"Inicialização do app.py (média de {n} processo(s) novo(s))")
+    print(f"  importação do Streamlit (servidor):   {1000 * media('streamlit'):7.0f} ms")
+    print(f"  primeira página:                      {1000 * media('primeira'):7.0f} ms")
+    print(f"    importações durante a execução:     {1000 * t_importacoes:7.0f} ms")
+    for pacote, t in sorted(importacoes.items(), key=lambda x: -x[1])[:8]:
+        print(f"      {pacote:32s}  {1000 * t:7.0f} ms")
+    print(f"    configuração, CSS, banco e página:  {1000 * (media('primeira') - t_importacoes):7.0f} ms")
+    print(f"  páginas seguintes (módulos já carregados): {1000 * media('segunda'):5.0f} ms")
+    # o AppTest tem um custo fixo por execução; a diferença é o que só a primeira página paga
+    print(f"  custo extra da primeira página:       {1000 * (media('primeira') - media('segunda')):7.0f} ms")
+
+    carregados = sorted({m for r in rodadas for m, sim in r["carregados"].items() if sim})
+    erros = sorted({e for r in rodadas for e in r["erros"]})
+    print(f"  módulos sob demanda já carregados: {', '.join(carregados) or 'nenhum'}")
+    for erro in erros:
+        print(f"FALHA: erro na execução do app: {erro}")
+    for modulo in carregados:
+        print(f"FALHA: {modulo} carregado na primeira página")
+    sys.exit(1 if carregados or erros else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Benchmark das estatísticas dos itens (psicometria.py) sobre um banco grande.
+
+Cria um banco SQLite temporário com --avaliacoes avaliações do instrumento do
+2º ao 5º ano EF (12 itens em 5 dimensões, respostas geradas a partir de um
+traço latente por estudante, com algumas em branco), e mede:
+- a leitura das respostas (mesmas consultas de app.estatisticas_itens: as
+  respostas como arrays JSON numa única linha e o ano escolar de cada avaliação);
+- a montagem da matriz avaliações × itens e a análise (médias, distribuições,
+  correlações item-total e alfas por dimensão e do instrumento).
+
+Serve de guarda: termina com código 1 se o total passar de --limite-s.
+
+Uso:
+    python benchmarks/bench_psicometria.py --avaliacoes 30000
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from psicometria import analisar_instrumento, matriz_respostas  # noqa: E402
+
+DIMENSOES = {
+    "LP": ["LP2_1", "LP2_2", "LP2_3"],
+    "MAT": ["MAT2_1", "MAT2_2", "MAT2_3"],
+    "CIE": ["CIE2_1", "CIE2_2"],
+    "HGE": ["HGE2_1", "HGE2_2"],
+    "SOC": ["SOC2_1", "SOC2_2"],
+}
+ITENS = [item for itens in DIMENSOES.values() for item in itens]
+DOMINIO_DOS_ITENS = [dom for dom, itens in DIMENSOES.items() for _ in itens]
+
+
+def criar_banco(caminho, n_avaliacoes, semente=0):
+    rng = np.random.default_rng(semente)
+    traco = rng.normal(size=(n_avaliacoes, 1))
+    respostas = np.clip(np.rint(3 + traco + 0.9 * rng.normal(size=(n_avaliacoes, len(ITENS)))), 1, 5).astype(int)
+    respostas[rng.random(respostas.shape) < 0.01] = 0  # não respondido
+
+    conn = sqlite3.connect(caminho)
+    conn.execute("CREATE TABLE alunos (id INTEGER PRIMARY KEY AUTOINCREMENT, ano_escolar TEXT)")
+    conn.execute(
+        "CREATE TABLE respostas (id INTEGER PRIMARY KEY AUTOINCREMENT, aluno_id INTEGER, dominio TEXT, "
+        "item_codigo TEXT, resposta INTEGER)"
+    )
+    anos = ["2º ano EF", "3º ano EF", "4º ano EF", "5º ano EF"]
+    conn.executemany(
+        "INSERT INTO alunos (id, ano_escolar) VALUES (?, ?)", ((i + 1, anos[i % 4]) for i in range(n_avaliacoes)),
+    )
+    conn.executemany(
+        "INSERT INTO respostas (aluno_id, dominio, item_codigo, resposta) VALUES (?, ?, ?, ?)",
+        (
+            (i + 1, dom, item, valor)
+            for i, linha in enumerate(respostas.tolist())
+            for dom, item, valor in zip(DOMINIO_DOS_ITENS, ITENS, linha)
+        ),
+    )
+    conn.execute("CREATE INDEX idx_respostas_aluno ON respostas(aluno_id)")
+    conn.commit()
+    conn.close()
+
+
+def medir(caminho):
+    inicio = time.perf_counter()
+    conn = sqlite3.connect(caminho)
+    ids_json, itens_json, valores_json = conn.execute(
+        """
+        SELECT json_group_array(aluno_id), json_group_array(item_codigo), json_group_array(COALESCE(resposta, 0))
+        FROM respostas
+        """
+    ).fetchone()
+    dict(conn.execute("SELECT id, COALESCE(ano_escolar, '') FROM alunos").fetchall())
+    conn.close()
+    avaliacoes = np.array(json.loads(ids_json), dtype=np.int64)
+    itens = np.array(json.loads(itens_json), dtype=str)
+    valores = np.array(json.loads(valores_json), dtype=float)
+    t_leitura = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    matriz, _ = matriz_respostas(avaliacoes, itens, valores, ITENS)
+    analise = analisar_instrumento(matriz, DOMINIO_DOS_ITENS)
+    t_analise = time.perf_counter() - inicio
+    return t_leitura, t_analise, analise
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--avaliacoes", type=int, default=30000)
+    parser.add_argument("--limite-s", type=float, default=1.0, help="Tempo máximo de leitura + análise.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as pasta:
+        caminho = os.path.join(pasta, "bench.db")
+        criar_banco(caminho, args.avaliacoes)
+        t_leitura, t_analise, analise = medir(caminho)
+
+    total = t_leitura + t_analise
+    print(f"{args.avaliacoes} avaliações, {args.avaliacoes * len(ITENS)} respostas")
+    print(f"  leitura:                        {1000 * t_leitura:7.0f} ms")
+    print(f"  matriz + estatísticas:          {1000 * t_analise:7.0f} ms")
+    print(f"  total:                          {1000 * total:7.0f} ms")
+    print(f"  avaliações completas: {analise['n_completas']} | alfa do instrumento: {analise['alfa']:.3f}")
+    for dominio, n_itens, _, alfa in analise["dominios"]:
+        print(f"    {dominio:4s} {n_itens} itens  alfa {alfa:.3f}")
+
+    if total > args.limite_s:
+        print(f"FALHA: {total:.2f} s acima do limite de {args.limite_s:.2f} s")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Benchmark de memória do gráfico de radar.
+
+Compara, em processos separados, o desenho antigo via pyplot (figuras nunca
+fechadas, como no app original) com radar.plot_radar (API orientada a
+objetos + fechar_figura). A memória residente (RSS) deve ficar estável no
+modo atual mesmo após milhares de renderizações.
+
+Uso:
+    python benchmarks/bench_radar_memoria.py --renders 2000
+"""
+import argparse
+import io
+import os
+import subprocess
+import sys
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mb():
+    """Memória residente atual do processo (Linux: /proc; demais: pico via resource)."""
+    try:
+        with open("/proc/self/status") as f:
+            for linha in f:
+                if linha.startswith("VmRSS:"):
+                    return int(linha.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def dominio_media_exemplo():
+    import pandas as pd
+    return pd.DataFrame({
+        "dominio": ["LP", "MAT", "CIE", "HGE", "SOC"],
+        "dominio_nome": [
+            "Língua Portuguesa – Leitura e escrita",
+            "Matemática – Números, operações e resolução de problemas",
+            "Ciências – Ambiente, corpo humano e tecnologia",
+            "História e Geografia – Tempo, espaço e sociedade",
+            "Socioemocional – Projeto de vida e convivência",
+        ],
+        "media_dominio": [3.4, 2.8, 4.1, 3.0, 4.6],
+    })
+
+
+def renderizar_legado(dominio_media):
+    """Cópia do plot_radar original (pyplot, sem plt.close)."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    labels = dominio_media["dominio_nome"].tolist()
+    valores = dominio_media["media_dominio"].tolist()
+    angles = np.linspace(0, 2 * np.pi, len(labels), endpoint=False).tolist()
+    valores += valores[:1]
+    angles += angles[:1]
+    fig, ax = plt.subplots(figsize=(6, 6), subplot_kw=dict(polar=True))
+    ax.plot(angles, valores, linewidth=2, linestyle="solid")
+    ax.fill(angles, valores, alpha=0.25)
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(labels, fontsize=9)
+    ax.set_yticks([1, 2, 3, 4, 5])
+    ax.set_yticklabels(["1", "2", "3", "4", "5"], fontsize=8)
+    ax.set_ylim(1, 5)
+    ax.set_title("Perfil por dimensão (escala interna 1–5)", fontsize=12, pad=20)
+    buf = io.BytesIO()
+    fig.savefig(buf, format="png", bbox_inches="tight")
+    return buf.getvalue()
+
+
+def renderizar_atual(dominio_media):
+    sys.path.insert(0, RAIZ)
+    from radar import radar_png_bytes
+    return radar_png_bytes(dominio_media)
+
+
+def executar(modo, renders, pontos):
+    render = renderizar_legado if modo == "legado" else renderizar_atual
+    dominio_media = dominio_media_exemplo()
+    render(dominio_media)  # aquecimento (imports, fontes)
+    base = rss_mb()
+    inicio = time.perf_counter()
+    passo = max(1, renders // pontos)
+    for i in range(1, renders + 1):
+        render(dominio_media)
+        if i % passo == 0:
+            print(f"{modo};{i};{rss_mb() - base:.1f}", flush=True)
+    duracao = time.perf_counter() - inicio
+    print(f"{modo};fim;{rss_mb() - base:.1f};{1000 * duracao / renders:.2f}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--renders", type=int, default=2000)
+    parser.add_argument("--pontos", type=int, default=10, help="Quantidade de medições intermediárias.")
+    parser.add_argument("--modo", choices=["legado", "atual"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.modo:
+        executar(args.modo, args.renders, args.pontos)
+        return
+
+    resultados = {}
+    for modo in ("legado", "atual"):
+        saida = subprocess.run(
+            [sys.executable, __file__, "--modo", modo, "--renders", str(args.renders), "--pontos", str(args.pontos)],
+            capture_output=True, text=True, check=True,
+        ).stdout
+        linhas = [l.split(";") for l in saida.strip().splitlines()]
+        curva = [(int(l[1]), float(l[2])) for l in linhas if l[1] != "fim"]
+        fim = [l for l in linhas if l[1] == "fim"][0]
+        resultados[modo] = (curva, float(fim[2]), float(fim[3]))
+
+    print(f"{'renders':>8} | {'legado (MB)':>12} | {'atual (MB)':>11}")
+    for (n, leg), (_, atu) in zip(resultados["legado"][0], resultados["atual"][0]):
+        print(f"{n:>8} | {leg:>12.1f} | {atu:>11.1f}")
+    for modo, (_, delta, ms) in resultados.items():
+        print(f"{modo}: crescimento de RSS {delta:.1f} MB após {args.renders} renders; {ms:.2f} ms/render")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Micro-benchmark da montagem do relatório individual em HTML.
+
+Compara a montagem antiga (f-string com CSS a cada chamada, DataFrame.to_html
+e textwrap.fill em cada linha) com os templates compilados de
+relatorios_html. O radar fica de fora (é o mesmo SVG nos dois casos) para
+medir só a montagem do documento.
+
+Serve de guarda: termina com código 1 se o tempo por relatório passar de
+--limite-ms ou se o ganho sobre o modo antigo ficar abaixo de --ganho-minimo.
+
+Uso:
+    python benchmarks/bench_relatorios_html.py --relatorios 2000
+"""
+import argparse
+import os
+import sys
+import textwrap
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import pandas as pd  # noqa: E402
+
+from relatorios_html import compilar_templates  # noqa: E402
+
+PRIMARY_BLUE = "#49708a"
+DARK_GRAY = "#333333"
+LIKERT_LABELS = {
+    1: "Ainda não demonstra",
+    2: "Demonstra com muito apoio",
+    3: "Em desenvolvimento",
+    4: "Quase consolidado",
+    5: "Consolidado",
+}
+PARAGRAFO = (
+    "A estudante demonstra avanços importantes nas propostas do cotidiano escolar e participa das "
+    "atividades com interesse crescente. A família pode apoiar esse processo com leitura compartilhada, "
+    "conversas sobre o dia e rotinas organizadas que favorecem a autonomia e a confiança."
+)
+
+
+def dados_exemplo():
+    dimensoes = [
+        "Língua Portuguesa – Leitura e escrita",
+        "Matemática – Números, operações e resolução de problemas",
+        "Ciências – Ambiente, corpo humano e tecnologia",
+        "História e Geografia – Tempo, espaço e sociedade",
+        "Socioemocional – Projeto de vida e convivência",
+    ]
+    df_itens = pd.DataFrame({
+        "dominio_nome": [d for d in dimensoes for _ in range(4)],
+        "item_texto": [f"Descrição do item {i} observado em sala de aula ao longo do bimestre." for i in range(20)],
+        "resposta": [(i % 5) + 1 for i in range(20)],
+    })
+    boletim = [(d, "7,5", "Conteúdo programático do bimestre") for d in ("Português", "Matemática", "Ciências")]
+    relatorio = "\n\n".join([PARAGRAFO] * 4)
+    sugestoes = "\n".join(f"- {PARAGRAFO}" for _ in range(5))
+    return df_itens, boletim, relatorio, sugestoes
+
+
+def resp_str(v):
+    try:
+        v = int(v)
+    except Exception:
+        return ""
+    if v in LIKERT_LABELS:
+        return LIKERT_LABELS[v]
+    if v == 0:
+        return "Não respondido"
+    return ""
+
+
+def montar_legado(df_itens, boletim, relatorio, sugestoes):
+    """Cópia resumida do gerar_html_impressao original."""
+    df_tmp = df_itens[["dominio_nome", "item_texto", "resposta"]].copy()
+    df_tmp["Escala descritiva"] = df_tmp["resposta"].apply(resp_str)
+    tabela_html = df_tmp[["dominio_nome", "item_texto", "Escala descritiva"]].rename(columns={
+        "dominio_nome": "Dimensão",
+        "item_texto": "Descrição",
+    }).to_html(index=False, border=0, justify="left")
+    relatorio_html = "<br>".join(textwrap.fill(l, 100) for l in relatorio.split("\n"))
+    sugestoes_html = "<br>".join(textwrap.fill(l, 100) for l in sugestoes.split("\n"))
+    rows_html = [f"<tr><td>{d}</td><td>{n}</td><td>{c}</td></tr>" for d, n, c in boletim]
+    boletim_block = (
+        "<table><thead><tr><th>Disciplina</th><th>Nota</th><th>Conteúdo programático</th></tr></thead>"
+        "<tbody>" + "\n".join(rows_html) + "</tbody></table>"
+    )
+    return f"""
+    <html>
+    <head>
+        <meta charset="utf-8">
+        <title>Relatório - Ana</title>
+        <style>
+            body {{ font-family: Arial, sans-serif; margin: 20px; color: {DARK_GRAY}; }}
+            h1, h2, h3 {{ color: {PRIMARY_BLUE}; }}
+            table {{ border-collapse: collapse; width: 100%; margin-bottom: 20px; }}
+            th, td {{ border: 1px solid #ccc; padding: 6px; font-size: 12px; text-align: left; }}
+            .radar {{ max-width: 100%; height: auto; }}
+            .logo {{ position: absolute; top: 20px; right: 20px; height: 80px; }}
+        </style>
+    </head>
+    <body>
+        <h1>Relatório de desenvolvimento</h1>
+        <p><b>Escola:</b> Escola A</p>
+        {boletim_block}
+        <h3>Respostas por item (escala descritiva)</h3>
+        {tabela_html}
+        <h2>Relatório individual</h2>
+        <p>{relatorio_html}</p>
+        <h2>Plano de estudo complementar / orientações para a família</h2>
+        <p>{sugestoes_html}</p>
+    </body>
+    </html>
+    """
+
+
+def montar_atual(df_itens, boletim, relatorio, sugestoes):
+    linhas_itens = [
+        (d, t, resp_str(r))
+        for d, t, r in zip(
+            df_itens["dominio_nome"].tolist(), df_itens["item_texto"].tolist(), df_itens["resposta"].tolist()
+        )
+    ]
+    return compilar_templates(PRIMARY_BLUE, DARK_GRAY).relatorio_aluno(
+        escola="Escola A", turno="Manhã", ano_escolar="3º ano EF", turma="3A", ano_letivo="2025",
+        bimestre="1º bimestre", crianca="Ana", professora="Maria", sexo="Feminino",
+        linhas_itens=linhas_itens, linhas_boletim=boletim, relatorio=relatorio, sugestoes=sugestoes,
+        radar_tag="",
+    )
+
+
+def medir(montar, n, dados):
+    montar(*dados)  # aquecimento
+    inicio = time.perf_counter()
+    for _ in range(n):
+        montar(*dados)
+    return 1000 * (time.perf_counter() - inicio) / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--relatorios", type=int, default=2000)
+    parser.add_argument("--limite-ms", type=float, default=1.0, help="Tempo máximo por relatório no modo atual.")
+    parser.add_argument("--ganho-minimo", type=float, default=3.0, help="Quantas vezes mais rápido que o legado.")
+    args = parser.parse_args()
+
+    dados = dados_exemplo()
+    ms_legado = medir(montar_legado, args.relatorios, dados)
+    ms_atual = medir(montar_atual, args.relatorios, dados)
+    ganho = ms_legado / ms_atual
+
+    print(f"legado: {ms_legado:.3f} ms/relatório")
+    print(f"atual:  {ms_atual:.3f} ms/relatório ({ganho:.1f}x mais rápido)")
+
+    falhas = []
+    if ms_atual > args.limite_ms:
+        falhas.append(f"tempo por relatório {ms_atual:.3f} ms acima do limite de {args.limite_ms} ms")
+    if ganho < args.ganho_minimo:
+        falhas.append(f"ganho de {ganho:.1f}x abaixo do mínimo de {args.ganho_minimo}x")
+    for falha in falhas:
+        print(f"FALHA: {falha}")
+    sys.exit(1 if falhas else 0)
+
+
+if __name__ == "__main__":
+    main()
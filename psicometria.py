@@ -0,0 +1,105 @@
+"""
+Estatísticas dos itens do instrumento, calculadas em lote sobre as respostas
+gravadas (tabela respostas), para a coordenação localizar itens fracos.
+
+Tudo é feito sobre matrizes NumPy avaliações × itens (NaN = sem resposta):
+- média, desvio-padrão e distribuição das respostas 1–5 de cada item;
+- correlação item-total corrigida (item contra a soma dos demais itens), dentro
+  da dimensão e no instrumento inteiro;
+- alfa de Cronbach por dimensão e do instrumento.
+Correlações e alfas usam só as avaliações com todos os itens respondidos
+(do bloco considerado), como é usual para o alfa.
+"""
+import numpy as np
+
+ESCALA = (1, 2, 3, 4, 5)
+
+
+def matriz_respostas(avaliacoes, itens, valores, ordem_itens):
+    """
+    Converte respostas em formato longo (uma por avaliação e item) na matriz
+    avaliações × itens, com as colunas na ordem de ordem_itens. Valores fora
+    de 1–5 (0 = não respondido) e itens que não estão em ordem_itens ficam de fora.
+    Retorna (matriz float com NaN, ids das avaliações nas linhas).
+    """
+    avaliacoes = np.asarray(avaliacoes)
+    valores = np.asarray(valores, dtype=float)
+    ids, linha = np.unique(avaliacoes, return_inverse=True)
+    codigos, codigo_idx = np.unique(np.asarray(itens, dtype=str), return_inverse=True)
+    posicao = {codigo: j for j, codigo in enumerate(ordem_itens)}
+    coluna_do_codigo = np.array([posicao.get(codigo, -1) for codigo in codigos], dtype=int)
+    coluna = coluna_do_codigo[codigo_idx] if len(codigos) else np.zeros(0, dtype=int)
+
+    validos = (coluna >= 0) & (valores >= 1) & (valores <= 5)
+    matriz = np.full((len(ids), len(ordem_itens)), np.nan)
+    matriz[linha[validos], coluna[validos]] = valores[validos]
+    return matriz, ids
+
+
+def alfa_cronbach(matriz):
+    """Alfa de Cronbach das linhas completas; NaN com menos de 2 itens, 2 linhas ou variância total nula."""
+    completas = matriz[~np.isnan(matriz).any(axis=1)]
+    n, k = completas.shape
+    if k < 2 or n < 2:
+        return float("nan")
+    variancia_total = completas.sum(axis=1).var(ddof=1)
+    if variancia_total == 0:
+        return float("nan")
+    return float(k / (k - 1) * (1 - completas.var(axis=0, ddof=1).sum() / variancia_total))
+
+
+def correlacao_item_total(matriz):
+    """Correlação de cada coluna com a soma das demais (linhas completas); NaN sem variação."""
+    completas = matriz[~np.isnan(matriz).any(axis=1)]
+    k = completas.shape[1]
+    if k < 2 or completas.shape[0] < 2:
+        return np.full(k, np.nan)
+    resto = completas.sum(axis=1, keepdims=True) - completas
+    itens_c = completas - completas.mean(axis=0)
+    resto_c = resto - resto.mean(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (itens_c * resto_c).sum(axis=0) / np.sqrt((itens_c ** 2).sum(axis=0) * (resto_c ** 2).sum(axis=0))
+
+
+def analisar_instrumento(matriz, dominio_dos_itens):
+    """
+    matriz: avaliações × itens (NaN = sem resposta);
+    dominio_dos_itens: dimensão de cada coluna.
+    Retorna {"itens": arrays por item (n, media, desvio, distribuicao,
+    correlacao_dominio, correlacao_instrumento), "dominios": [(dimensão,
+    n_itens, n_completas, alfa)], "alfa": alfa do instrumento, "n_avaliacoes",
+    "n_completas"}.
+    """
+    dominio_dos_itens = np.asarray(dominio_dos_itens)
+    respondidas = ~np.isnan(matriz)
+    n = respondidas.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.nansum(matriz, axis=0) / n
+        # com n = 0 a divisão por n - 1 daria -0.0 em vez de "sem dado"
+        desvio = np.where(n > 1, np.sqrt(np.nansum((matriz - media) ** 2, axis=0) / (n - 1)), np.nan)
+        # proporção de cada valor da escala por item (itens × 5)
+        distribuicao = np.stack([(matriz == v).sum(axis=0) for v in ESCALA], axis=1) / n[:, None]
+
+    correlacao_dominio = np.full(matriz.shape[1], np.nan)
+    dominios = []
+    for dominio in dict.fromkeys(dominio_dos_itens.tolist()):
+        colunas = np.flatnonzero(dominio_dos_itens == dominio)
+        bloco = matriz[:, colunas]
+        correlacao_dominio[colunas] = correlacao_item_total(bloco)
+        n_completas = int((~np.isnan(bloco).any(axis=1)).sum())
+        dominios.append((dominio, len(colunas), n_completas, alfa_cronbach(bloco)))
+
+    return {
+        "itens": {
+            "n": n,
+            "media": media,
+            "desvio": desvio,
+            "distribuicao": distribuicao,
+            "correlacao_dominio": correlacao_dominio,
+            "correlacao_instrumento": correlacao_item_total(matriz),
+        },
+        "dominios": dominios,
+        "alfa": alfa_cronbach(matriz),
+        "n_avaliacoes": matriz.shape[0],
+        "n_completas": int(respondidas.all(axis=1).sum()),
+    }
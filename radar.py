@@ -0,0 +1,271 @@
+"""
+Gráfico de radar do perfil por dimensão (escala interna 1–5).
+
+Dois motores de desenho:
+- "nativo": SVG gerado diretamente com NumPy, sem importar o matplotlib
+  (padrão; é o único gráfico da plataforma e o matplotlib pesa no cold start);
+- "matplotlib": API orientada a objetos (Figure + canvas Agg), sem pyplot, para
+  que as figuras não fiquem registradas no gerenciador global de figuras.
+  O matplotlib só é importado quando este motor (ou o PNG) é usado.
+"""
+import base64
+import io
+import re
+from html import escape
+
+import numpy as np
+
+MOTORES = ("nativo", "matplotlib")
+
+TITULO_RADAR = "Perfil por dimensão (escala interna 1–5)"
+TEXTO_SEM_DADOS = "Sem dados suficientes\npara o gráfico de radar."
+
+# Medidas do radar nativo, em pontos, equivalentes à figura 6x6 pol. do matplotlib
+_CENTRO = 216.0
+_RAIO = 165.0
+_COR = "#1f77b4"        # cor padrão das séries do matplotlib (C0)
+_COR_GRADE = "#b0b0b0"
+_FONTE = "DejaVu Sans, Arial, sans-serif"
+_ANGULO_ROTULOS_ESCALA = np.deg2rad(22.5)  # mesma posição padrão do matplotlib
+
+
+# ---------------------------------------------------------
+# Motor matplotlib (importação tardia)
+# ---------------------------------------------------------
+def _nova_figura(figsize, polar=False):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(projection="polar" if polar else None)
+    return fig, ax
+
+
+def plot_radar(dominio_media):
+    dominio_media = dominio_media.dropna(subset=["media_dominio"])
+    if dominio_media.empty:
+        fig, ax = _nova_figura((5, 3))
+        ax.axis("off")
+        ax.text(0.5, 0.5, TEXTO_SEM_DADOS, ha="center", va="center")
+        return fig
+
+    labels = dominio_media["dominio_nome"].tolist()
+    valores = dominio_media["media_dominio"].tolist()
+
+    num_vars = len(labels)
+    angles = np.linspace(0, 2 * np.pi, num_vars, endpoint=False).tolist()
+    valores += valores[:1]
+    angles += angles[:1]
+
+    fig, ax = _nova_figura((6, 6), polar=True)
+    ax.plot(angles, valores, linewidth=2, linestyle="solid")
+    ax.fill(angles, valores, alpha=0.25)
+
+    ax.set_xticks(angles[:-1])
+    ax.set_xticklabels(labels, fontsize=9)
+    ax.set_yticks([1, 2, 3, 4, 5])
+    ax.set_yticklabels(["1", "2", "3", "4", "5"], fontsize=8)
+    ax.set_ylim(1, 5)
+    ax.set_title(TITULO_RADAR, fontsize=12, pad=20)
+    return fig
+
+
+def fechar_figura(fig):
+    """Libera imediatamente os eixos e artistas da figura."""
+    fig.clear()
+
+
+def radar_png_bytes(dominio_media):
+    fig = plot_radar(dominio_media)
+    buf = io.BytesIO()
+    try:
+        fig.savefig(buf, format="png", bbox_inches="tight")
+    finally:
+        fechar_figura(fig)
+    return buf.getvalue()
+
+
+def radar_png_base64(dominio_media):
+    return base64.b64encode(radar_png_bytes(dominio_media)).decode("utf-8")
+
+
+def _arredondar_numeros(tag, casas=2):
+    return re.sub(r"-?\d+\.\d{%d,}" % (casas + 1), lambda m: f"{float(m.group(0)):.{casas}f}", tag)
+
+
+def _compactar_tag(tag):
+    # espaços repetidos só dentro das tags: o texto entre elas fica como está
+    return _arredondar_numeros(re.sub(r"\s{2,}", " ", tag))
+
+
+def minificar_svg(svg):
+    """Remove cabeçalhos, metadados e espaços do SVG do matplotlib e arredonda coordenadas."""
+    svg = re.sub(r"<\?xml[^>]*\?>|<!DOCTYPE[^>]*>|<!--.*?-->", "", svg, flags=re.S)
+    svg = re.sub(r"<metadata>.*?</metadata>", "", svg, flags=re.S)
+    svg = re.sub(r">\s+<", "><", svg)
+    svg = re.sub(r"<[^>]+>", lambda m: _compactar_tag(m.group(0)), svg)
+    # ids só são necessários quando referenciados (clip-path, xlink:href); os demais
+    # aumentam o arquivo e se repetiriam com vários SVGs no mesmo documento
+    referenciados = set(re.findall(r"#([\w.-]+)", svg))
+    svg = re.sub(
+        r' id="([^"]+)"',
+        lambda m: m.group(0) if m.group(1) in referenciados else "",
+        svg,
+    )
+    return svg.strip()
+
+
+def _radar_svg_matplotlib(dominio_media):
+    import matplotlib
+
+    fig = plot_radar(dominio_media)
+    buf = io.StringIO()
+    try:
+        with matplotlib.rc_context({"svg.fonttype": "none"}):
+            fig.savefig(buf, format="svg", bbox_inches="tight", metadata={"Date": None})
+    finally:
+        fechar_figura(fig)
+    return buf.getvalue()
+
+
+# ---------------------------------------------------------
+# Motor nativo (NumPy → SVG)
+# ---------------------------------------------------------
+def _largura_texto(texto, tamanho):
+    """Largura aproximada do texto (sem medir fontes), suficiente para o enquadramento."""
+    return 0.55 * tamanho * len(texto)
+
+
+def _pontos(xs, ys):
+    return " ".join(f"{x:.2f},{y:.2f}" for x, y in zip(xs, ys))
+
+
+def _svg(largura, altura, x0, y0, corpo):
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{largura:.2f}pt" height="{altura:.2f}pt" '
+        f'viewBox="{x0:.2f} {y0:.2f} {largura:.2f} {altura:.2f}" font-family="{_FONTE}">'
+        f'<rect x="{x0:.2f}" y="{y0:.2f}" width="{largura:.2f}" height="{altura:.2f}" fill="#ffffff"/>'
+        f"{corpo}</svg>"
+    )
+
+
+def _svg_sem_dados():
+    linhas = TEXTO_SEM_DADOS.split("\n")
+    corpo = "".join(
+        f'<text x="180" y="{108 + 14 * (i - (len(linhas) - 1) / 2):.2f}" font-size="10" '
+        f'text-anchor="middle" dominant-baseline="middle">{escape(l)}</text>'
+        for i, l in enumerate(linhas)
+    )
+    return _svg(360, 216, 0, 0, corpo)
+
+
+def radar_svg_nativo(dominio_media):
+    """Radar em SVG com o mesmo layout do plot_radar, calculado só com NumPy."""
+    # filtro dos NaN direto no NumPy: o dropna do pandas custava mais que o desenho inteiro
+    valores = dominio_media["media_dominio"].to_numpy(dtype=float)
+    validos = ~np.isnan(valores)
+    if not validos.any():
+        return _svg_sem_dados()
+
+    labels = [str(l) for l, ok in zip(dominio_media["dominio_nome"].tolist(), validos) if ok]
+    valores = np.clip(valores[validos], 1, 5)
+
+    # ângulo 0 à direita, sentido anti-horário (padrão polar do matplotlib); r=1 no centro
+    angulos = np.linspace(0, 2 * np.pi, len(labels), endpoint=False)
+    cos, sin = np.cos(angulos), np.sin(angulos)
+    raio = (valores - 1) / 4 * _RAIO
+    xs, ys = _CENTRO + raio * cos, _CENTRO - raio * sin
+
+    partes = []
+    # grade: círculos em 2, 3 e 4, moldura em 5 e raios de cada dimensão
+    for nivel in (2, 3, 4):
+        partes.append(
+            f'<circle cx="{_CENTRO}" cy="{_CENTRO}" r="{(nivel - 1) / 4 * _RAIO:.2f}" '
+            f'fill="none" stroke="{_COR_GRADE}" stroke-width="0.8"/>'
+        )
+    partes.append(
+        f'<path d="M{_CENTRO} {_CENTRO}'
+        + "".join(f"L{_CENTRO + _RAIO * c:.2f} {_CENTRO - _RAIO * s:.2f}M{_CENTRO} {_CENTRO}" for c, s in zip(cos, sin))
+        + f'" stroke="{_COR_GRADE}" stroke-width="0.8"/>'
+    )
+    partes.append(
+        f'<circle cx="{_CENTRO}" cy="{_CENTRO}" r="{_RAIO}" fill="none" stroke="#000000" stroke-width="0.8"/>'
+    )
+
+    # série
+    partes.append(f'<polygon points="{_pontos(xs, ys)}" fill="{_COR}" fill-opacity="0.25" stroke="none"/>')
+    partes.append(
+        f'<polygon points="{_pontos(xs, ys)}" fill="none" stroke="{_COR}" stroke-width="2" '
+        'stroke-linejoin="round"/>'
+    )
+
+    # rótulos da escala no ângulo padrão de 22,5° (o "1" fica no centro e, como no matplotlib, não é escrito)
+    for nivel in range(2, 6):
+        r = (nivel - 1) / 4 * _RAIO
+        partes.append(
+            f'<text x="{_CENTRO + r * np.cos(_ANGULO_ROTULOS_ESCALA):.2f}" '
+            f'y="{_CENTRO - r * np.sin(_ANGULO_ROTULOS_ESCALA):.2f}" font-size="8" '
+            f'text-anchor="middle" dominant-baseline="middle">{nivel}</text>'
+        )
+
+    # rótulos das dimensões, ancorados conforme o lado do círculo
+    x_min, x_max = _CENTRO - _RAIO, _CENTRO + _RAIO
+    y_min, y_max = _CENTRO - _RAIO, _CENTRO + _RAIO
+    r_rotulo = _RAIO + 12
+    for label, c, s in zip(labels, cos, sin):
+        x, y = _CENTRO + r_rotulo * c, _CENTRO - r_rotulo * s
+        largura = _largura_texto(label, 9)
+        if c > 0.1:
+            ancora, x_ini = "start", x
+        elif c < -0.1:
+            ancora, x_ini = "end", x - largura
+        else:
+            ancora, x_ini = "middle", x - largura / 2
+        x_min, x_max = min(x_min, x_ini), max(x_max, x_ini + largura)
+        y_min, y_max = min(y_min, y - 6), max(y_max, y + 6)
+        partes.append(
+            f'<text x="{x:.2f}" y="{y:.2f}" font-size="9" text-anchor="{ancora}" '
+            f'dominant-baseline="middle">{escape(label)}</text>'
+        )
+
+    # título acima de tudo, como o pad=20 do matplotlib
+    y_titulo = y_min - 14
+    largura_titulo = _largura_texto(TITULO_RADAR, 12)
+    x_min = min(x_min, _CENTRO - largura_titulo / 2)
+    x_max = max(x_max, _CENTRO + largura_titulo / 2)
+    partes.append(
+        f'<text x="{_CENTRO}" y="{y_titulo:.2f}" font-size="12" text-anchor="middle">{escape(TITULO_RADAR)}</text>'
+    )
+    y_min = y_titulo - 14
+
+    margem = 4
+    x0, y0 = x_min - margem, y_min - margem
+    return _svg(x_max - x0 + margem, y_max - y0 + margem, x0, y0, "".join(partes))
+
+
+# ---------------------------------------------------------
+# Saídas
+# ---------------------------------------------------------
+def radar_svg(dominio_media, minificar=True, motor="nativo"):
+    """Radar em SVG vetorial (texto como texto, nítido na impressão e bem menor que o PNG)."""
+    if motor != "matplotlib":
+        return radar_svg_nativo(dominio_media)
+    svg = _radar_svg_matplotlib(dominio_media)
+    return minificar_svg(svg) if minificar else svg
+
+
+def radar_html(dominio_media, alt, formato="svg", inline=True, motor="nativo"):
+    """
+    Tag pronta para embutir o radar nos relatórios HTML.
+    formato "svg" (padrão) ou "png"; com inline=True o SVG entra direto no documento,
+    senão vai como <img> com data URI. O PNG sempre usa o matplotlib.
+    """
+    if formato == "png":
+        return f'<img src="data:image/png;base64,{radar_png_base64(dominio_media)}" alt="{alt}" />'
+    svg = radar_svg(dominio_media, motor=motor)
+    if inline:
+        svg = svg.replace("<svg ", f'<svg role="img" aria-label="{alt}" class="radar" ', 1)
+        return svg
+    svg_b64 = base64.b64encode(svg.encode("utf-8")).decode("utf-8")
+    return f'<img src="data:image/svg+xml;base64,{svg_b64}" alt="{alt}" />'
@@ -0,0 +1,289 @@
+"""
+Templates dos relatórios HTML (individual, consolidado da professora e livro
+de relatórios da escola).
+
+Os documentos são montados com string.Template e compilados uma única vez
+(CSS e cores já substituídos, ver compilar_templates); a cada relatório só
+entram os campos variáveis. As tabelas são escritas direto em HTML, com
+escape, sem passar pelo DataFrame.to_html do pandas.
+"""
+from functools import lru_cache
+from html import escape
+from string import Template
+
+CSS_RELATORIO = Template("""
+body { font-family: Arial, sans-serif; margin: 20px; color: $cor_texto; }
+h1, h2, h3 { color: $cor_titulo; }
+table { border-collapse: collapse; width: 100%; margin-bottom: 20px; }
+th, td { border: 1px solid #ccc; padding: 6px; font-size: 12px; text-align: left; }
+.radar { max-width: 100%; height: auto; }
+.logo { position: absolute; top: 20px; right: 20px; height: 80px; }
+""")
+
+DOCUMENTO = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$titulo</title>
+<style>$css</style>
+</head>
+<body>
+$corpo
+</body>
+</html>
+"""
+
+CORPO_ALUNO = """$logo_tag
+<h1>Relatório de desenvolvimento</h1>
+
+<h2>Dados do estudante</h2>
+<p><b>Escola:</b> $escola</p>
+<p><b>Turno:</b> $turno</p>
+<p><b>Ano escolar:</b> $ano_escolar</p>
+<p><b>Turma:</b> $turma</p>
+<p><b>Ano letivo:</b> $ano_letivo</p>
+<p><b>Bimestre:</b> $bimestre</p>
+<p><b>Nome do estudante:</b> $crianca</p>
+<p><b>Sexo:</b> $sexo</p>
+<p><b>Professora responsável:</b> $professora</p>
+
+$pei_block
+$boletim_block
+
+<h3>Perfil por dimensão (uso interno da escola)</h3>
+$radar_tag
+$tendencia_block
+$historico_block
+
+<h3>Respostas por item (escala descritiva)</h3>
+$tabela_itens
+
+<h2>Relatório individual</h2>
+<p>$relatorio</p>
+
+$observacoes_block
+
+<h2>Plano de estudo complementar / orientações para a família</h2>
+<p>$sugestoes</p>
+"""
+
+CORPO_PROFESSORA = """$logo_tag
+<h1>Relatório consolidado da turma</h1>
+
+<h2>Dados gerais</h2>
+<p><b>Escola:</b> $escola</p>
+<p><b>Turno:</b> $turno</p>
+<p><b>Turma:</b> $turma</p>
+<p><b>Ano letivo:</b> $ano_letivo</p>
+<p><b>Professora:</b> $professora</p>
+<p><b>Número de estudantes avaliados:</b> $n_alunos</p>
+<p><b>Média geral (escala interna 1–5):</b> $media_geral</p>
+
+<h2>Médias por dimensão</h2>
+$tabela_dominios
+
+<h2>Perfil por dimensão (gráfico de radar)</h2>
+$radar_tag
+
+<h2>Plano de desenvolvimento da turma</h2>
+<p>$plano</p>
+"""
+
+# Livro da escola: um único documento com CSS e logo uma só vez, sumário e uma
+# página por estudante (o corpo de cada página é o mesmo do relatório individual)
+CSS_LIVRO = """
+.pagina { break-before: page; page-break-before: always; }
+.sumario ol { columns: 2; font-size: 12px; }
+.sumario h3 { margin-bottom: 4px; }
+@media print { a { color: inherit; text-decoration: none; } }
+"""
+
+LIVRO_INICIO = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>$titulo</title>
+<style>$css</style>
+</head>
+<body>
+$logo_tag
+<h1>$titulo</h1>
+<p>$subtitulo</p>
+<div class="sumario">
+<h2>Sumário</h2>
+"""
+
+LIVRO_GRUPO_SUMARIO = Template("""<h3>$grupo</h3>
+<ol>$itens</ol>
+""")
+
+LIVRO_PAGINA = """<section class="pagina" id="$ancora">
+$corpo
+</section>
+"""
+
+LIVRO_FIM = """</body>
+</html>
+"""
+
+BLOCO_PEI = Template("""<h2>Informações do Plano Educacional Individualizado (PEI)</h2>
+<p>$pei</p>
+""")
+
+BLOCO_TENDENCIA = Template("""<h3>Evolução ao longo dos bimestres</h3>
+$tendencia_tag
+""")
+
+BLOCO_HISTORICO = Template("""<h2>Histórico de avaliações</h2>
+<p>Registros anteriores deste estudante na plataforma:</p>
+<p>$historico</p>
+""")
+
+BLOCO_OBSERVACOES = Template("""<h2>Observações da professora</h2>
+<p>$observacoes</p>
+""")
+
+BLOCO_BOLETIM = Template("""<h2>Boletim escolar / desempenho formal</h2>
+$tabela
+""")
+
+
+def texto_html(valor):
+    """Texto com escape e quebras de linha como <br>; None vira vazio."""
+    if valor is None:
+        return ""
+    return escape(str(valor)).replace("\n", "<br>")
+
+
+def _celula(valor):
+    if valor is None:
+        return ""
+    if isinstance(valor, float):
+        return "" if valor != valor else f"{valor:.2f}"
+    return escape(str(valor))
+
+
+def tabela_html(colunas, linhas):
+    """Tabela HTML com escape em todas as células; floats com 2 casas, None/NaN vazios."""
+    partes = ["<table><thead><tr>"]
+    partes.extend(f"<th>{escape(str(c))}</th>" for c in colunas)
+    partes.append("</tr></thead><tbody>")
+    for linha in linhas:
+        partes.append("<tr>" + "".join(f"<td>{_celula(v)}</td>" for v in linha) + "</tr>")
+    partes.append("</tbody></table>")
+    return "".join(partes)
+
+
+def _compilar_documento(css, corpo):
+    # o CSS entra já pronto; "$" literal precisa ser duplicado para o Template
+    return Template(
+        Template(DOCUMENTO).safe_substitute(css=css.replace("$", "$$"), corpo=corpo)
+    )
+
+
+class TemplatesRelatorio:
+    """Documentos compilados para um par de cores; criar uma vez e reutilizar."""
+
+    def __init__(self, cor_titulo, cor_texto):
+        self.css = CSS_RELATORIO.substitute(cor_titulo=cor_titulo, cor_texto=cor_texto)
+        self.aluno = _compilar_documento(self.css, CORPO_ALUNO)
+        self.professora = _compilar_documento(self.css, CORPO_PROFESSORA)
+        self.livro_inicio = Template(LIVRO_INICIO.replace("$css", (self.css + CSS_LIVRO).replace("$", "$$")))
+        self.livro_pagina = Template(LIVRO_PAGINA.replace("$corpo", CORPO_ALUNO))
+
+    def relatorio_aluno(self, **campos):
+        """Documento completo do relatório individual (campos como em campos_aluno)."""
+        return self.aluno.substitute(self.campos_aluno(**campos))
+
+    def pagina_livro(self, ancora, **campos):
+        """Uma página (section) do livro da escola, sem logo e sem CSS próprios."""
+        return self.livro_pagina.substitute(self.campos_aluno(**campos), ancora=ancora)
+
+    def inicio_livro(self, titulo, subtitulo, grupos, logo_tag=""):
+        """
+        Cabeçalho do livro (CSS, logo e sumário).
+        grupos: [(nome do grupo, [(âncora, texto do item), ...]), ...]
+        """
+        partes = [self.livro_inicio.substitute(
+            titulo=texto_html(titulo), subtitulo=texto_html(subtitulo), logo_tag=logo_tag,
+        )]
+        for grupo, itens in grupos:
+            partes.append(LIVRO_GRUPO_SUMARIO.substitute(
+                grupo=texto_html(grupo),
+                itens="".join(f'<li><a href="#{ancora}">{texto_html(texto)}</a></li>' for ancora, texto in itens),
+            ))
+        partes.append("</div>\n")
+        return "".join(partes)
+
+    @staticmethod
+    def fim_livro():
+        return LIVRO_FIM
+
+    @staticmethod
+    def campos_aluno(
+        *, escola, turno, ano_escolar, turma, ano_letivo, bimestre, crianca, professora, sexo,
+        linhas_itens, linhas_boletim, relatorio, sugestoes, radar_tag, logo_tag="", pei_resumo="",
+        tendencia_tag="", historico="", observacoes="",
+    ):
+        """
+        linhas_itens: (dimensão, descrição, escala descritiva) por item;
+        linhas_boletim: (disciplina, nota, conteúdo);
+        tendencia_tag: gráfico de evolução já pronto (vazio quando há um só período);
+        historico e observacoes: texto simples (uma linha por período no histórico).
+        """
+        pei_block = BLOCO_PEI.substitute(pei=texto_html(pei_resumo)) if pei_resumo else ""
+        boletim_block = ""
+        if linhas_boletim:
+            boletim_block = BLOCO_BOLETIM.substitute(
+                tabela=tabela_html(("Disciplina", "Nota", "Conteúdo programático"), linhas_boletim)
+            )
+        return dict(
+            titulo=f"Relatório - {escape(str(crianca))}",
+            logo_tag=logo_tag,
+            escola=texto_html(escola),
+            turno=texto_html(turno),
+            ano_escolar=texto_html(ano_escolar),
+            turma=texto_html(turma),
+            ano_letivo=texto_html(ano_letivo),
+            bimestre=texto_html(bimestre),
+            crianca=texto_html(crianca),
+            sexo=texto_html(sexo or "não informado"),
+            professora=texto_html(professora),
+            pei_block=pei_block,
+            boletim_block=boletim_block,
+            radar_tag=radar_tag,
+            tendencia_block=BLOCO_TENDENCIA.substitute(tendencia_tag=tendencia_tag) if tendencia_tag else "",
+            historico_block=BLOCO_HISTORICO.substitute(historico=texto_html(historico)) if historico else "",
+            observacoes_block=(
+                BLOCO_OBSERVACOES.substitute(observacoes=texto_html(observacoes)) if observacoes else ""
+            ),
+            tabela_itens=tabela_html(("Dimensão", "Descrição", "Escala descritiva"), linhas_itens),
+            relatorio=texto_html(relatorio),
+            sugestoes=texto_html(sugestoes),
+        )
+
+    def relatorio_professora(
+        self, *, professora, escola, turno, turma, ano_letivo, n_alunos, media_geral,
+        linhas_dominios, plano, radar_tag, logo_tag="",
+    ):
+        """linhas_dominios: (dimensão, média) por dimensão."""
+        return self.professora.substitute(
+            titulo=f"Relatório - Professora {escape(str(professora))}",
+            logo_tag=logo_tag,
+            escola=texto_html(escola or ""),
+            turno=texto_html(turno or ""),
+            turma=texto_html(turma or "Não especificada"),
+            ano_letivo=texto_html(ano_letivo or ""),
+            professora=texto_html(professora),
+            n_alunos=n_alunos,
+            media_geral=f"{media_geral:.2f}",
+            tabela_dominios=tabela_html(("Dimensão", "Média (1–5)"), linhas_dominios),
+            radar_tag=radar_tag,
+            plano=texto_html(plano),
+        )
+
+
+@lru_cache(maxsize=None)
+def compilar_templates(cor_titulo, cor_texto):
+    """Templates compilados, um por processo para cada par de cores (o script do Streamlit roda a cada interação)."""
+    return TemplatesRelatorio(cor_titulo, cor_texto)
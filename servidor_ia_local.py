@@ -0,0 +1,266 @@
+"""
+Servidor local compatível com o endpoint de chat completions da OpenAI,
+usado para testes de carga e latência da plataforma sem consumir créditos.
+
+Implementa POST /v1/chat/completions (com e sem streaming) e GET /v1/models,
+com latência, velocidade de geração e injeção de erros configuráveis.
+
+Uso:
+    python servidor_ia_local.py --porta 8089 --latencia 0.8 --tokens-por-segundo 80 \
+        --erro-429 0.05 --erro-500 0.02 --erro-timeout 0.01
+
+No app (qualquer chave serve para o servidor local):
+    OPENAI_API_KEY=local OPENAI_BASE_URL=http://127.0.0.1:8089/v1 streamlit run app.py
+"""
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Mesma aproximação usada no app (~4 caracteres por token)
+CARACTERES_POR_TOKEN = 4
+
+PALAVRAS = (
+    "a criança demonstra avanços importantes nas propostas do cotidiano escolar e participa "
+    "das atividades com interesse crescente a família pode apoiar esse processo com leitura "
+    "conversas brincadeiras e rotinas organizadas que favorecem a autonomia e a confiança "
+    "nas diferentes dimensões observadas ao longo do período o estudante amplia suas "
+    "habilidades de comunicação convivência e resolução de problemas com apoio da professora"
+).split()
+
+
+class ConfigServidor:
+    def __init__(self, args):
+        self.latencia = args.latencia
+        self.jitter = args.jitter
+        self.tokens_por_segundo = args.tokens_por_segundo
+        self.erro_429 = args.erro_429
+        self.erro_500 = args.erro_500
+        self.erro_timeout = args.erro_timeout
+        self.duracao_timeout = args.duracao_timeout
+        self.max_tokens_padrao = args.max_tokens_padrao
+        self.rng = random.Random(args.semente)
+        self.lock = threading.Lock()
+        # prefixos (mensagem de sistema) já vistos, para simular cache de prompt
+        self.prefixos_vistos = set()
+        self.contadores = {"requisicoes": 0, "429": 0, "500": 0, "timeout": 0}
+
+    def sortear(self):
+        with self.lock:
+            return self.rng.random()
+
+    def contar(self, chave):
+        with self.lock:
+            self.contadores[chave] += 1
+
+
+def estimar_tokens(texto):
+    return -(-len(texto or "") // CARACTERES_POR_TOKEN)
+
+
+def gerar_texto(mensagens, n_tokens, formato_json=False):
+    """Texto determinístico (mesmas mensagens → mesmo texto), com ~n_tokens tokens."""
+    semente = hashlib.sha256(json.dumps(mensagens, sort_keys=True).encode("utf-8")).hexdigest()
+    rng = random.Random(semente)
+    palavras = []
+    while estimar_tokens(" ".join(palavras)) < n_tokens:
+        palavras.append(rng.choice(PALAVRAS))
+        if len(palavras) % 60 == 0:
+            palavras[-1] += ".\n\n"
+    texto = " ".join(palavras).replace("\n\n ", "\n\n").strip()
+    texto = texto[:1].upper() + texto[1:] + "."
+    if formato_json:
+        metade = len(texto) // 2
+        return json.dumps({"relatorio": texto[:metade].strip(), "sugestoes": texto[metade:].strip()}, ensure_ascii=False)
+    return texto
+
+
+def fatiar_em_tokens(texto):
+    """Divide o texto em pedaços de ~1 token para o streaming."""
+    return [texto[i:i + CARACTERES_POR_TOKEN] for i in range(0, len(texto), CARACTERES_POR_TOKEN)]
+
+
+class HandlerIALocal(BaseHTTPRequestHandler):
+    config = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, formato, *args):
+        if not self.server.silencioso:
+            super().log_message(formato, *args)
+
+    def _enviar_json(self, status, corpo, cabecalhos=None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        for chave, valor in (cabecalhos or {}).items():
+            self.send_header(chave, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def _erro(self, status, mensagem, tipo, codigo, cabecalhos=None):
+        self._enviar_json(
+            status,
+            {"error": {"message": mensagem, "type": tipo, "param": None, "code": codigo}},
+            cabecalhos,
+        )
+
+    def do_GET(self):
+        if self.path.rstrip("/") in ("/v1/models", "/models"):
+            self._enviar_json(200, {
+                "object": "list",
+                "data": [{"id": "gpt-4o-mini", "object": "model", "created": 0, "owned_by": "local"}],
+            })
+        else:
+            self._erro(404, "Rota não encontrada.", "invalid_request_error", None)
+
+    def do_POST(self):
+        if self.path.rstrip("/") not in ("/v1/chat/completions", "/chat/completions"):
+            self._erro(404, "Rota não encontrada.", "invalid_request_error", None)
+            return
+
+        tamanho = int(self.headers.get("Content-Length", 0))
+        try:
+            corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+        except ValueError:
+            self._erro(400, "JSON inválido.", "invalid_request_error", None)
+            return
+
+        cfg = self.config
+        cfg.contar("requisicoes")
+
+        # Injeção de erros
+        sorteio = cfg.sortear()
+        if sorteio < cfg.erro_429:
+            cfg.contar("429")
+            self._erro(429, "Rate limit simulado.", "requests", "rate_limit_exceeded", {"Retry-After": "1"})
+            return
+        sorteio -= cfg.erro_429
+        if sorteio < cfg.erro_500:
+            cfg.contar("500")
+            self._erro(500, "Erro interno simulado.", "server_error", None)
+            return
+        sorteio -= cfg.erro_500
+        if sorteio < cfg.erro_timeout:
+            cfg.contar("timeout")
+            time.sleep(cfg.duracao_timeout)
+            self.close_connection = True
+            return
+
+        mensagens = corpo.get("messages", [])
+        modelo = corpo.get("model", "gpt-4o-mini")
+        max_tokens = corpo.get("max_tokens") or corpo.get("max_completion_tokens") or cfg.max_tokens_padrao
+        formato_json = (corpo.get("response_format") or {}).get("type") in ("json_object", "json_schema")
+
+        prompt_tokens = sum(estimar_tokens(str(m.get("content", ""))) for m in mensagens)
+        prefixo = "".join(str(m.get("content", "")) for m in mensagens if m.get("role") == "system")
+        with cfg.lock:
+            cached_tokens = estimar_tokens(prefixo) if prefixo in cfg.prefixos_vistos else 0
+            cfg.prefixos_vistos.add(prefixo)
+
+        texto = gerar_texto(mensagens, int(max_tokens * 0.8), formato_json)
+        completion_tokens = estimar_tokens(texto)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        }
+        id_resp = f"chatcmpl-local-{uuid.uuid4().hex[:12]}"
+        criado = int(time.time())
+
+        latencia = max(0.0, cfg.latencia + cfg.jitter * (2 * cfg.sortear() - 1))
+        time.sleep(latencia)
+
+        if corpo.get("stream"):
+            self._responder_stream(id_resp, criado, modelo, texto, usage, corpo.get("stream_options") or {})
+            return
+
+        if cfg.tokens_por_segundo > 0:
+            time.sleep(completion_tokens / cfg.tokens_por_segundo)
+        self._enviar_json(200, {
+            "id": id_resp,
+            "object": "chat.completion",
+            "created": criado,
+            "model": modelo,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": texto},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    def _responder_stream(self, id_resp, criado, modelo, texto, usage, stream_options):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def evento(choices, extra=None):
+            dados = {
+                "id": id_resp,
+                "object": "chat.completion.chunk",
+                "created": criado,
+                "model": modelo,
+                "choices": choices,
+            }
+            dados.update(extra or {})
+            self.wfile.write(f"data: {json.dumps(dados, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        intervalo = 1.0 / self.config.tokens_por_segundo if self.config.tokens_por_segundo > 0 else 0.0
+        try:
+            evento([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+            for pedaco in fatiar_em_tokens(texto):
+                if intervalo:
+                    time.sleep(intervalo)
+                evento([{"index": 0, "delta": {"content": pedaco}, "finish_reason": None}])
+            evento([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+            if stream_options.get("include_usage"):
+                evento([], {"usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # cliente desistiu no meio do streaming
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor local compatível com chat completions (testes de carga).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--porta", type=int, default=8089)
+    parser.add_argument("--latencia", type=float, default=0.5, help="Latência até o primeiro token, em segundos.")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Variação aleatória (±) da latência, em segundos.")
+    parser.add_argument("--tokens-por-segundo", type=float, default=80.0, help="Velocidade de geração (0 = instantâneo).")
+    parser.add_argument("--erro-429", type=float, default=0.0, help="Probabilidade de responder 429.")
+    parser.add_argument("--erro-500", type=float, default=0.0, help="Probabilidade de responder 500.")
+    parser.add_argument("--erro-timeout", type=float, default=0.0, help="Probabilidade de não responder (timeout).")
+    parser.add_argument("--duracao-timeout", type=float, default=120.0, help="Tempo segurando a conexão no timeout.")
+    parser.add_argument("--max-tokens-padrao", type=int, default=800)
+    parser.add_argument("--semente", type=int, default=None, help="Semente para sorteios reproduzíveis.")
+    parser.add_argument("--silencioso", action="store_true", help="Não registra cada requisição no terminal.")
+    args = parser.parse_args()
+
+    HandlerIALocal.config = ConfigServidor(args)
+    servidor = ThreadingHTTPServer((args.host, args.porta), HandlerIALocal)
+    servidor.daemon_threads = True
+    servidor.silencioso = args.silencioso
+    print(f"Servidor IA local em http://{args.host}:{args.porta}/v1 (Ctrl+C para encerrar)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Requisições: {HandlerIALocal.config.contadores}")
+        servidor.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Gráficos de evolução do estudante: médias por dimensão ao longo dos bimestres
+e anos, em pequenos múltiplos (um painel por dimensão, mesma escala 1–5).
+
+Desenho direto em SVG, como o motor nativo do radar. tendencia_svg é memoizada
+pelos próprios dados (períodos + médias): enquanto as avaliações do estudante
+não mudam, reimpressões e exportações em lote reaproveitam o mesmo SVG.
+"""
+from functools import lru_cache
+from html import escape
+
+TITULO_TENDENCIA = "Evolução por dimensão (escala interna 1–5)"
+
+_COR = "#1f77b4"
+_COR_GRADE = "#d9d9d9"
+_FONTE = "DejaVu Sans, Arial, sans-serif"
+
+# painel de cada dimensão, em pontos
+_COLUNAS = 3
+_LARG_PAINEL = 190.0
+_ALT_PAINEL = 120.0
+_MARGEM_ESQ = 22.0
+_MARGEM_DIR = 22.0
+_TOPO_PLOT = 22.0
+_BASE_PLOT = 96.0
+_ALT_TITULO = 24.0
+_MAX_CARACTERES_DIMENSAO = 34
+
+
+def _resumir(texto, limite):
+    return texto if len(texto) <= limite else texto[: limite - 1].rstrip() + "…"
+
+
+def _y(valor):
+    return _BASE_PLOT - (min(max(valor, 1.0), 5.0) - 1.0) / 4.0 * (_BASE_PLOT - _TOPO_PLOT)
+
+
+def _painel(nome, periodos, valores, x0, y0):
+    largura_util = _LARG_PAINEL - _MARGEM_ESQ - _MARGEM_DIR
+    passo = largura_util / max(len(periodos) - 1, 1)
+    xs = [x0 + _MARGEM_ESQ + i * passo for i in range(len(periodos))]
+
+    partes = [
+        f'<text x="{x0 + _MARGEM_ESQ:.1f}" y="{y0 + 12:.1f}" font-size="8.5" font-weight="bold">'
+        f"{escape(_resumir(nome, _MAX_CARACTERES_DIMENSAO))}</text>"
+    ]
+    # grade 1–5 com rótulos só em 1, 3 e 5
+    for nivel in range(1, 6):
+        y = y0 + _y(nivel)
+        partes.append(
+            f'<line x1="{x0 + _MARGEM_ESQ:.1f}" y1="{y:.1f}" x2="{x0 + _LARG_PAINEL - _MARGEM_DIR:.1f}" y2="{y:.1f}" '
+            f'stroke="{_COR_GRADE}" stroke-width="0.6"/>'
+        )
+        if nivel in (1, 3, 5):
+            partes.append(
+                f'<text x="{x0 + _MARGEM_ESQ - 4:.1f}" y="{y + 2.5:.1f}" font-size="7" text-anchor="end">{nivel}</text>'
+            )
+
+    # linha quebrada nos períodos sem média (dimensão ausente naquela avaliação)
+    trecho = []
+    trechos = [trecho]
+    for x, v in zip(xs, valores):
+        if v is None:
+            trecho = []
+            trechos.append(trecho)
+        else:
+            trecho.append(f"{x:.1f},{y0 + _y(v):.1f}")
+    for t in trechos:
+        if len(t) > 1:
+            partes.append(
+                f'<polyline points="{" ".join(t)}" fill="none" stroke="{_COR}" stroke-width="1.6" '
+                'stroke-linejoin="round"/>'
+            )
+    for x, v in zip(xs, valores):
+        if v is not None:
+            partes.append(f'<circle cx="{x:.1f}" cy="{y0 + _y(v):.1f}" r="2.2" fill="{_COR}"/>')
+
+    # rótulos dos períodos: todos quando cabem (largura estimada), senão só o primeiro e o último
+    largura_rotulo = 0.55 * 6.5 * max(len(p) for p in periodos)
+    mostrar = range(len(periodos)) if passo >= largura_rotulo + 4 else (0, len(periodos) - 1)
+    for i in mostrar:
+        partes.append(
+            f'<text x="{xs[i]:.1f}" y="{y0 + _BASE_PLOT + 11:.1f}" font-size="6.5" text-anchor="middle">'
+            f"{escape(periodos[i])}</text>"
+        )
+    return "".join(partes)
+
+
+@lru_cache(maxsize=4096)
+def tendencia_svg(periodos, series):
+    """
+    periodos: tupla com o rótulo de cada período, em ordem;
+    series: tupla de (dimensão, tupla de médias por período, None quando ausente).
+    Retorna "" com menos de dois períodos (não há evolução a mostrar).
+    """
+    if len(periodos) < 2 or not series:
+        return ""
+    linhas = -(-len(series) // _COLUNAS)
+    colunas = min(len(series), _COLUNAS)
+    largura = colunas * _LARG_PAINEL
+    altura = _ALT_TITULO + linhas * _ALT_PAINEL
+
+    partes = [
+        f'<text x="{largura / 2:.1f}" y="15" font-size="11" text-anchor="middle">{escape(TITULO_TENDENCIA)}</text>'
+    ]
+    for i, (nome, valores) in enumerate(series):
+        x0 = (i % _COLUNAS) * _LARG_PAINEL
+        y0 = _ALT_TITULO + (i // _COLUNAS) * _ALT_PAINEL
+        partes.append(_painel(nome, periodos, valores, x0, y0))
+
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{largura:.0f}pt" height="{altura:.0f}pt" '
+        f'viewBox="0 0 {largura:.0f} {altura:.0f}" font-family="{_FONTE}">'
+        f'<rect width="{largura:.0f}" height="{altura:.0f}" fill="#ffffff"/>'
+        f'{"".join(partes)}</svg>'
+    )
+
+
+def tendencia_html(periodos, series, alt="Evolução do estudante"):
+    """Tag pronta para os relatórios HTML (SVG embutido), ou "" sem evolução a mostrar."""
+    svg = tendencia_svg(periodos, series)
+    if not svg:
+        return ""
+    return svg.replace("<svg ", f'<svg role="img" aria-label="{escape(alt)}" class="radar" ', 1)
+
+
+def tendencias_em_lote(linhas):
+    """
+    Monta, de uma vez, os gráficos de vários estudantes.
+    linhas: (chave do estudante, rótulo do período, dimensão, média), ordenadas
+    por estudante e cronologicamente; repetições do mesmo período ficam com a
+    última avaliação. Retorna {chave: tag HTML}.
+    """
+    resultado = {}
+    chave_atual, periodos, medias = None, [], {}
+
+    def fechar():
+        if chave_atual is None:
+            return
+        dimensoes = sorted({d for por_dim in medias.values() for d in por_dim})
+        series = tuple(
+            (d, tuple(medias[p].get(d) for p in periodos)) for d in dimensoes
+        )
+        resultado[chave_atual] = tendencia_html(tuple(periodos), series)
+
+    for chave, periodo, dimensao, media in linhas:
+        if chave != chave_atual:
+            fechar()
+            chave_atual, periodos, medias = chave, [], {}
+        if periodo not in medias:
+            periodos.append(periodo)
+            medias[periodo] = {}
+        if media is not None:
+            medias[periodo][dimensao] = round(float(media), 2)
+    fechar()
+    return resultado